@@ -0,0 +1,104 @@
+"""
+記憶體內音頻編碼
+In-memory audio encoding for upload
+
+直接在 BytesIO 中編碼上傳內容，不經過臨時文件；
+除了 WAV 之外還支援 FLAC（無損）與 OGG/Opus（有損，體積最小）。
+FLAC/Opus 需要可選依賴 soundfile (libsndfile)。
+"""
+
+import io
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# 格式名稱 -> (文件名, MIME 類型)
+FORMATS = {
+    "wav": ("audio.wav", "audio/wav"),
+    "flac": ("audio.flac", "audio/flac"),
+    "ogg": ("audio.ogg", "audio/ogg"),
+}
+
+
+class EncodedAudio:
+    """編碼後的上傳內容及統計"""
+
+    def __init__(self, data, format, raw_bytes, encode_seconds):
+        """
+        Args:
+            data: 編碼後的 bytes
+            format: 格式名稱 (wav, flac, ogg)
+            raw_bytes: 原始 PCM 大小
+            encode_seconds: 編碼耗時（秒）
+        """
+        self.data = data
+        self.format = format
+        self.filename, self.mime_type = FORMATS[format]
+        self.raw_bytes = raw_bytes
+        self.encode_seconds = encode_seconds
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    @property
+    def compression_ratio(self):
+        return self.raw_bytes / self.size if self.size else 0.0
+
+    def as_upload(self):
+        """OpenAI SDK 可接受的 file 參數"""
+        return (self.filename, self.data, self.mime_type)
+
+    def __str__(self):
+        return (f"{self.format}: {self.size / 1024:.1f} KB "
+                f"(raw {self.raw_bytes / 1024:.1f} KB, {self.compression_ratio:.1f}x) "
+                f"in {self.encode_seconds * 1000:.1f} ms")
+
+
+def _encode_wav(audio, sample_rate, buffer):
+    from scipy.io import wavfile  # 延遲載入，避免拖慢啟動
+    wavfile.write(buffer, sample_rate, audio)
+
+
+def _encode_soundfile(audio, sample_rate, buffer, format, subtype):
+    try:
+        import soundfile
+    except (ImportError, OSError) as e:
+        # soundfile 未安裝，或找不到 libsndfile 動態庫（匯入時拋出 OSError）
+        raise ImportError(f"{format} encoding requires soundfile: pip install soundfile") from e
+    if subtype not in soundfile.available_subtypes(format):
+        # 舊版 libsndfile 沒有 Opus 編碼器；以 ImportError 表示，呼叫方同樣退回 WAV
+        raise ImportError(f"libsndfile {soundfile.__libsndfile_version__} cannot encode {format}/{subtype}")
+    soundfile.write(buffer, audio, sample_rate, format=format, subtype=subtype)
+
+
+def encode_audio(audio, sample_rate, format="wav"):
+    """將 int16 音頻編碼為上傳內容
+
+    Args:
+        audio: int16 音頻數組，形狀為 (樣本數,) 或 (樣本數, 聲道數)
+        sample_rate: 採樣率（Opus 僅支援 8/12/16/24/48 kHz）
+        format: wav, flac 或 ogg (Opus)
+
+    Returns:
+        EncodedAudio
+
+    Raises:
+        ValueError: 不支援的格式
+        ImportError: FLAC/Opus 所需的 soundfile 未安裝，或 libsndfile 不支援該編碼
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported audio format: {format}")
+
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+    if format == "wav":
+        _encode_wav(audio, sample_rate, buffer)
+    elif format == "flac":
+        _encode_soundfile(audio, sample_rate, buffer, "FLAC", "PCM_16")
+    else:
+        _encode_soundfile(audio, sample_rate, buffer, "OGG", "OPUS")
+    encode_seconds = time.perf_counter() - start
+
+    return EncodedAudio(buffer.getvalue(), format, audio.nbytes, encode_seconds)
@@ -0,0 +1,167 @@
+"""
+模擬音頻輸入
+Simulated sounddevice-compatible audio input
+
+SimulatedAudio 提供與 sounddevice 相同的 InputStream / CallbackStop / query_devices，
+用固定的音頻數組代替麥克風：背景線程按區塊呼叫回調，可按實際時間或加速播放，
+音頻用完後送出靜音（和真實麥克風一樣不會自行結束）。
+用於沒有 PortAudio 的環境（Linux CI）測試和效能測試錄音器及完整流程：
+
+    audio_api = SimulatedAudio(audio, speed=20)
+    recorder = AudioRecorder(16000, 1, audio_api=audio_api)
+"""
+
+import logging
+import threading
+import time
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+
+class CallbackStop(Exception):
+    """在回調中拋出以正常結束輸入流（同 sounddevice.CallbackStop）"""
+
+
+class CallbackAbort(Exception):
+    """在回調中拋出以立即中止輸入流（同 sounddevice.CallbackAbort）"""
+
+
+class CallbackFlags:
+    """回調狀態旗標（sounddevice.CallbackFlags 的子集）"""
+
+    def __init__(self, input_overflow=False, input_underflow=False):
+        self.input_overflow = input_overflow
+        self.input_underflow = input_underflow
+
+    def __bool__(self):
+        return self.input_overflow or self.input_underflow
+
+    def __str__(self):
+        names = [name for name in ("input_overflow", "input_underflow") if getattr(self, name)]
+        return ", ".join(names).replace("_", " ")
+
+
+class TimeInfo:
+    """回調時間資訊（秒，time.monotonic 時基）"""
+
+    def __init__(self, input_buffer_adc_time, current_time):
+        self.inputBufferAdcTime = input_buffer_adc_time
+        self.currentTime = current_time
+
+
+class SimulatedInputStream:
+    """在背景線程按區塊回放音頻的輸入流"""
+
+    def __init__(self, audio_api, samplerate, channels, callback, finished_callback=None,
+                 dtype="int16", blocksize=1024, latency=None, **kwargs):
+        if not blocksize:
+            blocksize = 1024  # sounddevice 的 0 表示由主機決定
+        self.audio_api = audio_api
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.latency = latency or blocksize / samplerate
+        self._callback = callback
+        self._finished_callback = finished_callback
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.active = False
+        self.closed = False
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="simulated-input", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        api = self.audio_api
+        source = api.source.reshape(len(api.source), -1)
+        block_seconds = self.blocksize / self.samplerate
+        interval = block_seconds / api.speed if api.speed > 0 else 0.0
+        position = 0
+        next_time = time.monotonic()
+        try:
+            while not self._stop_event.is_set():
+                # 先等到這個區塊「錄完」的時間，再交給回調
+                next_time += interval
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                end = position + self.blocksize
+                block = np.zeros((self.blocksize, self.channels), dtype=np.int16)
+                available = source[position:min(end, len(source)), :self.channels]
+                block[:len(available)] = available
+                position = end
+                if position >= len(source):
+                    api.source_consumed.set()
+
+                now = time.monotonic()
+                try:
+                    self._callback(block, self.blocksize, TimeInfo(now - block_seconds, now),
+                                   api.next_status())
+                except CallbackStop:
+                    break
+                except CallbackAbort:
+                    break
+        finally:
+            self.active = False
+            if self._finished_callback is not None:
+                self._finished_callback()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def abort(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+
+class SimulatedAudio:
+    """與 sounddevice 相容的模擬音頻 API"""
+
+    CallbackStop = CallbackStop
+    CallbackAbort = CallbackAbort
+
+    def __init__(self, source, speed=1.0, device_name="Simulated input", open_latency=0.0):
+        """
+        Args:
+            source: int16 音頻數組，形狀為 (樣本數,) 或 (樣本數, 聲道數)
+            speed: 播放速度，1 為實際時間，0 表示不等待（盡快）
+            device_name: query_devices 回傳的設備名稱
+            open_latency: 打開輸入流的模擬耗時（秒）
+        """
+        self.source = source
+        self.speed = speed
+        self.device_name = device_name
+        self.open_latency = open_latency
+        self.streams_opened = 0
+        # 音頻已全部送進回調（之後只有靜音）
+        self.source_consumed = threading.Event()
+        # 下一個回調的狀態旗標；測試可設定以模擬溢出
+        self.pending_status = None
+
+    def next_status(self):
+        status, self.pending_status = self.pending_status, None
+        return status or CallbackFlags()
+
+    def query_devices(self, device=None, kind=None):
+        return {"name": self.device_name, "max_input_channels": 2,
+                "default_samplerate": 16000.0, "default_low_input_latency": 0.02,
+                "default_high_input_latency": 0.1}
+
+    def InputStream(self, **kwargs):
+        if self.open_latency > 0:
+            time.sleep(self.open_latency)
+        self.streams_opened += 1
+        self.source_consumed.clear()
+        return SimulatedInputStream(self, **kwargs)
@@ -0,0 +1,161 @@
+"""
+靜音修剪與語音活動偵測
+Vectorized silence trimming and voice-activity gating
+
+以能量 (RMS) 與過零率 (zero-crossing rate) 逐幀判斷語音，
+修剪首尾靜音並壓縮過長的中間停頓，減少上傳大小和計費時長。
+"""
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+
+class VADConfig:
+    """語音活動偵測參數"""
+
+    def __init__(self, energy_threshold=300.0, fricative_energy_ratio=0.3,
+                 zcr_threshold=0.25, frame_ms=20, pad_ms=200, max_pause_ms=500):
+        """
+        Args:
+            energy_threshold: 判定為語音的 RMS 門檻（int16 振幅）
+            fricative_energy_ratio: 清音判定的能量門檻比例（相對 energy_threshold）
+            zcr_threshold: 低能量但過零率高於此值時視為清音（如 s、f、ㄙ）
+            frame_ms: 分析幀長（毫秒）
+            pad_ms: 語音前後保留的緩衝（毫秒），避免切掉字頭字尾
+            max_pause_ms: 中間停頓最多保留多長（毫秒），更長的停頓會被壓縮
+        """
+        self.energy_threshold = energy_threshold
+        self.fricative_energy_ratio = fricative_energy_ratio
+        self.zcr_threshold = zcr_threshold
+        self.frame_ms = frame_ms
+        self.pad_ms = pad_ms
+        self.max_pause_ms = max_pause_ms
+
+
+class VADReport:
+    """修剪結果統計"""
+
+    def __init__(self, original_samples, leading=0, trailing=0, internal=0,
+                 speech_detected=True):
+        self.original_samples = original_samples
+        self.leading = leading
+        self.trailing = trailing
+        self.internal = internal
+        self.speech_detected = speech_detected
+
+    @property
+    def removed_samples(self):
+        return self.leading + self.trailing + self.internal
+
+    @property
+    def kept_samples(self):
+        return self.original_samples - self.removed_samples
+
+    def __str__(self):
+        if not self.speech_detected:
+            return f"no speech detected in {self.original_samples} samples, kept all"
+        ratio = self.removed_samples / self.original_samples if self.original_samples else 0.0
+        return (f"removed {self.removed_samples}/{self.original_samples} samples ({ratio:.0%}): "
+                f"leading={self.leading}, trailing={self.trailing}, internal={self.internal}")
+
+
+def mono_samples(audio):
+    """多聲道取平均；單聲道回傳視圖，不複製（長錄音可能是映射到磁碟的 memmap）"""
+    if audio.ndim == 1:
+        return audio
+    if audio.shape[1] == 1:
+        return audio[:, 0]
+    return audio.mean(axis=1)
+
+
+def frame_features(audio, frame_size, block_frames=8192):
+    """逐幀計算 RMS 能量與過零率
+
+    按 block_frames 幀一批計算，臨時數組的大小與音頻長度無關。
+
+    Args:
+        audio: 一維 int16 音頻數組
+        frame_size: 每幀樣本數
+        block_frames: 每批計算的幀數
+
+    Returns:
+        (rms, zcr): 兩個長度為幀數的數組；最後不足一幀的部分以零補齊
+    """
+    n_frames = -(-len(audio) // frame_size)
+    rms = np.empty(n_frames, dtype=np.float32)
+    zcr = np.empty(n_frames, dtype=np.float64)
+    for first in range(0, n_frames, block_frames):
+        last = min(first + block_frames, n_frames)
+        block = audio[first * frame_size:last * frame_size]
+        padded = np.zeros((last - first) * frame_size, dtype=np.float32)
+        padded[:len(block)] = block
+        frames = padded.reshape(last - first, frame_size)
+
+        rms[first:last] = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr[first:last] = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    return rms, zcr
+
+
+def speech_mask(audio, sample_rate, config):
+    """判斷每一幀是否為語音（已加上前後緩衝）"""
+    frame_size = max(1, int(sample_rate * config.frame_ms / 1000))
+    rms, zcr = frame_features(audio, frame_size)
+
+    voiced = rms >= config.energy_threshold
+    unvoiced = (rms >= config.energy_threshold * config.fricative_energy_ratio) & \
+        (zcr >= config.zcr_threshold)
+    speech = voiced | unvoiced
+
+    # 以卷積向前後擴張語音區域
+    pad_frames = int(config.pad_ms / config.frame_ms)
+    if pad_frames > 0 and speech.any():
+        kernel = np.ones(2 * pad_frames + 1, dtype=np.int32)
+        speech = np.convolve(speech.astype(np.int32), kernel, mode="same") > 0
+    return speech, frame_size
+
+
+def trim_silence(audio, sample_rate, config=None):
+    """修剪首尾靜音並壓縮中間長停頓
+
+    Args:
+        audio: int16 音頻數組，形狀為 (樣本數,) 或 (樣本數, 聲道數)
+        sample_rate: 採樣率
+        config: VADConfig，None 時使用默認值
+
+    Returns:
+        (trimmed_audio, VADReport)；未偵測到語音時回傳原始音頻
+    """
+    config = config or VADConfig()
+    # 多聲道時以平均值判斷，但裁切原始的每一行
+    samples = mono_samples(audio)
+    total = len(samples)
+    if total == 0:
+        return audio, VADReport(0, speech_detected=False)
+
+    speech, frame_size = speech_mask(samples, sample_rate, config)
+    speech_idx = np.flatnonzero(speech)
+    if len(speech_idx) == 0:
+        return audio, VADReport(total, speech_detected=False)
+
+    first, last = speech_idx[0], speech_idx[-1]
+    frame_idx = np.arange(len(speech))
+
+    # 每個靜音幀距離前一個語音幀的距離，用來只保留每段停頓的前 max_pause 幀
+    last_speech = np.maximum.accumulate(np.where(speech, frame_idx, -1))
+    pause_position = frame_idx - last_speech - 1
+    max_pause_frames = int(config.max_pause_ms / config.frame_ms)
+
+    keep = speech | (pause_position < max_pause_frames)
+    keep[:first] = False
+    keep[last + 1:] = False
+
+    sample_keep = np.repeat(keep, frame_size)[:total]
+    trimmed = audio[sample_keep]
+
+    leading = min(int(first) * frame_size, total)
+    trailing = max(total - (int(last) + 1) * frame_size, 0)
+    internal = total - len(trimmed) - leading - trailing
+    report = VADReport(total, leading=leading, trailing=trailing, internal=internal)
+    return trimmed, report
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+批次轉錄
+Concurrent batch transcription for audio files and directories
+
+以與狀態列應用相同的流程（靜音修剪 → 轉錄 → 簡繁轉換 → 詞典替換）處理錄音文件，
+結果逐行寫入 JSONL。多個文件由有界線程池並行處理，長文件的區塊共用另一個同樣大小的線程池，
+同時進行的請求數不超過工作線程數；遇到速率限制時全部工作線程一起退避。
+每完成一個文件就寫入清單 (manifest)，中斷後重新執行會跳過已完成的文件。無法讀取的文件記錄為錯誤。
+
+用法:
+    python3 batch_transcribe.py meetings/ -o results.jsonl --workers 8
+    python3 batch_transcribe.py a.wav b.flac -o results.jsonl --model local:small
+    python3 batch_transcribe.py meetings/ -o results.jsonl --base-url http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from lazy_import import lazy_import
+from request_policy import is_retryable, retry_after
+from script_conversion import PROFILES, ConversionStage
+from text_rewriter import MANUAL_MAPPINGS, UserDictionary
+from transcription_backends import DEFAULT_MODEL, LOCAL_PREFIX, normalize_model_spec
+from transcription_engine import USER_DICTIONARY_PATH, NullSink, PostProcessor, TranscriptionEngine
+
+np = lazy_import("numpy")
+openai = lazy_import("openai")
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".ogg", ".mp3")
+
+
+def find_audio_files(paths, extensions=AUDIO_EXTENSIONS):
+    """展開文件和目錄（遞迴），回傳排序後的音頻文件路徑"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names
+                             if name.lower().endswith(extensions))
+        else:
+            files.append(path)
+    return sorted(os.path.abspath(f) for f in files)
+
+
+def read_audio(path):
+    """讀取音頻文件為 int16 單聲道
+
+    Returns:
+        (audio, sample_rate)
+    """
+    try:
+        import soundfile
+    except ImportError:
+        from scipy.io import wavfile  # 沒有 soundfile 時只支援 WAV
+        sample_rate, audio = wavfile.read(path)
+    else:
+        audio, sample_rate = soundfile.read(path, dtype="int16")
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1).astype(np.int16)
+    return audio, sample_rate
+
+
+def file_key(path):
+    """清單中的文件識別：路徑 + 大小 + 修改時間，文件被覆寫後會重新處理"""
+    stat = os.stat(path)
+    return f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class Manifest:
+    """已完成文件的清單（僅追加的 JSONL，中斷時最多遺失最後一行）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["key"])
+                    except (ValueError, KeyError):
+                        continue  # 中斷時寫了一半的行
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def mark_done(self, key):
+        with self._lock:
+            self.done.add(key)
+            self._file.write(json.dumps({"key": key}) + "\n")
+            self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class RateLimitGate:
+    """所有工作線程共用的退避閘門：一個請求被限速時，其他線程也暫停到同一時間點"""
+
+    def __init__(self):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class BatchTranscriber:
+    """以有界線程池並行轉錄多個文件，結果流式寫入 JSONL"""
+
+    def __init__(self, engine, output, manifest, workers=4, max_retries=5,
+                 base_delay=1.0, max_delay=60.0):
+        """
+        Args:
+            engine: TranscriptionEngine（多個工作線程共用）
+            output: 已打開的 JSONL 輸出文件
+            manifest: Manifest
+            workers: 並行工作線程數
+            max_retries: 可重試錯誤的最大重試次數
+            base_delay: 指數退避的起始等待（秒）
+            max_delay: 單次退避上限（秒）
+        """
+        self.engine = engine
+        self.output = output
+        self.manifest = manifest
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.gate = RateLimitGate()
+        self._output_lock = threading.Lock()
+        self.succeeded = 0
+        self.failed = 0
+
+    def _transcribe_with_retry(self, audio, sample_rate):
+        """轉錄一段音頻，可重試錯誤按指數退避（含抖動）重試
+
+        Returns:
+            (TranscriptionResult, 嘗試次數)
+        """
+        for attempt in range(self.max_retries + 1):
+            self.gate.wait()
+            try:
+                return self.engine.transcribe_audio(audio, sample_rate), attempt + 1
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                suggested = retry_after(e)
+                if suggested is not None:
+                    delay = max(delay, suggested)
+                if isinstance(e, openai.RateLimitError):
+                    self.gate.pause(delay)
+                logger.warning(f"{type(e).__name__}, retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _process(self, path, key):
+        start = time.perf_counter()
+        record = {"path": path}
+        try:
+            audio, sample_rate = read_audio(path)
+            result, attempts = self._transcribe_with_retry(audio, sample_rate)
+            record.update(status="ok", text=result.text, raw_text=result.raw_text,
+                          duration=round(result.duration, 3), attempts=attempts)
+        except Exception as e:
+            logger.error(f"{path}: {e}")
+            record.update(status="error", error=f"{type(e).__name__}: {e}")
+        record["elapsed"] = round(time.perf_counter() - start, 3)
+
+        self._write(record)
+        # 只記錄成功的文件；失敗的文件下次執行時重試
+        if record["status"] == "ok":
+            self.manifest.mark_done(key)
+        return record
+
+    def _write_error(self, path, error):
+        logger.error(f"{path}: {error}")
+        self._write({"path": path, "status": "error", "error": f"{type(error).__name__}: {error}",
+                     "elapsed": 0.0})
+
+    def _write(self, record):
+        with self._output_lock:
+            self.output.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.output.flush()
+            if record["status"] == "ok":
+                self.succeeded += 1
+            else:
+                self.failed += 1
+
+    def run(self, files):
+        """處理文件列表（已在清單中的文件會被跳過）
+
+        Returns:
+            跳過的文件數
+        """
+        pending = []
+        skipped = 0
+        for path in files:
+            try:
+                key = file_key(path)
+            except OSError as e:
+                # 文件在列出後被刪除或無法存取：記錄錯誤，繼續處理其他文件
+                self._write_error(path, e)
+                continue
+            if key in self.manifest:
+                skipped += 1
+                continue
+            pending.append((path, key))
+
+        # 同時在途的任務不超過 workers 的兩倍，大目錄不會一次建立大量 future；
+        # 長文件的區塊在共用的線程池中轉錄，請求策略把所有線程合計的請求數限制在 workers
+        policy = self.engine.request_policy
+        policy.max_concurrent = self.workers
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="chunk") as chunks, \
+                ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as executor:
+            self.engine.chunk_executor = chunks
+            try:
+                in_flight = set()
+                for path, key in pending:
+                    if len(in_flight) >= self.workers * 2:
+                        _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    in_flight.add(executor.submit(self._process, path, key))
+                wait(in_flight)
+            finally:
+                self.engine.chunk_executor = None
+        return skipped
+
+
+def build_engine(args):
+    """根據命令列參數建立共用的轉錄引擎"""
+    client = None
+    if not normalize_model_spec(args.model).startswith(LOCAL_PREFIX):
+        api_key = os.getenv("OPENAI_API_KEY") or ("local" if args.base_url else None)
+        if not api_key:
+            raise SystemExit("錯誤: 請設置 OPENAI_API_KEY 環境變量")
+        # 重試由 BatchTranscriber 負責（含共用退避），關閉 SDK 自身的重試
+        client = openai.OpenAI(api_key=api_key, base_url=args.base_url, max_retries=0)
+
+    post_processor = PostProcessor(
+        ConversionStage(args.profile),
+        UserDictionary(args.dictionary, MANUAL_MAPPINGS)
+    )
+    engine = TranscriptionEngine(client=client, post_processor=post_processor, sink=NullSink())
+    # 保留截止時間，重試交給 BatchTranscriber（所有工作線程共用退避）
+    engine.request_policy.max_retries = 0
+    try:
+        engine.set_model(args.model)
+    except ValueError as e:
+        raise SystemExit(f"錯誤: {e}")
+    engine.language = args.language
+    engine.upload_format = args.format
+    engine.vad_enabled = not args.no_vad
+    return engine
+
+
+def main(argv=None):
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Batch transcription of audio files")
+    parser.add_argument("paths", nargs="+", help="音頻文件或目錄（遞迴搜尋）")
+    parser.add_argument("-o", "--output", required=True, help="JSONL 輸出文件（追加寫入）")
+    parser.add_argument("--manifest", help="完成清單，默認為 <output>.manifest")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="OpenAI 模型或 local:<大小>")
+    parser.add_argument("--language", help="語言代碼，默認自動偵測")
+    parser.add_argument("--format", default="flac", choices=("wav", "flac", "ogg"), help="上傳格式")
+    parser.add_argument("--profile", default="s2t", choices=PROFILES, help="簡繁轉換設定檔")
+    parser.add_argument("--dictionary", default=USER_DICTIONARY_PATH, help="自定義詞典文件")
+    parser.add_argument("--no-vad", action="store_true", help="不修剪靜音")
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument("--metrics", help="把每個文件的各階段延遲追加到此 JSONL 文件")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="OpenAI 相容服務地址（例如本地模擬服務）")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    files = find_audio_files(args.paths)
+    engine = build_engine(args)
+    engine.metrics.export_path = args.metrics
+    engine.warm_up(recorder=False)
+
+    manifest = Manifest(args.manifest or args.output + ".manifest")
+    start = time.perf_counter()
+    try:
+        with open(args.output, "a", encoding="utf-8") as output:
+            batch = BatchTranscriber(engine, output, manifest, workers=args.workers,
+                                     max_retries=args.max_retries)
+            skipped = batch.run(files)
+    finally:
+        manifest.close()
+    elapsed = time.perf_counter() - start
+
+    processed = batch.succeeded + batch.failed
+    print(f"{len(files)} files: {batch.succeeded} ok, {batch.failed} failed, "
+          f"{skipped} skipped (manifest) in {elapsed:.1f}s"
+          + (f" ({processed / elapsed:.2f} files/s)" if processed and elapsed else ""))
+    if processed:
+        print(engine.metrics.format_summary())
+    return 1 if batch.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+本機轉錄服務壓力測試
+Load test for the local transcription daemon
+
+在同一個進程中啟動本地模擬轉錄服務和 transcription_daemon，多個客戶端並行上傳
+（或以 --stream 串流上傳）合成語音，報告客戶端看到的延遲 p50/p95/p99、吞吐量
+和被背壓拒絕 (429) 的請求數。不需要麥克風、macOS 或 API 金鑰，可在 Linux 上執行。
+
+用法:
+    python3 bench_daemon.py
+    python3 bench_daemon.py --clients 16 --requests 8 --length 5 --latency 0.3 --jitter 0.2
+    python3 bench_daemon.py --stream --speed 1   # 按實際時間串流，測量停止說話 → 文字的延遲
+"""
+
+import argparse
+import http.client
+import json
+import logging
+import sys
+import threading
+import time
+
+from openai import OpenAI
+
+from bench_pipeline import SAMPLE_RATE, synthetic_speech
+from latency_metrics import LatencyHistogram
+from mock_transcription_server import MockTranscriptionServer
+from transcription_daemon import DaemonThread
+from transcription_engine import NullSink, TranscriptionEngine
+
+
+def run_client(address, client_id, audio, requests, stream, speed, results, lock):
+    """一個客戶端：依序送出 requests 個請求，每個請求一條持久連線上的一次上傳"""
+    host, port = address
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    block = SAMPLE_RATE // 10
+
+    def chunks():
+        for start in range(0, len(audio), block):
+            if speed > 0:
+                time.sleep(0.1 / speed)
+            yield audio[start:start + block].tobytes()
+
+    for _ in range(requests):
+        try:
+            body = chunks() if stream else audio.tobytes()
+            conn.request("POST", f"/v1/transcribe?sample_rate={SAMPLE_RATE}", body=body,
+                         headers={"X-Client-Id": client_id}, encode_chunked=stream)
+            # 串流時從最後一個區塊送出後開始計時（停止說話 → 文字）
+            start = time.perf_counter()
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader("Connection") == "close":
+                conn.close()
+        except (OSError, http.client.HTTPException):
+            status = None
+            conn.close()
+        with lock:
+            results.append((status, time.perf_counter() - start))
+    conn.close()
+
+
+def main(argv=None):
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Transcription daemon load test")
+    parser.add_argument("--clients", type=int, default=8, help="並行客戶端數")
+    parser.add_argument("--requests", type=int, default=4, help="每個客戶端的請求數")
+    parser.add_argument("--length", type=float, default=5.0, help="每個請求的音頻長度（秒）")
+    parser.add_argument("--stream", action="store_true", help="以 chunked 串流上傳")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="串流速度，1 為實際時間，0 為不等待")
+    parser.add_argument("--workers", type=int, default=8, help="服務的轉錄線程數")
+    parser.add_argument("--max-inflight", type=int, default=2, help="每個客戶端同時轉錄的請求數")
+    parser.add_argument("--latency", type=float, default=0.1, help="模擬服務固定延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模擬服務隨機延遲上限（秒）")
+    parser.add_argument("--realtime-factor", type=float, default=0.01,
+                        help="模擬服務每秒音頻的處理時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模擬服務錯誤機率")
+    parser.add_argument("--json", help="把結果寫入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print("=" * 72)
+    print("本機轉錄服務壓力測試")
+    print("Transcription Daemon Load Test")
+    print("=" * 72)
+    print(f"{args.clients} 個客戶端 × {args.requests} 個請求，每個 {args.length:g}s 音頻"
+          f"（{'串流' if args.stream else '整段'}上傳）")
+
+    audio = synthetic_speech(args.length)
+    results = []
+    lock = threading.Lock()
+    with MockTranscriptionServer(latency=args.latency, jitter=args.jitter,
+                                 realtime_factor=args.realtime_factor,
+                                 error_rate=args.error_rate, seed=0) as server:
+        engine = TranscriptionEngine(client=OpenAI(api_key="bench", base_url=server.base_url, max_retries=0),
+                                     sink=NullSink())
+        engine.warm_up(recorder=False)
+        with DaemonThread(engine, workers=args.workers,
+                          max_inflight_per_client=args.max_inflight) as daemon:
+            start = time.perf_counter()
+            threads = [
+                threading.Thread(target=run_client,
+                                 args=(daemon.daemon.address, f"client-{i}", audio, args.requests,
+                                       args.stream, args.speed, results, lock))
+                for i in range(args.clients)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            stats = daemon.daemon.stats()
+
+    histogram = LatencyHistogram()
+    for status, seconds in results:
+        if status == 200:
+            histogram.record(seconds)
+    errors = sum(1 for status, _ in results if status not in (200, 429))
+    rejected = sum(1 for status, _ in results if status == 429)
+    summary = {
+        "requests": len(results),
+        "ok": histogram.count,
+        "rejected": rejected,
+        "errors": errors,
+        "elapsed": elapsed,
+        "requests_per_second": histogram.count / elapsed if elapsed else 0.0,
+        "audio_seconds_per_second": histogram.count * args.length / elapsed if elapsed else 0.0,
+        "p50_ms": histogram.percentile(50) * 1000,
+        "p95_ms": histogram.percentile(95) * 1000,
+        "p99_ms": histogram.percentile(99) * 1000,
+        "upstream_requests": server.request_count,
+    }
+    print(f"\n完成 {summary['ok']}/{summary['requests']}（429: {rejected}，錯誤: {errors}），"
+          f"{elapsed:.1f}s，{summary['requests_per_second']:.1f} 請求/s，"
+          f"{summary['audio_seconds_per_second']:.0f} 音頻秒/s")
+    print(f"客戶端延遲 p50 {summary['p50_ms']:.0f} ms，p95 {summary['p95_ms']:.0f} ms，"
+          f"p99 {summary['p99_ms']:.0f} ms（上游請求 {summary['upstream_requests']} 個）")
+    print("\n服務端各階段延遲:")
+    print(engine.metrics.format_summary())
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "summary": summary, "daemon": stats}, f, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+端到端效能測試
+End-to-end pipeline benchmark against a local mock transcription server
+
+用合成語音（或指定的音頻文件）走完整條流程：
+模擬輸入流 → 錄音器 → 靜音修剪 → 編碼 → 本地模擬 /v1/audio/transcriptions → 後處理，
+不需要麥克風、macOS 或 API 金鑰，可在 Linux CI 上執行。
+
+報告：
+- 每種錄音長度：停止 → 文字的延遲 p50/p95/p99、各階段中位數、錯誤率、峰值記憶體
+- 吞吐量：多個請求並行時每秒完成的請求數和音頻秒數
+
+用法:
+    python3 bench_pipeline.py
+    python3 bench_pipeline.py --lengths 5 30 120 --iterations 5 --latency 0.2 --jitter 0.1
+    python3 bench_pipeline.py --error-rate 0.05 --concurrency 8 --requests 64
+    python3 bench_pipeline.py --fixture meeting.wav
+    python3 bench_pipeline.py --save-baseline pipeline.json
+    python3 bench_pipeline.py --baseline pipeline.json --tolerance 0.25
+"""
+
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from openai import OpenAI
+
+from audio_simulation import SimulatedAudio
+from mock_transcription_server import MockTranscriptionServer
+from recorder import AudioRecorder
+from transcription_engine import NullSink, TranscriptionEngine
+
+SAMPLE_RATE = 16000
+
+# 表格中列出中位數的階段（階段名稱, 欄位標題）
+STAGE_COLUMNS = (("drain", "drain"), ("vad", "vad"), ("encode", "encode"),
+                 ("request_ttfb", "ttfb"), ("postprocess", "post"))
+
+
+def synthetic_speech(seconds, sample_rate=SAMPLE_RATE, seed=0):
+    """合成類語音音頻：帶包絡的諧波「句子」與停頓交替"""
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        length = int(rng.uniform(1.5, 3.0) * sample_rate)
+        t = np.arange(min(length, total - position)) / sample_rate
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = np.abs(np.sin(np.pi * 3 * t / max(t[-1], 1e-3))) if len(t) else t
+        audio[position:position + len(t)] = voiced * envelope * 6000
+        position += len(t) + int(rng.uniform(0.3, 0.8) * sample_rate)
+    audio += rng.normal(0, 30, total)  # 底噪
+    return np.clip(audio, -32768, 32767).astype(np.int16)
+
+
+def load_fixture(path):
+    """讀取 16 kHz 音頻文件為 int16 單聲道"""
+    from batch_transcribe import read_audio
+    audio, sample_rate = read_audio(path)
+    if sample_rate != SAMPLE_RATE:
+        raise SystemExit(f"{path}: fixture must be {SAMPLE_RATE} Hz, got {sample_rate}")
+    return audio
+
+
+def make_engine(server, audio=None, speed=0.0, segmented=False):
+    recorder = None
+    if audio is not None:
+        recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=SimulatedAudio(audio, speed=speed))
+    engine = TranscriptionEngine(
+        client=OpenAI(api_key="bench", base_url=server.base_url, max_retries=0),
+        sink=NullSink(),
+        recorder=recorder
+    )
+    engine.segmented_transcription_enabled = segmented
+    return engine
+
+
+def run_recordings(server, audio, iterations, speed, segmented):
+    """以模擬輸入流錄音並處理 iterations 次
+
+    Returns:
+        結果字典（延遲為毫秒，記憶體為 MB）
+    """
+    engine = make_engine(server, audio, speed, segmented)
+    errors = 0
+    tracemalloc.reset_peak()
+    baseline_memory = tracemalloc.get_traced_memory()[0]
+    for _ in range(iterations):
+        engine.start_recording()
+        engine.recorder.audio_api.source_consumed.wait()
+        session = engine.stop_recording()
+        try:
+            engine.process_recording(session)
+        except Exception as e:
+            errors += 1
+            logging.debug(f"Request failed: {e}")
+    peak_memory = tracemalloc.get_traced_memory()[1] - baseline_memory
+
+    summary = engine.metrics.summary()
+    total = summary.get("total", {})
+    return {
+        "iterations": iterations,
+        "errors": errors,
+        "error_rate": errors / iterations,
+        "p50_ms": total.get("p50", 0.0),
+        "p95_ms": total.get("p95", 0.0),
+        "p99_ms": total.get("p99", 0.0),
+        "stages_p50_ms": {stage: summary[stage]["p50"] for stage, _ in STAGE_COLUMNS if stage in summary},
+        "peak_mb": peak_memory / 1024 / 1024,
+        "capture": engine.capture_health.stats(),
+    }
+
+
+def run_throughput(server, audio, requests, concurrency):
+    """以 concurrency 個線程並行送出 requests 個請求"""
+    engine = make_engine(server)
+    engine.warm_up(recorder=False)
+
+    def one(_):
+        try:
+            engine.transcribe_audio(audio)
+            return True
+        except Exception:
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        errors = sum(1 for ok in executor.map(one, range(requests)) if not ok)
+    elapsed = time.perf_counter() - start
+    total = engine.metrics.summary().get("total", {})
+    completed = requests - errors
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "error_rate": errors / requests,
+        "elapsed_s": elapsed,
+        "requests_per_s": completed / elapsed,
+        "audio_s_per_s": completed * len(audio) / SAMPLE_RATE / elapsed,
+        "p50_ms": total.get("p50", 0.0),
+        "p95_ms": total.get("p95", 0.0),
+        "p99_ms": total.get("p99", 0.0),
+    }
+
+
+def compare_baseline(results, baseline, tolerance):
+    """與基準比較：各長度 p95 不可高於、吞吐量不可低於 基準 × (1 ± tolerance)"""
+    failures = []
+    for name, scenario in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        limit = base["p95_ms"] * (1 + tolerance)
+        if scenario["p95_ms"] > limit:
+            failures.append(f"{name}: p95 {scenario['p95_ms']:.1f} ms 超過基準上限 {limit:.1f} ms")
+    base = baseline.get("throughput")
+    if base and results.get("throughput"):
+        floor = base["requests_per_s"] * (1 - tolerance)
+        if results["throughput"]["requests_per_s"] < floor:
+            failures.append(f"吞吐量 {results['throughput']['requests_per_s']:.2f} req/s "
+                            f"低於基準下限 {floor:.2f} req/s")
+    return failures
+
+
+def main(argv=None):
+    """主函數"""
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("--lengths", type=float, nargs="+", default=[2, 10, 60],
+                        help="合成錄音長度（秒）")
+    parser.add_argument("--fixture", nargs="*", default=[], help="改用這些 16 kHz 音頻文件")
+    parser.add_argument("--iterations", type=int, default=5, help="每種長度的錄音次數")
+    parser.add_argument("--speed", type=float, default=0.0,
+                        help="模擬輸入流速度，1 為實際時間，0 為不等待")
+    parser.add_argument("--segmented", action="store_true", help="開啟分段轉錄")
+    parser.add_argument("--latency", type=float, default=0.1, help="模擬服務固定延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模擬服務隨機延遲上限（秒）")
+    parser.add_argument("--realtime-factor", type=float, default=0.01,
+                        help="模擬服務每秒音頻的處理時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模擬服務錯誤機率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--requests", type=int, default=32, help="吞吐量測試的請求數，0 表示略過")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--throughput-length", type=float, default=10.0, help="吞吐量測試的錄音長度（秒）")
+    parser.add_argument("--json", help="把結果寫入 JSON 文件")
+    parser.add_argument("--baseline", help="基準結果 JSON；退步超過 tolerance 時以非零狀態退出")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", help="把本次結果寫入 JSON 作為新基準")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    print("=" * 72)
+    print("端到端效能測試")
+    print("End-to-End Pipeline Benchmark")
+    print("=" * 72)
+    print(f"模擬服務: 延遲 {args.latency * 1000:.0f} ms + 抖動 ≤{args.jitter * 1000:.0f} ms "
+          f"+ {args.realtime_factor * 1000:.0f} ms/音頻秒，錯誤率 {args.error_rate:.0%}")
+
+    if args.fixture:
+        inputs = [(f.rsplit("/", 1)[-1], load_fixture(f)) for f in args.fixture]
+    else:
+        inputs = [(f"{length:g}s", synthetic_speech(length, seed=args.seed)) for length in args.lengths]
+
+    results = {"config": vars(args).copy(), "scenarios": {}}
+    tracemalloc.start()
+    with MockTranscriptionServer(latency=args.latency, jitter=args.jitter,
+                                 realtime_factor=args.realtime_factor,
+                                 error_rate=args.error_rate, seed=args.seed) as server:
+        # 預熱：載入編碼器、OpenCC 等，避免第一個場景包含一次性的載入時間
+        make_engine(server).warm_up(recorder=False)
+
+        print(f"\n{'recording':<11}{'n':>4}{'err':>6}{'p50':>9}{'p95':>9}{'p99':>9}"
+              + "".join(f"{title:>9}" for _, title in STAGE_COLUMNS) + f"{'peak MB':>9}")
+        for name, audio in inputs:
+            scenario = run_recordings(server, audio, args.iterations, args.speed, args.segmented)
+            results["scenarios"][name] = scenario
+            stages = scenario["stages_p50_ms"]
+            print(f"{name:<11}{args.iterations:>4}{scenario['error_rate']:>6.0%}"
+                  f"{scenario['p50_ms']:>9.1f}{scenario['p95_ms']:>9.1f}{scenario['p99_ms']:>9.1f}"
+                  + "".join(f"{stages.get(stage, 0.0):>9.1f}" for stage, _ in STAGE_COLUMNS)
+                  + f"{scenario['peak_mb']:>9.1f}")
+        print("(延遲為停止 → 文字，毫秒；階段欄為中位數)")
+
+        if args.requests:
+            audio = synthetic_speech(args.throughput_length, seed=args.seed + 1)
+            throughput = run_throughput(server, audio, args.requests, args.concurrency)
+            results["throughput"] = throughput
+            print(f"\n吞吐量: {throughput['requests']} 個 {args.throughput_length:g}s 請求，"
+                  f"並行 {args.concurrency}: {throughput['requests_per_s']:.2f} req/s，"
+                  f"{throughput['audio_s_per_s']:.1f} 音頻秒/s，錯誤率 {throughput['error_rate']:.0%}，"
+                  f"p50 {throughput['p50_ms']:.0f} ms / p95 {throughput['p95_ms']:.0f} ms")
+    tracemalloc.stop()
+
+    # ru_maxrss: Linux 為 KB，macOS 為 bytes
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results["max_rss_mb"] = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(f"進程峰值 RSS: {results['max_rss_mb']:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"基準已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare_baseline(results, json.load(f), args.tolerance)
+        if failures:
+            for failure in failures:
+                print(f"❌ {failure}")
+            return 1
+        print("✅ 未超過基準")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+冷啟動效能測試
+Cold-start benchmark for speech_to_clipboard
+
+每輪在全新的子進程中計時 import（macOS 上再加上建立 SpeechToClipboardApp，
+不進入事件循環），並檢查較重的依賴沒有在啟動時被載入。子進程的 HOME 指向臨時目錄，
+建立應用時寫入的歷史記錄和錄音暫存不會碰到真正的 ~/.speech-to-action。
+超過預算或相對基準退步時以非零狀態退出，可直接放進 CI。
+
+用法:
+    python3 bench_startup.py                        # 默認預算
+    python3 bench_startup.py --budget-ms 250
+    python3 bench_startup.py --save-baseline startup.json
+    python3 bench_startup.py --baseline startup.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# 啟動時不應載入的模組（應在背景預熱或第一次使用時才載入）
+HEAVY_MODULES = [
+    "numpy", "scipy", "openai", "opencc", "sounddevice", "soundfile",
+    "Quartz", "ApplicationServices", "pynput", "faster_whisper",
+]
+
+# 非 macOS 上無法載入 rumps，只測試轉錄流程模組
+PIPELINE_MODULES = [
+    "audio_encoding", "audio_simulation", "audio_vad", "capture_health", "capture_log", "job_queue",
+    "latency_metrics", "recorder", "recording_spool", "request_policy", "script_conversion",
+    "segment_transcriber", "text_rewriter", "transcription_backends", "transcription_engine",
+]
+
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, {here!r})
+start = time.perf_counter()
+target = "app"
+try:
+    import rumps
+except ImportError:
+    target = "pipeline"
+if target == "app":
+    import speech_to_clipboard
+    imported = time.perf_counter()
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    app = speech_to_clipboard.SpeechToClipboardApp()
+    constructed = time.perf_counter()
+else:
+    for name in {pipeline!r}:
+        __import__(name)
+    imported = constructed = time.perf_counter()
+from lazy_import import is_loaded
+print(json.dumps({{
+    "target": target,
+    "import_ms": (imported - start) * 1000,
+    "init_ms": (constructed - imported) * 1000,
+    "eager": [m for m in {heavy!r} if is_loaded(m)],
+}}))
+"""
+
+
+def run_once():
+    """在新的子進程中測量一次冷啟動"""
+    code = CHILD.format(here=HERE, pipeline=PIPELINE_MODULES, heavy=HEAVY_MODULES)
+    with tempfile.TemporaryDirectory(prefix="bench-startup-") as home:
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            check=True, capture_output=True, text=True, cwd=HERE,
+            env=dict(os.environ, HOME=home)
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--budget-ms", type=float, default=400.0,
+                        help="import + 初始化的中位數上限（毫秒）")
+    parser.add_argument("--baseline", help="基準結果 JSON；超過基準 × (1 + tolerance) 視為退步")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", help="把本次結果寫入 JSON 作為新基準")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("冷啟動效能測試")
+    print("Cold-Start Benchmark")
+    print("=" * 60)
+
+    results = [run_once() for _ in range(args.runs)]
+    target = results[0]["target"]
+    import_ms = statistics.median(r["import_ms"] for r in results)
+    init_ms = statistics.median(r["init_ms"] for r in results)
+    total_ms = import_ms + init_ms
+    eager = sorted({m for r in results for m in r["eager"]})
+
+    print(f"目標: {'speech_to_clipboard (app)' if target == 'app' else 'pipeline modules (rumps unavailable)'}")
+    print(f"import 中位數: {import_ms:.1f} ms")
+    print(f"初始化中位數: {init_ms:.1f} ms")
+    print(f"合計: {total_ms:.1f} ms（預算 {args.budget_ms:.0f} ms）")
+
+    failures = []
+    if eager:
+        failures.append(f"啟動時載入了較重的模組: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"冷啟動 {total_ms:.1f} ms 超過預算 {args.budget_ms:.0f} ms")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("target") == target:
+            limit = baseline["total_ms"] * (1 + args.tolerance)
+            print(f"基準: {baseline['total_ms']:.1f} ms（上限 {limit:.1f} ms）")
+            if total_ms > limit:
+                failures.append(f"冷啟動 {total_ms:.1f} ms 相對基準退步（上限 {limit:.1f} ms）")
+        else:
+            print(f"基準目標為 {baseline.get('target')}，與本次 {target} 不同，略過比較")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"target": target, "import_ms": import_ms, "init_ms": init_ms,
+                       "total_ms": total_ms}, f, indent=2)
+        print(f"基準已保存到 {args.save_baseline}")
+
+    if failures:
+        for failure in failures:
+            print(f"❌ {failure}")
+        return 1
+    print("✅ 冷啟動符合預算")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+詞典替換效能測試
+Micro-benchmark: DictionaryRewriter vs. the per-entry str.replace loop
+
+用法: python3 bench_text_rewriter.py [--entries 500] [--chars 2000]
+"""
+
+import argparse
+import random
+import sys
+import timeit
+
+from text_rewriter import MANUAL_MAPPINGS, DictionaryRewriter, apply_manual_mappings
+
+# 常用漢字範圍內隨機組詞，模擬領域詞彙與更正詞條
+HAN_START, HAN_END = 0x4E00, 0x9FA5
+
+
+def random_word(rng, min_len=2, max_len=4):
+    return "".join(chr(rng.randint(HAN_START, HAN_END)) for _ in range(rng.randint(min_len, max_len)))
+
+
+def build_mappings(rng, entries):
+    """建立詞條；替換詞使用 ASCII，避免逐條替換時替換結果再被後面的詞條命中"""
+    mappings = dict(MANUAL_MAPPINGS)
+    while len(mappings) < entries:
+        mappings[random_word(rng)] = f"<{len(mappings)}>"
+    return mappings
+
+
+def reference_rewrite(text, mappings):
+    """最左最長匹配的逐字參考實現（慢，只用於驗證結果）"""
+    max_len = max(map(len, mappings))
+    out = []
+    i = 0
+    while i < len(text):
+        for length in range(min(max_len, len(text) - i), 0, -1):
+            if text[i:i + length] in mappings:
+                out.append(mappings[text[i:i + length]])
+                i += length
+                break
+        else:
+            out.append(text[i])
+            i += 1
+    return "".join(out)
+
+
+def build_text(rng, mappings, chars):
+    """建立約 chars 字的文字，其中約一成是詞典詞條"""
+    keys = list(mappings)
+    parts = []
+    length = 0
+    while length < chars:
+        part = rng.choice(keys) if rng.random() < 0.1 else random_word(rng, 1, 3)
+        parts.append(part)
+        length += len(part)
+    return "".join(parts)
+
+
+def bench(entries, chars, repeat):
+    rng = random.Random(42)
+    mappings = build_mappings(rng, entries)
+    text = build_text(rng, mappings, chars)
+    rewriter = DictionaryRewriter(mappings)
+
+    # 結果必須符合最左最長匹配；逐條替換在詞條重疊時結果取決於順序
+    result = rewriter.rewrite(text)
+    same = result == reference_rewrite(text, mappings)
+    loop_same = result == apply_manual_mappings(text, mappings)
+
+    number = max(1, repeat)
+    loop = min(timeit.repeat(lambda: apply_manual_mappings(text, mappings), number=number, repeat=5)) / number
+    single = min(timeit.repeat(lambda: rewriter.rewrite(text), number=number, repeat=5)) / number
+    compile_time = min(timeit.repeat(lambda: DictionaryRewriter(mappings), number=1, repeat=3))
+
+    print(f"{entries:>6} entries {chars:>7} chars | "
+          f"loop {loop * 1e6:>9.1f} µs | single-pass {single * 1e6:>9.1f} µs | "
+          f"{loop / single:>6.1f}x | compile {compile_time * 1e3:.1f} ms | "
+          f"{'✅ correct' if same else '❌ wrong output'}"
+          f"{'' if loop_same else ' (loop differs: overlapping keys)'}")
+    return same
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Benchmark the dictionary rewrite engine")
+    parser.add_argument("--entries", type=int, nargs="*", default=[6, 24, 100, 500, 2000])
+    parser.add_argument("--chars", type=int, nargs="*", default=[200, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("詞典替換效能測試")
+    print("Dictionary Rewrite Benchmark")
+    print("=" * 60)
+
+    ok = True
+    for entries in args.entries:
+        for chars in args.chars:
+            ok = bench(entries, chars, args.repeat) and ok
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""
+音頻擷取健康狀態
+Capture health counters for the audio callback
+
+音頻回調每次呼叫 record_callback：
+    overflows / underflows   PortAudio 回報的輸入溢出 / 不足（溢出表示設備丟了數據）
+    dropped_blocks           時間戳不連續的區塊（前一個區塊之後有音頻沒有送到回調）
+    dropped_frames           由時間戳缺口估算的遺失幀數
+    jitter                   回調間隔與區塊時長的偏差
+    queue_depth              回調執行時主機緩衝區中等待的區塊數（currentTime - inputBufferAdcTime）
+    callback_time            回調本身的耗時（超過區塊時長就會溢出）
+    stream_open              打開輸入流的耗時
+
+回調中只做幾次加法和一次直方圖記錄，不上鎖、不配置大塊記憶體；
+stats() 在其他線程中讀取時先複製直方圖，只需要 GIL 保證的原子操作。
+"""
+
+import math
+
+from latency_metrics import LatencyHistogram
+
+COUNTERS = ("callbacks", "frames", "overflows", "underflows", "dropped_blocks", "dropped_frames")
+
+
+def _copy_histogram(histogram):
+    copy = LatencyHistogram()
+    copy.counts = dict(histogram.counts)
+    copy.count = histogram.count
+    copy.sum = histogram.sum
+    copy.max = histogram.max
+    return copy
+
+
+class CaptureHealth:
+    """輸入流回調的計數和時間分佈（由音頻線程寫入，其他線程讀取）"""
+
+    def __init__(self, sample_rate):
+        self.sample_rate = sample_rate
+        self.reset()
+
+    def reset(self):
+        for name in COUNTERS:
+            setattr(self, name, 0)
+        self.max_queue_depth = 0
+        self.jitter = LatencyHistogram()
+        self.callback_time = LatencyHistogram()
+        self.stream_open = LatencyHistogram()
+        self._last_arrival = None
+        self._expected_adc = None
+
+    def stream_started(self):
+        """輸入流重新打開：下一個回調不與之前的回調比較間隔和時間戳"""
+        self._last_arrival = None
+        self._expected_adc = None
+
+    def record_stream_open(self, seconds):
+        self.stream_open.record(seconds)
+
+    def record_callback(self, frames, time_info, status, arrival):
+        """記錄一次回調（在音頻線程中執行）
+
+        Args:
+            frames: 區塊幀數
+            time_info: PortAudio 的時間資訊（inputBufferAdcTime / currentTime）
+            status: 回調狀態旗標
+            arrival: 回調開始的 time.perf_counter()
+        """
+        block_seconds = frames / self.sample_rate
+        self.callbacks += 1
+        self.frames += frames
+        if status:
+            if getattr(status, "input_overflow", False):
+                self.overflows += 1
+            if getattr(status, "input_underflow", False):
+                self.underflows += 1
+
+        if self._last_arrival is not None:
+            self.jitter.record(abs(arrival - self._last_arrival - block_seconds))
+        self._last_arrival = arrival
+
+        # 部分主機不提供時間戳（為 0），只用旗標計數
+        adc = getattr(time_info, "inputBufferAdcTime", 0.0)
+        current = getattr(time_info, "currentTime", 0.0)
+        if adc > 0 and current > 0:
+            depth = math.ceil((current - adc) / block_seconds - 1e-6)
+            if depth > self.max_queue_depth:
+                self.max_queue_depth = depth
+            if self._expected_adc is not None:
+                gap = adc - self._expected_adc
+                if gap > block_seconds / 2:
+                    self.dropped_blocks += 1
+                    self.dropped_frames += round(gap * self.sample_rate)
+            self._expected_adc = adc + block_seconds
+
+    def record_callback_time(self, seconds):
+        self.callback_time.record(seconds)
+
+    def checkpoint(self):
+        """目前的計數（與之後的 since() 比較一段錄音內的變化）"""
+        return {name: getattr(self, name) for name in COUNTERS}
+
+    def since(self, checkpoint):
+        """checkpoint 之後各計數的增量"""
+        return {name: getattr(self, name) - checkpoint.get(name, 0) for name in COUNTERS}
+
+    def stats(self):
+        """計數和時間分佈（毫秒）"""
+        result = {name: getattr(self, name) for name in COUNTERS}
+        result["max_queue_depth"] = self.max_queue_depth
+        for name in ("jitter", "callback_time", "stream_open"):
+            histogram = _copy_histogram(getattr(self, name))
+            result[name] = {
+                "count": histogram.count,
+                "p50": histogram.percentile(50) * 1000,
+                "p99": histogram.percentile(99) * 1000,
+                "max": histogram.max * 1000,
+            }
+        return result
+
+    def format_stats(self):
+        stats = self.stats()
+        jitter, callback, stream_open = stats["jitter"], stats["callback_time"], stats["stream_open"]
+        return (f"回調 {stats['callbacks']}，溢出 {stats['overflows']}，不足 {stats['underflows']}，"
+                f"丟失區塊 {stats['dropped_blocks']}（約 {stats['dropped_frames'] / self.sample_rate:.2f}s）\n"
+                f"回調間隔抖動 p50 {jitter['p50']:.1f} ms，p99 {jitter['p99']:.1f} ms，"
+                f"最大 {jitter['max']:.1f} ms\n"
+                f"回調耗時 p99 {callback['p99']:.2f} ms，最大排隊 {stats['max_queue_depth']} 個區塊\n"
+                f"打開輸入流 p50 {stream_open['p50']:.0f} ms，最大 {stream_open['max']:.0f} ms"
+                f"（{stream_open['count']} 次）")
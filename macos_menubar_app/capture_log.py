@@ -0,0 +1,294 @@
+"""
+原始音頻擷取記錄與重放
+Binary log of raw audio callback blocks and a replaying audio API
+
+開啟後（AudioRecorder.capture_log）每個音頻回調的區塊連同時間戳和狀態旗標
+寫入一個緊湊的二進位文件；ReplayAudio 把這樣的文件當作 sounddevice 相容的輸入
+回放給錄音器，按原來的回調間隔（或加速）送出原來的區塊、時間戳和旗標，
+不需要麥克風即可在 Linux 上重現一段真實錄音的延遲和記憶體表現。
+
+文件格式（小端序）:
+    文件頭    MAGIC, 版本 (u16), 採樣率 (u32), 聲道數 (u16)
+    每條記錄  類型 (u8), 到達時間 (f64), inputBufferAdcTime (f64), currentTime (f64),
+              幀數 (u32), 狀態旗標 (u8)；區塊記錄之後接 幀數 × 聲道數 個 int16 樣本
+    類型      STREAM 為打開輸入流（幀數為 blocksize），BLOCK 為一個回調區塊
+到達時間是相對於記錄開始的 time.perf_counter() 秒數。中途崩潰時文件尾部可能
+缺少半條記錄，讀取時忽略。
+
+回調中只複製區塊並放入隊列，寫入由背景線程完成。
+"""
+
+import logging
+import queue
+import struct
+import threading
+import time
+
+from audio_simulation import CallbackAbort, CallbackFlags, CallbackStop, SimulatedAudio, TimeInfo
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"STTCAPT\0"
+VERSION = 1
+HEADER = struct.Struct("<8sHIH")
+RECORD = struct.Struct("<BdddIB")
+
+KIND_STREAM = 1
+KIND_BLOCK = 2
+
+FLAG_OVERFLOW = 1
+FLAG_UNDERFLOW = 2
+
+
+def encode_status(status):
+    """sounddevice.CallbackFlags → 狀態旗標位元"""
+    flags = 0
+    if status:
+        if getattr(status, "input_overflow", False):
+            flags |= FLAG_OVERFLOW
+        if getattr(status, "input_underflow", False):
+            flags |= FLAG_UNDERFLOW
+    return flags
+
+
+def decode_status(flags):
+    return CallbackFlags(input_overflow=bool(flags & FLAG_OVERFLOW),
+                         input_underflow=bool(flags & FLAG_UNDERFLOW))
+
+
+class CaptureLogWriter:
+    """把音頻回調的區塊寫入擷取記錄（音頻線程呼叫 write_block，背景線程寫文件）"""
+
+    def __init__(self, path, sample_rate, channels):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.blocks = 0
+        self._origin = time.perf_counter()
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, VERSION, sample_rate, channels))
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="capture-log", daemon=True)
+        self._thread.start()
+        logger.info(f"Capturing raw audio blocks to {path}")
+
+    def stream_started(self, blocksize):
+        """打開了新的輸入流（重放時從這裡開始一段錄音）"""
+        self._queue.put((KIND_STREAM, time.perf_counter() - self._origin, 0.0, 0.0, blocksize, 0, None))
+
+    def write_block(self, indata, time_info, status, arrival):
+        """記錄一個回調區塊（在音頻線程中執行，只複製區塊）"""
+        if self._closed:
+            return
+        self.blocks += 1
+        self._queue.put((KIND_BLOCK, arrival - self._origin,
+                         getattr(time_info, "inputBufferAdcTime", 0.0),
+                         getattr(time_info, "currentTime", 0.0),
+                         len(indata), encode_status(status), indata.tobytes()))
+
+    def _run(self):
+        f = self._file
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            *fields, data = item
+            f.write(RECORD.pack(*fields))
+            if data is not None:
+                f.write(data)
+            # 隊列空了就落盤：崩潰時最多遺失正在寫的記錄
+            if self._queue.empty():
+                f.flush()
+        f.close()
+
+    def close(self):
+        """寫完隊列中的記錄並關閉文件"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        logger.info(f"Captured {self.blocks} audio blocks to {self.path}")
+
+
+class CaptureRecord:
+    """擷取記錄中的一條記錄；區塊數據是文件 memmap 的視圖"""
+
+    __slots__ = ("kind", "arrival", "adc_time", "current_time", "frames", "flags", "data")
+
+    def __init__(self, kind, arrival, adc_time, current_time, frames, flags, data=None):
+        self.kind = kind
+        self.arrival = arrival
+        self.adc_time = adc_time
+        self.current_time = current_time
+        self.frames = frames
+        self.flags = flags
+        self.data = data
+
+
+class CaptureLog:
+    """讀取擷取記錄：按輸入流分組的區塊"""
+
+    def __init__(self, path):
+        self.path = path
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        if len(raw) < HEADER.size:
+            raise ValueError(f"{path}: not an audio capture log")
+        magic, version, self.sample_rate, self.channels = HEADER.unpack(raw[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not an audio capture log (version {version})")
+        # 每個輸入流一個列表；STREAM 記錄之前的區塊自成一段
+        self.streams = []
+        blocksizes = []
+        offset = HEADER.size
+        frame_bytes = 2 * self.channels
+        while offset + RECORD.size <= len(raw):
+            kind, arrival, adc, current, frames, flags = RECORD.unpack(
+                raw[offset:offset + RECORD.size].tobytes())
+            offset += RECORD.size
+            if kind == KIND_STREAM:
+                self.streams.append([])
+                blocksizes.append(frames)
+                continue
+            end = offset + frames * frame_bytes
+            if kind != KIND_BLOCK or end > len(raw):
+                break
+            data = raw[offset:end].view(np.int16).reshape(frames, self.channels)
+            offset = end
+            if not self.streams:
+                self.streams.append([])
+                blocksizes.append(frames)
+            self.streams[-1].append(CaptureRecord(kind, arrival, adc, current, frames, flags, data))
+        self.blocksizes = blocksizes
+
+    @property
+    def blocks(self):
+        return sum(len(stream) for stream in self.streams)
+
+    @property
+    def duration(self):
+        """所有區塊的音頻長度（秒）"""
+        return sum(record.frames for stream in self.streams for record in stream) / self.sample_rate
+
+    def stream_audio(self, index):
+        """第 index 個輸入流的完整音頻（複製）"""
+        stream = self.streams[index]
+        if not stream:
+            return np.zeros((0, self.channels), dtype=np.int16)
+        return np.concatenate([record.data for record in stream])
+
+
+class ReplayInputStream:
+    """在背景線程按記錄的間隔回放一個輸入流的區塊，之後送出靜音"""
+
+    def __init__(self, audio_api, records, samplerate, channels, callback, finished_callback=None,
+                 blocksize=1024, **kwargs):
+        self.audio_api = audio_api
+        self.records = records
+        self.samplerate = samplerate
+        self.channels = channels
+        self.blocksize = blocksize or 1024
+        self._callback = callback
+        self._finished_callback = finished_callback
+        self._stop_event = threading.Event()
+        self._thread = None
+        self.active = False
+        self.closed = False
+
+    def start(self):
+        self.active = True
+        self._thread = threading.Thread(target=self._run, name="replay-input", daemon=True)
+        self._thread.start()
+
+    def _blocks(self, origin):
+        """(相對到達時間, 區塊, TimeInfo, 狀態旗標)，記錄用完後為靜音
+
+        時間戳平移到 origin（目前的 time.monotonic 時基），保留記錄中的間隔和缺口；
+        記錄中沒有時間戳（為 0）時照樣傳 0。
+        """
+        records = self.records
+        block_seconds = self.blocksize / self.samplerate
+        base = records[0].current_time if records and records[0].current_time > 0 else None
+        arrival = 0.0
+        adc = block_seconds
+        for record in records:
+            arrival = record.arrival - records[0].arrival
+            if base is None or record.adc_time <= 0:
+                time_info = TimeInfo(0.0, 0.0)
+            else:
+                adc = record.adc_time - base
+                time_info = TimeInfo(origin + adc, origin + record.current_time - base)
+                adc += record.frames / self.samplerate
+            yield arrival, record.data[:, :self.channels], time_info, record.flags
+        self.audio_api.source_consumed.set()
+        silence = np.zeros((self.blocksize, self.channels), dtype=np.int16)
+        while True:
+            arrival += block_seconds
+            yield arrival, silence, TimeInfo(origin + adc, origin + adc + block_seconds), 0
+            adc += block_seconds
+
+    def _run(self):
+        speed = self.audio_api.speed
+        origin = time.monotonic()
+        try:
+            for arrival, block, time_info, flags in self._blocks(origin):
+                if self._stop_event.is_set():
+                    break
+                if speed > 0:
+                    delay = origin + arrival / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                try:
+                    self._callback(block, len(block), time_info, decode_status(flags))
+                except (CallbackStop, CallbackAbort):
+                    break
+        finally:
+            self.active = False
+            if self._finished_callback is not None:
+                self._finished_callback()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def abort(self):
+        self.stop()
+
+    def close(self):
+        self.stop()
+        self.closed = True
+
+
+class ReplayAudio(SimulatedAudio):
+    """與 sounddevice 相容的音頻 API，每次打開輸入流回放記錄中的下一個輸入流
+
+    記錄中的輸入流都回放完之後，再打開的輸入流只送出靜音。
+    """
+
+    def __init__(self, log, speed=1.0):
+        """
+        Args:
+            log: CaptureLog 或擷取記錄文件路徑
+            speed: 回放速度，1 為記錄時的實際間隔，0 表示不等待
+        """
+        if isinstance(log, str):
+            log = CaptureLog(log)
+        super().__init__(np.zeros((0, log.channels), dtype=np.int16), speed=speed,
+                         device_name=f"Replay of {log.path}")
+        self.log = log
+
+    @property
+    def remaining(self):
+        """尚未回放的輸入流數"""
+        return max(len(self.log.streams) - self.streams_opened, 0)
+
+    def InputStream(self, **kwargs):
+        records = self.log.streams[self.streams_opened] if self.remaining else []
+        self.streams_opened += 1
+        self.source_consumed.clear()
+        return ReplayInputStream(self, records, **kwargs)
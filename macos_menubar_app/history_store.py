@@ -0,0 +1,187 @@
+"""
+轉錄記錄
+Bounded, indexed transcription history
+
+每次轉錄的文字、時間、錄音長度、目標應用和延遲保存在 SQLite（WAL 模式），
+全文搜尋使用 FTS5 索引（trigram 分詞，中文不需要斷詞）；少於三個字的查詢
+trigram 無法索引，改用 LIKE 掃描。記憶體中只保留最近的 recent_limit 條，
+長時間運行時記憶體用量固定。
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    text TEXT NOT NULL,
+    raw_text TEXT,
+    duration REAL,
+    target_app TEXT,
+    latency_ms REAL
+);
+CREATE INDEX IF NOT EXISTS transcripts_created_at ON transcripts (created_at);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transcripts_fts USING fts5(
+    text, content='transcripts', content_rowid='id', tokenize='{tokenizer}'
+);
+CREATE TRIGGER IF NOT EXISTS transcripts_ai AFTER INSERT ON transcripts BEGIN
+    INSERT INTO transcripts_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS transcripts_ad AFTER DELETE ON transcripts BEGIN
+    INSERT INTO transcripts_fts (transcripts_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+COLUMNS = "id, created_at, text, raw_text, duration, target_app, latency_ms"
+
+
+class HistoryEntry:
+    """一條轉錄記錄"""
+
+    def __init__(self, id, created_at, text, raw_text=None, duration=None,
+                 target_app=None, latency_ms=None):
+        self.id = id
+        self.created_at = created_at
+        self.text = text
+        self.raw_text = raw_text
+        self.duration = duration
+        self.target_app = target_app
+        self.latency_ms = latency_ms
+
+    def __repr__(self):
+        return f"HistoryEntry({self.id}, {self.text[:20]!r})"
+
+
+class HistoryStore:
+    """SQLite 轉錄記錄，加上有上限的最近記錄快取"""
+
+    def __init__(self, path, recent_limit=50):
+        """
+        Args:
+            path: 資料庫文件路徑（":memory:" 用於測試）
+            recent_limit: 記憶體中保留的最近記錄數
+        """
+        self.path = path
+        self.recent_limit = recent_limit
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # 工作線程寫入、主線程查詢，共用一個連線並以鎖串行化
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._recent = OrderedDict()
+        self.fts_tokenizer = None
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._create_fts()
+            rows = self._conn.execute(
+                f"SELECT {COLUMNS} FROM transcripts ORDER BY id DESC LIMIT ?", (recent_limit,)
+            ).fetchall()
+        for row in reversed(rows):
+            self._remember(HistoryEntry(*row))
+
+    def _create_fts(self):
+        """建立全文索引；SQLite 不支援 trigram 時退回 unicode61，不支援 FTS5 時只用 LIKE"""
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._conn.executescript(FTS_SCHEMA.format(tokenizer=tokenizer))
+                self.fts_tokenizer = tokenizer
+                return
+            except sqlite3.OperationalError as e:
+                logger.warning(f"FTS5 tokenizer {tokenizer} unavailable: {e}")
+
+    def _remember(self, entry):
+        self._recent[entry.id] = entry
+        self._recent.move_to_end(entry.id)
+        while len(self._recent) > self.recent_limit:
+            self._recent.popitem(last=False)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+
+    def add(self, text, raw_text=None, duration=None, target_app=None, latency=None):
+        """保存一條記錄
+
+        Args:
+            latency: 停止 → 輸出的延遲（秒）
+
+        Returns:
+            HistoryEntry
+        """
+        created_at = time.time()
+        latency_ms = None if latency is None else round(latency * 1000, 1)
+        with self._lock:
+            with self._conn:
+                cursor = self._conn.execute(
+                    "INSERT INTO transcripts (created_at, text, raw_text, duration, target_app, latency_ms)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (created_at, text, raw_text, duration, target_app, latency_ms)
+                )
+            entry = HistoryEntry(cursor.lastrowid, created_at, text, raw_text, duration,
+                                 target_app, latency_ms)
+            self._remember(entry)
+        return entry
+
+    def add_result(self, result):
+        """保存一個 TranscriptionResult"""
+        return self.add(result.text, result.raw_text, result.duration,
+                        result.delivery.target, result.latency)
+
+    def recent(self, count=5):
+        """最近的 count 條記錄（新的在前，不查詢資料庫）"""
+        with self._lock:
+            entries = list(self._recent.values())
+        return entries[::-1][:count]
+
+    def get(self, entry_id):
+        """按 id 取得記錄（先查最近記錄快取）"""
+        with self._lock:
+            entry = self._recent.get(entry_id)
+            if entry is not None:
+                return entry
+            row = self._conn.execute(
+                f"SELECT {COLUMNS} FROM transcripts WHERE id = ?", (entry_id,)
+            ).fetchone()
+        return HistoryEntry(*row) if row else None
+
+    def search(self, query, limit=20):
+        """全文搜尋，新的在前
+
+        Args:
+            query: 要尋找的文字（按字面比對，不解析 FTS 語法）
+            limit: 最多回傳的記錄數
+        """
+        query = query.strip()
+        if not query:
+            return []
+        # trigram 只能索引三個字以上的查詢；其他分詞器按詞比對
+        if self.fts_tokenizer == "trigram" and len(query) >= 3 or self.fts_tokenizer == "unicode61":
+            phrase = '"' + query.replace('"', '""') + '"'
+            sql = (f"SELECT {COLUMNS} FROM transcripts WHERE id IN "
+                   "(SELECT rowid FROM transcripts_fts WHERE transcripts_fts MATCH ?) "
+                   "ORDER BY id DESC LIMIT ?")
+            params = (phrase, limit)
+        else:
+            pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql = (f"SELECT {COLUMNS} FROM transcripts WHERE text LIKE ? ESCAPE '\\' "
+                   "ORDER BY id DESC LIMIT ?")
+            params = (pattern, limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [HistoryEntry(*row) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,105 @@
+"""
+轉錄工作隊列
+Pipelined job queue for stopped recordings
+
+每段停止的錄音成為一個工作，由線程池並行處理，新的錄音可以立即開始。
+輸出（複製、粘貼）默認嚴格按錄音順序：先完成的工作在 wait_turn 等待前面的工作輸出，
+失敗的工作同樣會讓出順序；關閉 ordered 後按完成順序輸出。
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """隊列中的一個工作"""
+
+    def __init__(self, queue, sequence):
+        self.queue = queue
+        self.sequence = sequence
+
+    def is_turn(self):
+        """是否已輪到這個工作輸出（不等待）"""
+        return self.queue._is_turn(self.sequence)
+
+    def wait_turn(self):
+        """等待輪到這個工作輸出（按完成順序輸出時立即返回）"""
+        self.queue._wait_turn(self.sequence)
+
+
+class JobQueue:
+    """以線程池處理工作，並按提交順序放行輸出"""
+
+    def __init__(self, workers=2, ordered=True):
+        """
+        Args:
+            workers: 同時處理的工作數
+            ordered: 是否按提交順序輸出
+        """
+        self._ordered = ordered
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._cond = threading.Condition()
+        self._submitted = 0
+        # 下一個可以輸出的工作序號，以及已完成但還沒輪到的序號
+        self._turn = 0
+        self._finished = set()
+
+    @property
+    def ordered(self):
+        return self._ordered
+
+    @ordered.setter
+    def ordered(self, ordered):
+        with self._cond:
+            self._ordered = ordered
+            self._cond.notify_all()
+
+    @property
+    def pending(self):
+        """已提交但尚未完成的工作數"""
+        with self._cond:
+            return self._submitted - self._turn - len(self._finished)
+
+    def submit(self, fn):
+        """提交工作
+
+        Args:
+            fn: 工作函數 (job) -> 結果；輸出前應呼叫 job.wait_turn()
+
+        Returns:
+            concurrent.futures.Future
+        """
+        with self._cond:
+            job = Job(self, self._submitted)
+            self._submitted += 1
+        logger.info(f"Queued job {job.sequence} ({self.pending} pending)")
+        return self._executor.submit(self._run, job, fn)
+
+    def _run(self, job, fn):
+        try:
+            return fn(job)
+        finally:
+            self._complete(job.sequence)
+
+    def _is_turn(self, sequence):
+        with self._cond:
+            return not self._ordered or sequence <= self._turn
+
+    def _wait_turn(self, sequence):
+        with self._cond:
+            while self._ordered and sequence > self._turn:
+                self._cond.wait()
+
+    def _complete(self, sequence):
+        with self._cond:
+            self._finished.add(sequence)
+            while self._turn in self._finished:
+                self._finished.remove(self._turn)
+                self._turn += 1
+            self._cond.notify_all()
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,221 @@
+"""
+延遲統計
+Per-stage latency spans and an in-process metrics registry
+
+每段錄音（utterance）對應一個 Trace，記錄各階段耗時：
+    stream_open     按下快捷鍵 → 輸入流打開
+    drain           停止 → 最後一個區塊落地
+    vad             靜音修剪
+    encode          上傳前編碼
+    request_ttfb    請求送出 → 收到回應標頭（含上傳和模型時間，客戶端無法再細分）
+    request_body    回應標頭 → 回應解析完成
+    model           本機模型推理
+    postprocess     簡繁轉換 + 詞典替換
+    clipboard       寫入並確認剪貼板
+    paste           模擬 Command+V
+    total           停止 → 輸出完成
+
+Trace 在處理線程中以 activate() 設為目前的 trace，流程中的各模組只需要
+`with span("encode"):`，沒有目前 trace 時不做任何事。
+完成的 trace 寫入 MetricsRegistry：每個階段一個對數分桶直方圖（固定記憶體），
+提供 p50/p95/p99，並可逐行匯出為 JSONL。
+"""
+
+import contextlib
+import itertools
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 顯示順序
+STAGES = (
+    "stream_open", "queue", "drain", "spool", "vad", "encode", "request_ttfb", "request_body",
+    "model", "postprocess", "reorder", "clipboard", "paste", "first_text", "total",
+)
+
+_local = threading.local()
+_trace_ids = itertools.count(1)
+
+
+class LatencyHistogram:
+    """對數分桶直方圖：相鄰桶邊界相差 GROWTH 倍，百分位數相對誤差不超過 GROWTH - 1"""
+
+    MIN_SECONDS = 1e-4
+    GROWTH = 1.05
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _bucket(self, seconds):
+        if seconds <= self.MIN_SECONDS:
+            return 0
+        return int(math.log(seconds / self.MIN_SECONDS, self.GROWTH)) + 1
+
+    def _upper_bound(self, bucket):
+        return self.MIN_SECONDS * self.GROWTH ** bucket
+
+    def record(self, seconds):
+        bucket = self._bucket(seconds)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """第 q 百分位數（秒），取所在桶的上界，不超過實際最大值"""
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self._upper_bound(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+
+class Trace:
+    """一段錄音各階段的耗時"""
+
+    def __init__(self, registry=None, **fields):
+        """
+        Args:
+            registry: 完成時寫入的 MetricsRegistry（None 表示不記錄）
+            fields: 一併匯出的附加欄位（例如 mode="batch"）
+        """
+        self.id = next(_trace_ids)
+        self.registry = registry
+        self.fields = fields
+        self.started_at = time.time()
+        self.spans = {}
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def add(self, name, seconds):
+        """記錄一個階段的耗時（同名階段累加，例如分段轉錄的多次請求）"""
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextlib.contextmanager
+    def activate(self):
+        """在目前線程中把這個 trace 設為目前的 trace"""
+        previous = getattr(_local, "trace", None)
+        _local.trace = self
+        try:
+            yield self
+        finally:
+            _local.trace = previous
+
+    def finish(self, **fields):
+        """寫入 registry（只寫一次）"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+        self.fields.update(fields)
+        if self.registry is not None:
+            self.registry.record_trace(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "timestamp": self.started_at,
+            **self.fields,
+            "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()},
+        }
+
+
+def current_trace():
+    """目前線程中的 trace，沒有時為 None"""
+    return getattr(_local, "trace", None)
+
+
+@contextlib.contextmanager
+def span(name):
+    """在目前的 trace 中計時一個階段；沒有目前 trace 時不做任何事"""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    with trace.span(name):
+        yield
+
+
+class MetricsRegistry:
+    """各階段延遲直方圖，可選擇把每個 trace 追加到 JSONL 文件"""
+
+    def __init__(self, export_path=None):
+        """
+        Args:
+            export_path: JSONL 匯出文件路徑，None 表示不匯出
+        """
+        self.export_path = export_path
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record_trace(self, trace):
+        for name, seconds in trace.spans.items():
+            self.record(name, seconds)
+        if self.export_path:
+            try:
+                with self._lock, open(self.export_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning(f"Failed to export latency trace: {e}")
+
+    def summary(self):
+        """{階段: {count, mean, p50, p95, p99, max}}（毫秒），按 STAGES 順序"""
+        with self._lock:
+            names = sorted(self._histograms, key=lambda n: (STAGES.index(n) if n in STAGES else len(STAGES), n))
+            return {
+                name: {
+                    "count": h.count,
+                    "mean": h.mean * 1000,
+                    "p50": h.percentile(50) * 1000,
+                    "p95": h.percentile(95) * 1000,
+                    "p99": h.percentile(99) * 1000,
+                    "max": h.max * 1000,
+                }
+                for name, h in ((n, self._histograms[n]) for n in names)
+            }
+
+    def format_summary(self):
+        """純文字表格（菜單和命令列顯示用）"""
+        summary = self.summary()
+        if not summary:
+            return "(尚無記錄)"
+        lines = [f"{'stage':<13}{'n':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}  (ms)"]
+        for name, s in summary.items():
+            lines.append(f"{name:<13}{s['count']:>5}{s['p50']:>9.1f}{s['p95']:>9.1f}"
+                         f"{s['p99']:>9.1f}{s['max']:>9.1f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
@@ -0,0 +1,107 @@
+"""
+延遲載入模組
+Lazy module imports
+
+lazy_import("openai") 立即回傳模組物件，但模組本體要到第一次存取屬性時才執行，
+讓啟動時不必為暫時用不到的大型依賴（numpy、scipy、openai、pyobjc 框架等）付出載入時間。
+模組常在背景預熱線程和主線程同時第一次使用；Python 3.12 之前 importlib.util.LazyLoader
+沒有鎖，這裡改用加鎖的版本。
+"""
+
+import importlib.util
+import sys
+import threading
+import types
+
+
+class _LockedLazyModule(types.ModuleType):
+    """第一次存取屬性時在鎖內執行模組（雙重檢查）
+
+    執行完成前 __class__ 保持不變，其他線程在鎖上等待，不會看到只執行了一半的模組；
+    取得鎖後若已由其他線程載入則直接讀取。執行模組期間同一線程的遞迴存取直接讀取
+    目前的屬性，與一般循環 import 相同。
+    """
+
+    def __getattribute__(self, attr):
+        spec = object.__getattribute__(self, "__spec__")
+        state = spec.loader_state
+        with state["lock"]:
+            if object.__getattribute__(self, "__class__") is _LockedLazyModule:
+                if state["loading"]:
+                    return object.__getattribute__(self, attr)
+                state["loading"] = True
+                try:
+                    _execute(self, spec)
+                finally:
+                    state["loading"] = False
+        return object.__getattribute__(self, attr)
+
+
+def _execute(module, spec):
+    """執行延遲的模組（與 importlib.util._LazyModule 相同），完成後才換回 ModuleType"""
+    # 保留建立模組之後、載入之前被設定的屬性
+    attrs_then = spec.loader_state["__dict__"]
+    attrs_now = object.__getattribute__(module, "__dict__")
+    attrs_updated = {key: value for key, value in attrs_now.items()
+                     if key not in attrs_then or value is not attrs_then[key]}
+    spec.loader.exec_module(module)
+    if spec.name in sys.modules and sys.modules[spec.name] is not module:
+        raise ValueError(f"module object for {spec.name!r} substituted in sys.modules during a lazy load")
+    attrs_now.update(attrs_updated)
+    module.__class__ = types.ModuleType
+
+
+class _LockedLazyLoader(importlib.util.LazyLoader):
+    def exec_module(self, module):
+        spec = module.__spec__
+        super().exec_module(module)
+        # 此後 module 已是 _LazyModule，不能再經由屬性存取，否則會立即載入
+        spec.loader_state.update(lock=threading.RLock(), loading=False)
+        module.__class__ = _LockedLazyModule
+
+
+# Python 3.12 起 LazyLoader 本身已加鎖
+_LazyLoader = importlib.util.LazyLoader if sys.version_info >= (3, 12) else _LockedLazyLoader
+
+
+class MissingModule:
+    """不存在的可選模組：存取任何屬性時才拋出 ModuleNotFoundError"""
+
+    def __init__(self, name):
+        self.__name__ = name
+
+    def __getattr__(self, attr):
+        raise ModuleNotFoundError(f"No module named {self.__name__!r}", name=self.__name__)
+
+
+def lazy_import(name, optional=False):
+    """回傳延遲執行的模組
+
+    Args:
+        name: 模組名稱；子模組（"a.b"）的父套件會被立即載入
+        optional: 模組不存在時回傳 MissingModule，到第一次使用時才報錯
+            （例如只在 macOS 上存在的 pyobjc 框架，讓其餘部分可在 Linux 上測試）
+
+    Raises:
+        ModuleNotFoundError: 模組不存在且 optional 為 False（在呼叫時即檢查，不會延後到第一次使用）
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        if optional:
+            return MissingModule(name)
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = _LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(name):
+    """模組是否已真正執行（延遲模組在第一次存取屬性前不算）"""
+    module = sys.modules.get(name)
+    return module is not None and type(module).__name__ not in ("_LazyModule", "_LockedLazyModule")
@@ -0,0 +1,223 @@
+"""
+macOS 平台適配
+macOS adapters for the transcription engine
+
+把依賴 AppKit / ApplicationServices / Quartz 的功能集中在這裡：
+輔助功能權限檢查、取得焦點應用、模擬 Command+V 粘貼。
+PasteSink 實作引擎的 OutputSink 介面，轉錄引擎本身不需要這些框架。
+"""
+
+import logging
+import threading
+import time
+
+from latency_metrics import span
+from lazy_import import lazy_import
+from transcription_engine import ClipboardSink, DeliveryReport
+
+# 只在 macOS 上存在；其他平台上第一次使用時才報錯（PasteSink 的其餘邏輯可在 Linux 上測試）
+AppKit = lazy_import("AppKit", optional=True)
+ApplicationServices = lazy_import("ApplicationServices", optional=True)
+Quartz = lazy_import("Quartz", optional=True)
+
+logger = logging.getLogger(__name__)
+
+
+def check_accessibility_permission(prompt=True):
+    """檢查輔助功能權限（prompt 為 True 時未授權會彈出系統提示）"""
+    options = {ApplicationServices.kAXTrustedCheckOptionPrompt: True} if prompt else None
+    trusted = ApplicationServices.AXIsProcessTrustedWithOptions(options)
+    if not trusted:
+        logger.warning("Accessibility permission required for auto-paste")
+    return trusted
+
+
+def get_focused_app_info():
+    """獲取當前焦點應用信息"""
+    try:
+        # 使用 NSWorkspace 獲取前台應用
+        frontmost_app = AppKit.NSWorkspace.sharedWorkspace().frontmostApplication()
+        if frontmost_app:
+            return {
+                'name': frontmost_app.localizedName(),
+                'bundle_id': frontmost_app.bundleIdentifier()
+            }
+    except Exception as e:
+        logger.error(f"Failed to get focused app: {e}")
+    return None
+
+
+def simulate_command_v(key_event_interval=0.0):
+    """模擬按下 Command+V
+
+    Args:
+        key_event_interval: 按鍵事件之間的間隔（秒），個別應用漏接按鍵時可調高
+    """
+    try:
+        # V 鍵的虛擬鍵碼
+        v_keycode = 0x09
+
+        # 創建 Command 按下事件
+        cmd_down = Quartz.CGEventCreateKeyboardEvent(None, 0x37, True)  # 0x37 是 Command 鍵
+        Quartz.CGEventSetFlags(cmd_down, Quartz.kCGEventFlagMaskCommand)
+
+        # 創建 V 按下事件
+        v_down = Quartz.CGEventCreateKeyboardEvent(None, v_keycode, True)
+        Quartz.CGEventSetFlags(v_down, Quartz.kCGEventFlagMaskCommand)
+
+        # 創建 V 釋放事件
+        v_up = Quartz.CGEventCreateKeyboardEvent(None, v_keycode, False)
+        Quartz.CGEventSetFlags(v_up, Quartz.kCGEventFlagMaskCommand)
+
+        # 創建 Command 釋放事件
+        cmd_up = Quartz.CGEventCreateKeyboardEvent(None, 0x37, False)
+
+        # 發送事件序列（事件按順序進入 HID 隊列，默認不需要間隔）
+        start = time.perf_counter()
+        for i, event in enumerate((cmd_down, v_down, v_up, cmd_up)):
+            if i and key_event_interval > 0:
+                time.sleep(key_event_interval)
+            Quartz.CGEventPost(Quartz.kCGHIDEventTap, event)
+
+        logger.info(f"Simulated Command+V in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return True
+    except Exception as e:
+        logger.error(f"Failed to simulate key press: {e}")
+        return False
+
+
+def wait_for_clipboard(clipboard, text, timeout=0.1):
+    """等待剪貼板內容更新為 text，回傳實際等待時間（秒）
+
+    pyperclip 通常同步寫入，這裡只是確認；超時後照常繼續粘貼。
+    """
+    start = time.perf_counter()
+    deadline = start + timeout
+    while True:
+        try:
+            if clipboard.paste() == text:
+                break
+        except Exception as e:
+            logger.warning(f"Failed to read clipboard: {e}")
+            break
+        if time.perf_counter() >= deadline:
+            logger.warning(f"Clipboard not updated after {timeout * 1000:.0f} ms")
+            break
+        time.sleep(0.002)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Clipboard ready in {elapsed * 1000:.1f} ms")
+    return elapsed
+
+
+class PasteSink(ClipboardSink):
+    """複製到剪貼板並自動粘貼到焦點應用
+
+    Command+V 是非同步送出的：目標應用處理按鍵時才讀取剪貼板，沒有可靠的「已讀取」通知。
+    因此每次粘貼後至少等待 paste_settle 秒才再寫入剪貼板，複製和粘貼成對地在鎖內執行，
+    串流的下一段文字或最後的完整文字不會在目標應用讀取前覆寫剪貼板。
+    """
+
+    def __init__(self, auto_paste_enabled=True, key_event_interval=0.0, paste_settle=0.15,
+                 clipboard=None, key_poster=None):
+        """
+        Args:
+            auto_paste_enabled: 是否模擬 Command+V 粘貼
+            key_event_interval: 模擬按鍵事件之間的間隔（秒）
+            paste_settle: 粘貼後到下一次寫入剪貼板之前的最短間隔（秒）
+            clipboard: 提供 copy / paste 的剪貼板，默認 pyperclip
+            key_poster: 送出 Command+V 的函數 (key_event_interval) -> bool，默認 simulate_command_v
+        """
+        super().__init__(clipboard)
+        self.auto_paste_enabled = auto_paste_enabled
+        self.key_event_interval = key_event_interval
+        self.paste_settle = paste_settle
+        self.key_poster = key_poster or simulate_command_v
+        self._lock = threading.RLock()
+        self._last_paste_at = None
+        self._stream_target = None
+        self._stream_pasted = False
+
+    @property
+    def streams(self):
+        # 只複製不粘貼時逐段輸出沒有意義
+        return self.auto_paste_enabled
+
+    def _target_app(self):
+        """有輔助功能權限時回傳焦點應用名稱，否則為 None"""
+        if not ApplicationServices.AXIsProcessTrustedWithOptions(None):
+            logger.warning("No accessibility permission, cannot auto-paste")
+            return None
+        app_info = get_focused_app_info()
+        if not app_info:
+            logger.warning("Cannot get focused app")
+            return None
+        return app_info['name']
+
+    def copy(self, text):
+        with self._lock:
+            self._wait_for_paste()
+            return super().copy(text)
+
+    def _wait_for_paste(self):
+        """上一次粘貼後不足 paste_settle 秒時等待，讓目標應用先讀取剪貼板"""
+        if self._last_paste_at is None:
+            return
+        delay = self._last_paste_at + self.paste_settle - time.perf_counter()
+        if delay > 0:
+            with span("paste"):
+                time.sleep(delay)
+
+    def paste(self, text):
+        """自動粘貼文字到焦點應用
+
+        Returns:
+            目標應用名稱；未粘貼時為 None
+        """
+        try:
+            app_name = self._target_app()
+            if app_name is None:
+                return None
+            logger.info(f"Target app: {app_name}")
+
+            # 先確保文字在剪貼板中
+            with span("clipboard"):
+                wait_for_clipboard(self.clipboard, text)
+
+            # 模擬 Command+V
+            with span("paste"):
+                pasted = self.key_poster(self.key_event_interval)
+            if pasted:
+                self._last_paste_at = time.perf_counter()
+                logger.info(f"Auto-pasted to {app_name}")
+                return app_name
+        except Exception as e:
+            logger.error(f"Auto-paste failed: {e}")
+        return None
+
+    def deliver(self, text):
+        with self._lock:
+            copied = self.copy(text)
+            if not self.auto_paste_enabled:
+                logger.info("Auto-paste disabled")
+                return DeliveryReport(copied=copied)
+            target = self.paste(text) if copied else None
+        return DeliveryReport(copied=copied, pasted=target is not None, target=target)
+
+    def begin_stream(self):
+        self._stream_target = None
+        self._stream_pasted = False
+
+    def deliver_delta(self, text):
+        # 每段文字各自經過剪貼板粘貼到焦點應用；複製和粘貼之間不讓其他寫入插入
+        with self._lock:
+            if not self.copy(text):
+                return
+            target = self.paste(text)
+        if target is not None:
+            self._stream_target = self._stream_target or target
+            self._stream_pasted = True
+
+    def finish_stream(self, text):
+        # 最後一段粘貼被讀取後，剪貼板保留完整文字，方便再次粘貼
+        copied = self.copy(text)
+        return DeliveryReport(copied=copied, pasted=self._stream_pasted, target=self._stream_target)
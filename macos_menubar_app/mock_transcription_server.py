@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+本地模擬轉錄服務
+Local OpenAI-compatible stand-in for /v1/audio/transcriptions
+
+用於在沒有網路或 API 金鑰的情況下測試轉錄流程：
+    python3 mock_transcription_server.py --port 8765 --latency 0.2
+    python3 mock_transcription_server.py --latency 0.3 --jitter 0.2 --error-rate 0.05
+    python3 mock_transcription_server.py --stream-interval 0.05   # 串流請求每個片段間隔 50 ms
+    export OPENAI_BASE_URL=http://127.0.0.1:8765/v1
+"""
+
+import argparse
+import io
+import json
+import logging
+import random
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scipy.io import wavfile
+
+logger = logging.getLogger(__name__)
+
+
+def parse_multipart(content_type, body):
+    """解析 multipart/form-data 請求
+
+    Returns:
+        (fields, files): 一般欄位字典，以及 {欄位名: (檔名, 內容)} 字典
+    """
+    message = BytesParser(policy=policy.HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    fields = {}
+    files = {}
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b""
+        if filename is not None:
+            files[name] = (filename, payload)
+        else:
+            fields[name] = payload.decode("utf-8")
+    return fields, files
+
+
+def decode_audio(audio_bytes):
+    """解碼上傳的音頻（WAV，或在安裝 soundfile 時的 FLAC/OGG）
+
+    Returns:
+        (sample_rate, audio)
+    """
+    try:
+        return wavfile.read(io.BytesIO(audio_bytes))
+    except ValueError:
+        import soundfile
+        audio, sample_rate = soundfile.read(io.BytesIO(audio_bytes), dtype="int16")
+        return sample_rate, audio
+
+
+class MockHTTPError(Exception):
+    """由 responder 拋出，讓模擬服務回傳錯誤狀態碼（例如 429 速率限制）"""
+
+    def __init__(self, status, message="Mock error", retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+def default_responder(audio_bytes, fields):
+    """默認回應：回傳音頻長度描述"""
+    try:
+        sample_rate, audio = decode_audio(audio_bytes)
+        return f"[{len(audio) / sample_rate:.2f}s]"
+    except Exception:
+        return f"[{len(audio_bytes)} bytes]"
+
+
+class MockTranscriptionServer:
+    """在背景線程運行的模擬轉錄服務"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, responder=None,
+                 jitter=0.0, realtime_factor=0.0, error_rate=0.0, error_status=500, seed=None,
+                 stream_chunk=4, stream_interval=0.0):
+        """
+        Args:
+            host: 監聽地址
+            port: 監聽端口，0 表示自動分配
+            latency: 每個請求的固定延遲（秒）
+            jitter: 額外的隨機延遲上限（秒，均勻分佈）
+            realtime_factor: 每秒音頻額外的處理時間（秒），模擬模型時間隨長度增加
+            error_rate: 回傳錯誤的機率 (0-1)
+            error_status: 隨機錯誤使用的狀態碼（500、429 等）
+            seed: 隨機數種子，固定後延遲和錯誤序列可重現
+            stream_chunk: 串流請求 (stream=true) 每個 delta 事件的字元數
+            stream_interval: 串流請求相鄰 delta 事件的間隔（秒）
+            responder: 生成轉錄文字的函數 (audio_bytes, fields) -> str；
+                拋出 MockHTTPError 時回傳對應的錯誤狀態碼
+        """
+        self.latency = latency
+        self.responder = responder or default_responder
+        self.jitter = jitter
+        self.realtime_factor = realtime_factor
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self.stream_chunk = stream_chunk
+        self.stream_interval = stream_interval
+        self.request_count = 0
+        self.error_count = 0
+        self._count_lock = threading.Lock()
+        self._thread = None
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # 標頭和內容分兩次寫出，開啟 Nagle 時會與延遲 ACK 疊加出約 40 ms 的假延遲
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                logger.debug(format, *args)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/audio/transcriptions"):
+                    self._send_json(404, {"error": {"message": "Not found"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                fields, files = parse_multipart(self.headers.get("Content-Type", ""), body)
+                if "file" not in files:
+                    self._send_json(400, {"error": {"message": "Missing file"}})
+                    return
+                audio_bytes = files["file"][1]
+                with server._count_lock:
+                    server.request_count += 1
+                    delay = server.latency + server._random.uniform(0, server.jitter)
+                    failed = server._random.random() < server.error_rate
+                    if failed:
+                        server.error_count += 1
+                if server.realtime_factor > 0:
+                    sample_rate, audio = decode_audio(audio_bytes)
+                    delay += server.realtime_factor * len(audio) / sample_rate
+                if delay > 0:
+                    time.sleep(delay)
+                if failed:
+                    self._send_json(server.error_status, {"error": {"message": "Injected error"}})
+                    return
+                try:
+                    text = server.responder(audio_bytes, fields)
+                except MockHTTPError as e:
+                    headers = {} if e.retry_after is None else {"Retry-After": str(e.retry_after)}
+                    self._send_json(e.status, {"error": {"message": str(e)}}, headers)
+                    return
+                if fields.get("stream") == "true":
+                    self._send_stream(text)
+                else:
+                    self._send_json(200, {"text": text})
+
+            def _send_stream(self, text):
+                """以 Server-Sent Events 逐段回傳 transcript.text.delta，最後是 transcript.text.done"""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.close_connection = True
+                chunk = max(1, server.stream_chunk)
+                events = [{"type": "transcript.text.delta", "delta": text[i:i + chunk]}
+                          for i in range(0, len(text), chunk)]
+                events.append({"type": "transcript.text.done", "text": text})
+                try:
+                    self.end_headers()
+                    for i, event in enumerate(events):
+                        if i and server.stream_interval > 0:
+                            time.sleep(server.stream_interval)
+                        self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    logger.debug("Client disconnected during stream")
+
+            def _send_json(self, status, payload, headers=None):
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                try:
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    # 客戶端已放棄（超過截止時間或對沖請求已勝出）
+                    logger.debug("Client disconnected before response")
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self):
+        """OpenAI 客戶端使用的 base_url"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """在背景線程啟動服務"""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服務"""
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Local stand-in for /v1/audio/transcriptions")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="每個請求的延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="額外隨機延遲上限（秒）")
+    parser.add_argument("--realtime-factor", type=float, default=0.0, help="每秒音頻的處理時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳錯誤的機率 (0-1)")
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--stream-chunk", type=int, default=4, help="串流回應每個片段的字元數")
+    parser.add_argument("--stream-interval", type=float, default=0.0, help="串流片段間隔（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    server = MockTranscriptionServer(
+        args.host, args.port, latency=args.latency, jitter=args.jitter,
+        realtime_factor=args.realtime_factor, error_rate=args.error_rate,
+        error_status=args.error_status, seed=args.seed,
+        stream_chunk=args.stream_chunk, stream_interval=args.stream_interval
+    )
+    print(f"Mock transcription server listening on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,682 @@
+"""
+預分配緩衝區錄音器
+Preallocated arena-buffer audio recorder
+
+sd.InputStream 的回調直接把每個區塊寫入預先分配、可成長的 int16 緩衝區，
+下游透過零拷貝的 NumPy 視圖讀取已錄製的範圍，不需要隊列、鎖或最後的合併。
+
+停止時不等待固定時間：回調寫入最後一個區塊後結束輸入流，
+finished_callback 觸發 drained 事件，處理流程立即開始。
+
+常駐收音（enable_preroll）：輸入流保持開啟，閒置時回調把區塊寫入固定大小的環形
+緩衝區（例如最近 0.5 秒）。開始錄音時不需要打開設備，錄音以這段預錄音頻開頭，
+不會截掉第一個字；停止時只結束本段錄音，輸入流繼續運行。
+閒置超過 idle_timeout 後自動關閉輸入流（pause），下一次錄音時重新打開。
+閒置時的記憶體固定為環形緩衝區大小，回調中不配置記憶體。
+
+溢出到磁碟（spill_seconds）：記憶體中的緩衝區最多成長到 spill_seconds，之後改為映射到
+臨時文件的 np.memmap，下游拿到的是 memmap 視圖；背景線程把已寫入的頁面落盤並從記憶體
+釋放，錄音再長常駐記憶體也不增加。建立臨時文件和複製已錄製的音頻由 spill-prepare 線程
+在緩衝區快用完前（SPILL_PREPARE_SECONDS）完成，回調中只複製最後幾秒並換上準備好的緩衝區。
+max_seconds 是錄音長度的硬上限，到達時自動停止。
+
+擷取健康狀態（health）：每個回調記錄溢出、時間戳缺口、間隔抖動和排隊深度，
+打開輸入流時記錄耗時。開啟 autotune 時，輸入延遲從設備的低延遲默認值開始，
+輸入流關閉時若期間出現溢出或丟失區塊，下一次打開改用設備的高延遲默認值，
+仍然丟失時區塊大小加倍（上限 MAX_BLOCKSIZE）。
+
+原始擷取記錄（capture_log）：設定為 capture_log.CaptureLogWriter 後，每個回調的區塊
+連同時間戳和狀態旗標寫入二進位文件，可用 replay_capture.py 重放。
+"""
+
+import logging
+import mmap
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from capture_health import CaptureHealth
+from lazy_import import lazy_import
+
+# 延遲載入：第一次建立錄音器時才載入 numpy / PortAudio
+np = lazy_import("numpy")
+sd = lazy_import("sounddevice")
+
+logger = logging.getLogger(__name__)
+
+# 自動調整時區塊大小的上限（16kHz 約 256 ms）
+MAX_BLOCKSIZE = 4096
+
+# 緩衝區剩餘不到這麼多秒時開始在背景準備溢出文件（不超過 spill_seconds 的一半）
+SPILL_PREPARE_SECONDS = 10.0
+
+
+class SpillBuffer:
+    """映射到臨時文件的錄音緩衝區
+
+    臨時文件建立後立即刪除（映射仍然有效），最後一個視圖釋放時由系統回收。
+    """
+
+    def __init__(self, frames, channels, directory=None, release_frames=16000 * 10):
+        """
+        Args:
+            frames: 容量（幀）；文件是稀疏的，未寫入的部分不佔磁碟
+            channels: 聲道數
+            directory: 臨時文件目錄，默認為系統臨時目錄
+            release_frames: 每寫入多少幀就落盤並釋放一次記憶體
+        """
+        fd, path = tempfile.mkstemp(prefix="recording-", suffix=".pcm", dir=directory)
+        os.close(fd)
+        try:
+            self.array = np.memmap(path, dtype=np.int16, mode="w+", shape=(frames, channels))
+        finally:
+            os.remove(path)
+        self.frame_bytes = channels * 2
+        self.release_frames = release_frames
+        self._written = 0
+        self._released_bytes = 0
+        self._event = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="spill", daemon=True)
+        self._thread.start()
+
+    def written(self, frames):
+        """音頻回調寫入後呼叫（只設定事件，不做 I/O）"""
+        self._written = frames
+        if frames * self.frame_bytes - self._released_bytes >= self.release_frames * self.frame_bytes:
+            self._event.set()
+
+    def _run(self):
+        while not self._closed:
+            self._event.wait()
+            self._event.clear()
+            self._release()
+
+    def _release(self):
+        """把已寫入的完整頁面落盤，並從本進程的記憶體中釋放（之後讀取時從文件載入）"""
+        end = self._written * self.frame_bytes // mmap.PAGESIZE * mmap.PAGESIZE
+        start = self._released_bytes
+        if end <= start:
+            return
+        mm = self.array._mmap
+        try:
+            mm.flush(start, end - start)
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+                mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to release spilled audio: {e}")
+            return
+        self._released_bytes = end
+
+    def close(self):
+        """停止背景線程（不影響已交出去的視圖）"""
+        self._closed = True
+        self._event.set()
+
+
+class AudioRecorder:
+    """將音頻直接寫入預分配緩衝區的錄音器"""
+
+    def __init__(self, sample_rate=16000, channels=1, blocksize=1024,
+                 initial_seconds=60.0, on_block=None, audio_api=None,
+                 spill_seconds=None, max_seconds=None, spill_dir=None, on_limit=None,
+                 latency=None, autotune=False):
+        """
+        Args:
+            sample_rate: 採樣率
+            channels: 聲道數
+            blocksize: 每次回調的幀數
+            initial_seconds: 初始預分配的錄音長度（秒），不足時自動加倍
+            on_block: 每個區塊寫入後的回調 (block_view)，在音頻線程中執行，須保持輕量
+            audio_api: 與 sounddevice 相容的物件（InputStream、CallbackStop、query_devices），
+                默認為 sounddevice；測試和效能測試可傳入 audio_simulation.SimulatedAudio
+            spill_seconds: 緩衝區超過這個長度（秒）後溢出到磁碟，None 表示只用記憶體
+            max_seconds: 錄音長度上限（秒），到達時自動停止，None 表示不限
+            spill_dir: 溢出文件的目錄，默認為系統臨時目錄
+            on_limit: 到達 max_seconds 時的回調（在音頻線程中執行，須保持輕量）
+            latency: 輸入延遲（秒或 "low"/"high"），None 為 PortAudio 默認
+            autotune: 按設備和實際丟失情況自動調整 latency 和 blocksize
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.blocksize = blocksize
+        self.initial_frames = max(int(initial_seconds * sample_rate), blocksize)
+        self.on_block = on_block
+        self.audio_api = audio_api
+        self.spill_frames = None if spill_seconds is None else int(spill_seconds * sample_rate)
+        self.max_frames = None if max_seconds is None else int(max_seconds * sample_rate)
+        self.spill_dir = spill_dir
+        self.on_limit = on_limit
+        self.latency = latency
+        self.autotune = autotune
+        self.health = CaptureHealth(sample_rate)
+        # 原始擷取記錄（capture_log.CaptureLogWriter），None 表示不記錄
+        self.capture_log = None
+        self._health_checkpoint = None
+        self._device = None
+        self._spill = None
+        # 背景準備的溢出緩衝區：(錄音代數, SpillBuffer, 已複製的幀數)
+        self._prepared_spill = None
+        self._spill_requested = False
+        self._spill_requests = None
+        self._generation = 0
+        # 最近一次錄音是否因到達 max_seconds 而停止
+        self.limit_reached = False
+        self.recording = False
+        self._stream = None
+        self._buffer = np.empty((0, channels), dtype=np.int16)
+        self._length = 0
+        self._stop_requested = False
+        self._stop_time = None
+        self.drained = threading.Event()
+        self.drained.set()
+        # 最近一次從請求停止到最後一個區塊落地的耗時（秒）
+        self.last_drain_latency = None
+
+        # 常駐收音：環形預錄緩衝區（None 表示未開啟）
+        self._ring = None
+        self._ring_position = 0
+        self._ring_filled = 0
+        self._start_requested = False
+        self._next_buffer = None
+        # 錄音中關閉常駐收音：等這段錄音收尾後才關閉輸入流並釋放環形緩衝區
+        self._disable_pending = False
+        self.idle_timeout = None
+        self._idle_timer = None
+        self._stream_lock = threading.RLock()
+        # 最近一次錄音開頭包含的預錄幀數
+        self.last_preroll_frames = 0
+
+    @property
+    def frames(self):
+        """已錄製的幀數"""
+        return self._length
+
+    @property
+    def duration(self):
+        """已錄製的時長（秒）"""
+        return self._length / self.sample_rate
+
+    @property
+    def capacity(self):
+        """目前緩衝區可容納的幀數"""
+        return len(self._buffer)
+
+    @property
+    def spilled(self):
+        """目前的錄音是否已溢出到磁碟"""
+        return self._spill is not None
+
+    @property
+    def always_on(self):
+        """是否開啟常駐收音（預錄）"""
+        return self._ring is not None
+
+    @property
+    def armed(self):
+        """常駐收音的輸入流是否正在運行（可零延遲開始錄音）"""
+        return self.always_on and self._stream is not None
+
+    def _reserve(self, frames):
+        """確保緩衝區至少可容納 frames 幀（在音頻回調中執行）
+
+        記憶體中的緩衝區按倍數成長，但不超過 spill_frames；超過之後換上 spill-prepare
+        線程準備好的溢出緩衝區。
+        """
+        capacity = len(self._buffer)
+        if self.spill_frames is not None:
+            self._request_spill(frames, capacity)
+        if frames <= capacity:
+            return
+        if self.spill_frames is not None and frames > self.spill_frames:
+            self._swap_spill(frames)
+            return
+        new_capacity = max(capacity, self.initial_frames)
+        while new_capacity < frames:
+            new_capacity *= 2
+        if self.spill_frames is not None:
+            new_capacity = min(new_capacity, self.spill_frames)
+        new_buffer = np.empty((new_capacity, self.channels), dtype=np.int16)
+        new_buffer[:self._length] = self._buffer[:self._length]
+        # 先複製再替換：讀者先讀長度再讀緩衝區，總能看到完整數據
+        self._buffer = new_buffer
+        logger.info(f"Recording buffer grown to {new_capacity / self.sample_rate:.0f}s")
+
+    def _spill_capacity(self, capacity, frames):
+        """下一個溢出緩衝區的容量：有上限時一次配置到上限，否則加倍"""
+        if self.max_frames is not None:
+            return max(self.max_frames, frames)
+        return max(capacity * 2, self.spill_frames * 2, frames)
+
+    def _request_spill(self, frames, capacity):
+        """緩衝區已到 spill_frames 且快用完時，請 spill-prepare 線程準備溢出緩衝區（不阻塞）"""
+        if self._spill_requested or capacity < self.spill_frames:
+            return
+        if self.max_frames is not None and capacity >= self.max_frames:
+            return
+        margin = min(int(SPILL_PREPARE_SECONDS * self.sample_rate), self.spill_frames // 2)
+        if frames >= capacity - margin:
+            self._spill_requested = True
+            self._spill_requests.put(self._generation)
+
+    def _swap_spill(self, frames):
+        """換上準備好的溢出緩衝區，只補上準備之後錄到的部分"""
+        prepared, self._prepared_spill = self._prepared_spill, None
+        if prepared is not None and prepared[0] == self._generation and len(prepared[1].array) >= frames:
+            _, spill, copied = prepared
+        else:
+            # 還沒準備好（例如比實際時間更快的輸入）：只好在回調中建立
+            if prepared is not None:
+                prepared[1].close()
+            spill = SpillBuffer(self._spill_capacity(len(self._buffer), frames), self.channels,
+                                self.spill_dir, release_frames=self.sample_rate * 10)
+            copied = 0
+            logger.warning("Spill buffer was not ready, creating it in the audio callback")
+        spill.array[copied:self._length] = self._buffer[copied:self._length]
+        self._buffer = spill.array
+        self._close_spill()
+        self._spill = spill
+        self._spill_requested = False
+        spill.written(self._length)
+        logger.info(f"Recording spilled to disk ({len(spill.array) / self.sample_rate:.0f}s capacity)")
+
+    def _start_spill_worker(self):
+        """啟動 spill-prepare 線程（在呼叫 start 的線程中，只啟動一次）"""
+        if self.spill_frames is None or self._spill_requests is not None:
+            return
+        self._spill_requests = queue.SimpleQueue()
+        threading.Thread(target=self._spill_worker, name="spill-prepare", daemon=True).start()
+
+    def _spill_worker(self):
+        while True:
+            generation = self._spill_requests.get()
+            try:
+                self._prepare_spill(generation)
+            except Exception as e:
+                logger.error(f"Failed to prepare spill buffer: {e}")
+
+    def _prepare_spill(self, generation):
+        """建立溢出緩衝區並複製目前已錄製的部分（在 spill-prepare 線程中執行）"""
+        # 先讀長度再讀緩衝區，與其他讀者相同
+        length = self._length
+        buffer = self._buffer
+        if generation != self._generation:
+            return
+        spill = SpillBuffer(self._spill_capacity(len(buffer), length), self.channels,
+                            self.spill_dir, release_frames=self.sample_rate * 10)
+        spill.array[:length] = buffer[:length]
+        if generation != self._generation:
+            spill.close()
+            return
+        self._prepared_spill = (generation, spill, length)
+
+    def _reset_spill(self):
+        """錄音開始或結束：作廢未用上的溢出緩衝區"""
+        self._generation += 1
+        self._spill_requested = False
+        prepared, self._prepared_spill = self._prepared_spill, None
+        if prepared is not None:
+            prepared[1].close()
+        self._start_spill_worker()
+
+    def _initial_capacity(self):
+        if self.spill_frames is not None:
+            return max(min(self.initial_frames, self.spill_frames), self.blocksize)
+        return self.initial_frames
+
+    def _close_spill(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _write(self, indata):
+        """將一個區塊寫入緩衝區；到達長度上限時只寫入剩餘部分並請求停止"""
+        start = self._length
+        end = start + len(indata)
+        if self.max_frames is not None and end >= self.max_frames:
+            end = self.max_frames
+            indata = indata[:end - start]
+            if not self._stop_requested:
+                logger.warning(f"Recording reached the {self.max_frames / self.sample_rate:.0f}s limit, stopping")
+                self.limit_reached = True
+                self._stop_time = time.perf_counter()
+                self._stop_requested = True
+                if self.on_limit is not None:
+                    self.on_limit()
+        self._reserve(end)
+        self._buffer[start:end] = indata
+        self._length = end
+        if self._spill is not None:
+            self._spill.written(end)
+        if self.on_block is not None and end > start:
+            self.on_block(self._buffer[start:end])
+
+    def _write_ring(self, indata):
+        """閒置時把區塊寫入環形預錄緩衝區（只保留最後 len(ring) 幀）"""
+        ring = self._ring
+        size = len(ring)
+        if len(indata) >= size:
+            ring[:] = indata[-size:]
+            self._ring_position = 0
+            self._ring_filled = size
+            return
+        position = self._ring_position
+        first = min(len(indata), size - position)
+        ring[position:position + first] = indata[:first]
+        ring[:len(indata) - first] = indata[first:]
+        self._ring_position = (position + len(indata)) % size
+        self._ring_filled = min(size, self._ring_filled + len(indata))
+
+    def _begin_from_ring(self):
+        """切換到錄音狀態：新的緩衝區以環形緩衝區中的預錄音頻（按時間順序）開頭"""
+        self._buffer, self._next_buffer = self._next_buffer, None
+        filled = self._ring_filled
+        if filled:
+            ring = self._ring
+            start = (self._ring_position - filled) % len(ring)
+            first = min(filled, len(ring) - start)
+            self._buffer[:first] = ring[start:start + first]
+            self._buffer[first:filled] = ring[:filled - first]
+        self._length = filled
+        self.last_preroll_frames = filled
+        self._ring_filled = 0
+        self.recording = True
+        if filled and self.on_block is not None:
+            self.on_block(self._buffer[:filled])
+
+    def _callback(self, indata, frames, time_info, status):
+        """sounddevice 音頻回調"""
+        arrival = time.perf_counter()
+        self.health.record_callback(frames, time_info, status, arrival)
+        capture_log = self.capture_log
+        if capture_log is not None:
+            capture_log.write_block(indata, time_info, status, arrival)
+        try:
+            self._handle_block(indata, status)
+        finally:
+            self.health.record_callback_time(time.perf_counter() - arrival)
+
+    def _handle_block(self, indata, status):
+        if status:
+            logger.warning(f"Recording status: {status}")
+        # 常駐收音：開始錄音的請求在音頻線程中生效，預錄和新區塊之間沒有縫隙
+        if self._start_requested:
+            self._start_requested = False
+            self._begin_from_ring()
+        # 只有在錄音狀態時才寫入；常駐收音閒置時寫入環形緩衝區
+        if self.recording:
+            self._write(indata)
+        elif self._ring is not None:
+            self._write_ring(indata)
+        # 已請求停止：這是最後一個區塊
+        if self._stop_requested:
+            self.recording = False
+            if self._ring is not None:
+                # 常駐收音只結束本段錄音，輸入流繼續運行；下一段的預錄從現在開始累積
+                self._stop_requested = False
+                self._ring_filled = 0
+                self._finished_callback()
+                return
+            raise (self.audio_api or sd).CallbackStop
+
+    def _finished_callback(self):
+        """輸入流結束（最後一個回調已返回）"""
+        if self._stop_time is not None:
+            self.last_drain_latency = time.perf_counter() - self._stop_time
+        self.drained.set()
+
+    def warm_up(self):
+        """預先載入 PortAudio 並查詢輸入設備，縮短第一次開啟輸入流的時間"""
+        device = (self.audio_api or sd).query_devices(kind="input")
+        self._device = device
+        if self.autotune and self.latency is None:
+            self.latency = device.get("default_low_input_latency")
+        logger.info(f"Input device: {device['name']}")
+
+    def _open_stream(self):
+        start = time.perf_counter()
+        self.health.stream_started()
+        self._health_checkpoint = self.health.checkpoint()
+        if self.capture_log is not None:
+            self.capture_log.stream_started(self.blocksize)
+        self._stream = (self.audio_api or sd).InputStream(
+            samplerate=self.sample_rate,
+            channels=self.channels,
+            callback=self._callback,
+            finished_callback=self._finished_callback,
+            dtype=np.int16,
+            blocksize=self.blocksize,
+            latency=self.latency
+        )
+        self._stream.start()
+        self.health.record_stream_open(time.perf_counter() - start)
+
+    def _close_stream(self):
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        stream.close()
+        if self.autotune:
+            self._tune()
+
+    def _tune(self):
+        """輸入流期間出現溢出或丟失區塊時，為下一次打開加大輸入延遲或區塊大小"""
+        lost = self.health.since(self._health_checkpoint or {})
+        if not (lost["overflows"] or lost["dropped_blocks"]):
+            return
+        high = (self._device or {}).get("default_high_input_latency")
+        if high and not (isinstance(self.latency, (int, float)) and self.latency >= high):
+            self.latency = high
+        elif self.blocksize < MAX_BLOCKSIZE:
+            self.blocksize = min(self.blocksize * 2, MAX_BLOCKSIZE)
+        else:
+            return
+        logger.warning(f"Capture lost audio ({lost['overflows']} overflows, {lost['dropped_blocks']} "
+                       f"dropped blocks); next stream uses latency={self.latency}, blocksize={self.blocksize}")
+
+    def start(self):
+        """開啟輸入流並開始錄音
+
+        每次錄音使用新的緩衝區，上一段錄音交出去的視圖不會被覆寫。
+        常駐收音時不重新打開設備，錄音從環形緩衝區中的預錄音頻開始。
+        """
+        if self.always_on:
+            self._start_always_on()
+            return
+
+        if self._stream is not None:
+            # 上一段錄音尚未收尾（正常情況下已由處理線程完成）
+            self.wait_drained()
+
+        self._close_spill()
+        self._reset_spill()
+        self._buffer = np.empty((self._initial_capacity(), self.channels), dtype=np.int16)
+        self._length = 0
+        self.limit_reached = False
+        self._stop_requested = False
+        self._stop_time = None
+        self.last_drain_latency = None
+        self.last_preroll_frames = 0
+        self.drained.clear()
+        self.recording = True
+        try:
+            self._open_stream()
+        except Exception:
+            self.recording = False
+            self._stream = None
+            self.drained.set()
+            raise
+
+    def _start_always_on(self):
+        with self._stream_lock:
+            self._cancel_idle_timer()
+            if not self.drained.is_set():
+                # 上一段錄音的最後一個區塊尚未落地
+                self.drained.wait(1.0)
+            # 緩衝區在這裡配置，音頻回調只做切換和複製
+            self._next_buffer = np.empty((max(self._initial_capacity(), len(self._ring)), self.channels),
+                                         dtype=np.int16)
+            self._close_spill()
+            self._reset_spill()
+            self.limit_reached = False
+            self._stop_requested = False
+            self._stop_time = None
+            self.last_drain_latency = None
+            self.drained.clear()
+            self._start_requested = True
+            if self._stream is None:
+                # 閒置後已暫停：重新打開設備（這一次沒有預錄）
+                self._ring_filled = 0
+                try:
+                    self._open_stream()
+                except Exception:
+                    self._start_requested = False
+                    self._stream = None
+                    self.drained.set()
+                    raise
+
+    def enable_preroll(self, seconds=0.5, idle_timeout=None):
+        """開啟常駐收音並立即打開輸入流
+
+        Args:
+            seconds: 預錄長度（秒），環形緩衝區的固定大小
+            idle_timeout: 閒置多少秒後自動暫停輸入流，None 表示不暫停
+        """
+        with self._stream_lock:
+            self._disable_pending = False
+            frames = max(int(seconds * self.sample_rate), 1)
+            if self._ring is None or len(self._ring) != frames:
+                self._ring = np.zeros((frames, self.channels), dtype=np.int16)
+                self._ring_position = 0
+                self._ring_filled = 0
+            self.idle_timeout = idle_timeout
+            self.resume()
+        logger.info(f"Always-on capture enabled ({seconds:.2f}s pre-roll)")
+
+    def disable_preroll(self):
+        """關閉常駐收音（關閉閒置中的輸入流）
+
+        正在錄音時這段錄音照常收尾，到 wait_drained 時才關閉輸入流並釋放環形緩衝區；
+        音頻線程仍在使用 _ring，不能在這裡清掉。
+        """
+        with self._stream_lock:
+            if not self.pause():
+                self._disable_pending = True
+                logger.info("Always-on capture will be disabled when the recording stops")
+                return
+            self._ring = None
+            self._ring_filled = 0
+        logger.info("Always-on capture disabled")
+
+    def _finish_disable_preroll(self):
+        """完成錄音中延後的 disable_preroll：先關閉輸入流（不再有回調），再釋放環形緩衝區"""
+        with self._stream_lock:
+            if not self._disable_pending:
+                return
+            self._disable_pending = False
+            self._close_stream()
+            self._ring = None
+            self._ring_filled = 0
+        logger.info("Always-on capture disabled")
+
+    def resume(self):
+        """常駐收音：打開輸入流開始累積預錄（已打開時不做任何事）"""
+        with self._stream_lock:
+            if self.always_on and self._stream is None:
+                self._ring_filled = 0
+                self._open_stream()
+                self._schedule_idle_timer()
+
+    def pause(self):
+        """常駐收音：閒置時關閉輸入流釋放麥克風；正在錄音時不做任何事
+
+        Returns:
+            是否已關閉
+        """
+        with self._stream_lock:
+            self._cancel_idle_timer()
+            if self.recording or self._start_requested or not self.drained.is_set():
+                return False
+            if self._stream is not None:
+                self._close_stream()
+                logger.info("Always-on capture paused")
+            return True
+
+    def _schedule_idle_timer(self):
+        self._cancel_idle_timer()
+        if self.idle_timeout:
+            self._idle_timer = threading.Timer(self.idle_timeout, self.pause)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def request_stop(self):
+        """請求停止錄音，立即返回
+
+        下一個音頻回調寫入最後的區塊後結束輸入流並觸發 drained；
+        常駐收音時輸入流不結束，只觸發 drained。
+        """
+        self._stop_time = time.perf_counter()
+        self._stop_requested = True
+        if self._stream is None:
+            self.recording = False
+            self.drained.set()
+
+    def wait_drained(self, timeout=5.0):
+        """等待最後一個區塊落地並關閉輸入流
+
+        Args:
+            timeout: 安全上限（秒）；設備卡住不再回調時才會用到，屆時強制中止輸入流
+
+        Returns:
+            已錄製範圍的零拷貝視圖
+        """
+        if not self.drained.wait(timeout):
+            logger.warning(f"Audio stream did not drain within {timeout}s, aborting")
+            if self._stream is not None:
+                self._stream.abort()
+            self.drained.set()
+            if self.always_on:
+                # 設備卡住：關閉常駐輸入流，下一次錄音時重新打開
+                self._close_stream()
+        self.recording = False
+        self._close_spill()
+        self._reset_spill()
+        self._finish_disable_preroll()
+
+        if self.always_on:
+            # 輸入流保持開啟，繼續累積下一段錄音的預錄
+            self._schedule_idle_timer()
+        else:
+            self._close_stream()
+
+        if self.last_drain_latency is not None:
+            logger.info(f"Recording drained in {self.last_drain_latency * 1000:.1f} ms, "
+                        f"{self._length} frames ({self.duration:.2f}s)")
+        return self.view()
+
+    def stop(self):
+        """停止錄音並等待輸入流收尾
+
+        Returns:
+            已錄製範圍的零拷貝視圖
+        """
+        self.request_stop()
+        return self.wait_drained()
+
+    def view(self, start=0, end=None):
+        """已錄製範圍的零拷貝 NumPy 視圖"""
+        length = self._length
+        buffer = self._buffer
+        end = length if end is None else min(end, length)
+        return buffer[start:end]
+
+    def memoryview(self, start=0, end=None):
+        """已錄製範圍的 memoryview（int16，形狀為 (幀數, 聲道數)）"""
+        return memoryview(self.view(start, end))
@@ -0,0 +1,173 @@
+"""
+錄音暫存區
+Durable append-only spool for stopped recordings
+
+每段停止的錄音在轉錄前先寫入暫存目錄（WAV，寫入臨時文件後 fsync 並改名，
+中途崩潰不會留下半個文件），轉錄成功並輸出後才刪除。文件只新增、不修改：
+序號單調遞增，失敗的嘗試以追加一行的方式記在同名的 .failed 文件中。
+API 故障時錄音保留在暫存區，重新啟動後按序號重放；重放失敗次數達到上限的錄音
+不再自動重放，仍可在目錄中找到。錄音當下的首次請求和退避重試（一次故障就可能
+失敗四次）不計入重放次數，上限只限制跨重新啟動的重放。
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+import wave
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+ENTRY_PATTERN = re.compile(r"^(\d{8})\.wav$")
+
+
+class SpoolEntry:
+    """暫存區中的一段錄音"""
+
+    def __init__(self, spool, id):
+        self.spool = spool
+        self.id = id
+
+    @property
+    def path(self):
+        return os.path.join(self.spool.directory, f"{self.id:08d}.wav")
+
+    @property
+    def failure_path(self):
+        return os.path.join(self.spool.directory, f"{self.id:08d}.failed")
+
+    def __repr__(self):
+        return f"SpoolEntry({self.id})"
+
+
+class RecordingSpool:
+    """錄音暫存目錄（多個線程共用）"""
+
+    def __init__(self, directory, max_replays=5):
+        """
+        Args:
+            directory: 暫存目錄，不存在時建立
+            max_replays: 重新啟動後重放失敗幾次就不再自動重放
+        """
+        self.directory = directory
+        self.max_replays = max_replays
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        # 清掉崩潰時沒寫完的臨時文件，序號接著目錄中最大的繼續
+        ids = []
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                os.remove(os.path.join(directory, name))
+                continue
+            match = ENTRY_PATTERN.match(name)
+            if match:
+                ids.append(int(match.group(1)))
+        self._next_id = max(ids, default=0) + 1
+
+    def persist(self, audio, sample_rate):
+        """寫入一段錄音（fsync 後才返回）
+
+        Args:
+            audio: int16 音頻數組，形狀 (frames,) 或 (frames, channels)
+
+        Returns:
+            SpoolEntry
+        """
+        with self._lock:
+            entry = SpoolEntry(self, self._next_id)
+            self._next_id += 1
+        start = time.perf_counter()
+        audio = np.ascontiguousarray(audio, dtype=np.int16)
+        temp_path = entry.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            with wave.open(f, "wb") as wav:
+                wav.setnchannels(1 if audio.ndim == 1 else audio.shape[1])
+                wav.setsampwidth(2)
+                wav.setframerate(sample_rate)
+                # 直接寫入數組的緩衝區（可能是溢出到磁碟的 memmap），不建立整段的副本
+                wav.writeframes(audio)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, entry.path)
+        self._sync_directory()
+        logger.info(f"Spooled recording {entry.id} ({len(audio) / sample_rate:.1f}s) "
+                    f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return entry
+
+    def _sync_directory(self):
+        # 改名要在目錄 fsync 後才保證落盤（Windows 不支援打開目錄，略過）
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def load(self, entry):
+        """讀回錄音
+
+        Returns:
+            (int16 音頻數組 (frames, channels), 採樣率)
+        """
+        with wave.open(entry.path, "rb") as wav:
+            channels = wav.getnchannels()
+            sample_rate = wav.getframerate()
+            data = wav.readframes(wav.getnframes())
+        return np.frombuffer(data, dtype=np.int16).reshape(-1, channels), sample_rate
+
+    def complete(self, entry):
+        """錄音已轉錄並輸出，從暫存區刪除"""
+        for path in (entry.path, entry.failure_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        logger.info(f"Completed spooled recording {entry.id}")
+
+    def record_failure(self, entry, error, replay=False):
+        """記錄一次失敗的嘗試（錄音保留在暫存區）
+
+        Args:
+            replay: 是否為重新啟動後的重放（只有重放計入 max_replays）
+        """
+        message = str(error).replace("\n", " ")
+        kind = "replay" if replay else "session"
+        with open(entry.failure_path, "a", encoding="utf-8") as f:
+            f.write(f"{time.time():.3f}\t{kind}\t{type(error).__name__}: {message}\n")
+        logger.warning(f"Spooled recording {entry.id} failed ({self.attempts(entry)} attempts): {error}")
+
+    def _failures(self, entry):
+        """每次失敗的類型（session 或 replay）"""
+        try:
+            with open(entry.failure_path, encoding="utf-8") as f:
+                return [line.split("\t")[1] for line in f]
+        except FileNotFoundError:
+            return []
+
+    def attempts(self, entry):
+        """已失敗的嘗試次數（含錄音當下的重試）"""
+        return len(self._failures(entry))
+
+    def replays(self, entry):
+        """重新啟動後重放失敗的次數"""
+        return self._failures(entry).count("replay")
+
+    def entries(self):
+        """暫存區中所有錄音，按序號排序"""
+        ids = sorted(int(match.group(1)) for match in map(ENTRY_PATTERN.match, os.listdir(self.directory))
+                     if match)
+        return [SpoolEntry(self, id) for id in ids]
+
+    def pending(self):
+        """需要重放的錄音（重放失敗次數未達上限），按序號排序"""
+        return [entry for entry in self.entries() if self.replays(entry) < self.max_replays]
+
+    def __len__(self):
+        return len(self.entries())
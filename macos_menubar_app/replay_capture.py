@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+重放原始音頻擷取記錄
+Replay a raw audio capture log through the recording and transcription pipeline
+
+把應用記錄的擷取文件（設定 →「記錄原始音頻」，或 engine.set_capture_log）當作麥克風
+輸入，以原來的區塊、時間戳和溢出旗標走完整條流程：
+錄音器 → 靜音修剪 → 編碼 → 本地模擬 /v1/audio/transcriptions → 後處理。
+記錄中的每個輸入流重放為一段錄音（常駐收音時整個輸入流是一段）。
+不需要麥克風、macOS 或 API 金鑰，可在 Linux 上重現真實錄音的延遲和記憶體表現。
+
+報告每段錄音的長度、溢出和丟失區塊、停止 → 文字的延遲，各階段延遲、擷取健康狀態
+和峰值記憶體。
+
+用法:
+    python3 replay_capture.py ~/.speech-to-action/captures/20260101-120000.cap
+    python3 replay_capture.py session.cap --speed 0 --json replay.json    # 不等待，盡快重放
+    python3 replay_capture.py session.cap --speed 4 --segmented --latency 0.3
+"""
+
+import argparse
+import json
+import logging
+import resource
+import sys
+import time
+import tracemalloc
+
+from openai import OpenAI
+
+from capture_log import CaptureLog, ReplayAudio
+from mock_transcription_server import MockTranscriptionServer
+from recorder import AudioRecorder
+from transcription_engine import (MAX_RECORDING_SECONDS, RECORDING_SPILL_SECONDS, NoAudioError, NullSink,
+                                  TranscriptionEngine)
+
+
+def replay(log, server, speed=1.0, segmented=False):
+    """重放記錄中的每個輸入流為一段錄音
+
+    Returns:
+        (每段錄音的結果字典列表, TranscriptionEngine)
+    """
+    audio_api = ReplayAudio(log, speed=speed)
+    recorder = AudioRecorder(log.sample_rate, log.channels,
+                             blocksize=log.blocksizes[0] if log.blocksizes else 1024,
+                             audio_api=audio_api, spill_seconds=RECORDING_SPILL_SECONDS,
+                             max_seconds=MAX_RECORDING_SECONDS)
+    engine = TranscriptionEngine(
+        client=OpenAI(api_key="replay", base_url=server.base_url, max_retries=0),
+        sample_rate=log.sample_rate,
+        channels=log.channels,
+        sink=NullSink(),
+        recorder=recorder
+    )
+    engine.segmented_transcription_enabled = segmented
+    engine.warm_up(recorder=False)
+
+    recordings = []
+    for index in range(len(log.streams)):
+        engine.start_recording()
+        audio_api.source_consumed.wait()
+        session = engine.stop_recording()
+        error = None
+        try:
+            engine.process_recording(session)
+        except NoAudioError:
+            error = "no audio"
+        except Exception as e:
+            error = str(e)
+            logging.debug(f"Recording {index + 1} failed: {e}")
+        recordings.append({
+            "index": index + 1,
+            "seconds": sum(record.frames for record in log.streams[index]) / log.sample_rate,
+            "blocks": len(log.streams[index]),
+            "overflows": session.trace.fields.get("overflows", 0),
+            "dropped_blocks": session.trace.fields.get("dropped_blocks", 0),
+            "total_ms": session.trace.spans.get("total", 0.0) * 1000,
+            "error": error,
+        })
+    return recordings, engine
+
+
+def main(argv=None):
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Replay a raw audio capture log")
+    parser.add_argument("log", help="擷取記錄文件")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="重放速度，1 為記錄時的實際間隔，0 為不等待")
+    parser.add_argument("--segmented", action="store_true", help="開啟分段轉錄")
+    parser.add_argument("--latency", type=float, default=0.1, help="模擬服務固定延遲（秒）")
+    parser.add_argument("--jitter", type=float, default=0.05, help="模擬服務隨機延遲上限（秒）")
+    parser.add_argument("--realtime-factor", type=float, default=0.01,
+                        help="模擬服務每秒音頻的處理時間（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="模擬服務錯誤機率")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="把結果寫入 JSON 文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    log = CaptureLog(args.log)
+    print("=" * 72)
+    print("重放音頻擷取記錄")
+    print("Capture Log Replay")
+    print("=" * 72)
+    print(f"{args.log}: {len(log.streams)} 段錄音，{log.blocks} 個區塊，{log.duration:.1f}s 音頻，"
+          f"{log.sample_rate} Hz × {log.channels}，重放速度 "
+          f"{'不等待' if args.speed <= 0 else f'{args.speed:g}x'}")
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with MockTranscriptionServer(latency=args.latency, jitter=args.jitter,
+                                 realtime_factor=args.realtime_factor,
+                                 error_rate=args.error_rate, seed=args.seed) as server:
+        recordings, engine = replay(log, server, args.speed, args.segmented)
+    elapsed = time.perf_counter() - start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"\n{'#':>4}{'seconds':>9}{'blocks':>8}{'overflow':>10}{'dropped':>9}{'total ms':>10}")
+    for r in recordings:
+        print(f"{r['index']:>4}{r['seconds']:>9.1f}{r['blocks']:>8}{r['overflows']:>10}"
+              f"{r['dropped_blocks']:>9}{r['total_ms']:>10.1f}" + (f"  {r['error']}" if r["error"] else ""))
+    print("\n各階段延遲:")
+    print(engine.metrics.format_summary())
+    print("\n擷取健康狀態:")
+    print(engine.capture_health.format_stats())
+
+    # ru_maxrss: Linux 為 KB，macOS 為 bytes
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss_mb = maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    print(f"\n重放耗時 {elapsed:.1f}s，Python 峰值配置 {peak_memory / 1024 / 1024:.1f} MB，"
+          f"進程峰值 RSS {max_rss_mb:.0f} MB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "config": vars(args),
+                "recordings": recordings,
+                "latency": engine.metrics.summary(),
+                "capture": engine.capture_health.stats(),
+                "elapsed_s": elapsed,
+                "peak_mb": peak_memory / 1024 / 1024,
+                "max_rss_mb": max_rss_mb,
+            }, f, indent=2, ensure_ascii=False)
+    errors = sum(1 for r in recordings if r["error"] and r["error"] != "no audio")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
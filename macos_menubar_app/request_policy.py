@@ -0,0 +1,243 @@
+"""
+轉錄請求策略
+Deadlines, retries and hedging for transcription requests
+
+RequestPolicy 包裝一次 API 請求：
+- 截止時間：每次請求都帶上剩餘時間作為超時，整體不超過 deadline（按音頻長度放寬）
+- 重試：連線錯誤、超時、429 和 5xx 按指數退避（含抖動）重試，遵守 Retry-After
+- 對沖 (hedging)：請求超過同一音頻長度區間觀察到的 p95 延遲仍未回應時再發一個相同的請求，
+  採用先回來的結果；記錄發出和勝出的次數
+"""
+
+import bisect
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from latency_metrics import LatencyHistogram
+from lazy_import import lazy_import
+
+openai = lazy_import("openai")
+
+logger = logging.getLogger(__name__)
+
+# 可重試的 HTTP 狀態碼（請求超時、速率限制、服務端錯誤）
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+# 對沖門檻按音頻長度（秒）分區間統計：長音頻的正常延遲不會觸發短音頻的門檻
+HEDGE_DURATION_BUCKETS = (5, 15, 30, 60)
+
+
+class DeadlineExceeded(TimeoutError):
+    """請求（含重試）未能在截止時間內完成"""
+
+
+class StreamInterrupted(RuntimeError):
+    """串流在已輸出部分文字後中斷（不可重試，否則文字會重複）"""
+
+
+def is_retryable(error):
+    """連線錯誤、超時及 RETRYABLE_STATUS 中的狀態碼可以重試"""
+    if isinstance(error, (DeadlineExceeded, openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def retry_after(error):
+    """讀取服務端建議的等待秒數（Retry-After 標頭），沒有時回傳 None"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RequestPolicy:
+    """請求的截止時間、重試和對沖策略（多個線程共用）"""
+
+    def __init__(self, deadline=20.0, deadline_per_second=0.25, max_retries=2,
+                 base_delay=0.25, max_delay=4.0, hedge=False, hedge_quantile=95,
+                 hedge_min_samples=20, hedge_min_delay=0.2, max_concurrent=None):
+        """
+        Args:
+            deadline: 整體截止時間（秒，含重試）
+            deadline_per_second: 每秒音頻額外放寬的時間（長音頻上傳和轉錄較慢）
+            max_retries: 可重試錯誤的最大重試次數
+            base_delay: 指數退避的起始等待（秒）
+            max_delay: 單次退避上限（秒）
+            hedge: 是否啟用對沖請求
+            hedge_quantile: 超過此百分位延遲仍未回應時發出對沖請求
+            hedge_min_samples: 至少觀察到多少次成功請求後才開始對沖
+            hedge_min_delay: 對沖等待的下限（秒），避免延遲很低時幾乎每次都加倍請求
+            max_concurrent: 所有線程合計同時進行的請求數上限（None 為不限）
+        """
+        self.deadline = deadline
+        self.deadline_per_second = deadline_per_second
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+
+        # 成功請求的延遲分佈，按 HEDGE_DURATION_BUCKETS 的音頻長度區間分開（對沖門檻的依據）
+        self.latency = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self.max_concurrent = max_concurrent
+        self.requests = 0
+        self.retries = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+        self.deadlines_exceeded = 0
+
+    @property
+    def max_concurrent(self):
+        return self._max_concurrent
+
+    @max_concurrent.setter
+    def max_concurrent(self, limit):
+        self._max_concurrent = limit
+        self._slots = threading.BoundedSemaphore(limit) if limit else None
+
+    def deadline_for(self, audio_seconds=0.0):
+        """一段音頻的整體截止時間（秒）"""
+        return self.deadline + self.deadline_per_second * audio_seconds
+
+    def hedge_delay(self, hedge=None, audio_seconds=0.0):
+        """音頻長度為 audio_seconds 的請求發出對沖前的等待時間；未啟用或該長度區間樣本不足時為 None"""
+        if not (self.hedge if hedge is None else hedge):
+            return None
+        with self._lock:
+            histogram = self.latency.get(bisect.bisect_right(HEDGE_DURATION_BUCKETS, audio_seconds))
+            if histogram is None or histogram.count < self.hedge_min_samples:
+                return None
+            return max(self.hedge_min_delay, histogram.percentile(self.hedge_quantile))
+
+    def stats(self):
+        """請求計數"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won,
+                "deadlines_exceeded": self.deadlines_exceeded,
+            }
+
+    def format_stats(self):
+        stats = self.stats()
+        return (f"請求 {stats['requests']}，重試 {stats['retries']}，"
+                f"對沖 {stats['hedges_fired']}（勝出 {stats['hedges_won']}），"
+                f"超時 {stats['deadlines_exceeded']}")
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def call(self, request, deadline=None, hedge=None, audio_seconds=0.0):
+        """按策略執行請求
+
+        Args:
+            request: 請求函數 (timeout) -> 結果；timeout 為本次嘗試可用的秒數
+            deadline: 整體截止時間（秒），默認為 self.deadline
+            hedge: 是否允許對沖，默認為 self.hedge（串流請求有副作用，必須傳 False）
+            audio_seconds: 請求的音頻長度（秒），決定對沖門檻使用的延遲分佈
+
+        Returns:
+            request 的結果
+
+        Raises:
+            DeadlineExceeded: 截止時間內沒有成功的回應
+            Exception: 不可重試的錯誤（即使同時超過截止時間也原樣拋出），或重試次數用完後的最後一個錯誤
+        """
+        self._count("requests")
+        deadline_at = time.monotonic() + (deadline or self.deadline)
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline_at - time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"Request deadline of {deadline or self.deadline:.1f}s exceeded")
+                if self._slots is None:
+                    return self._attempt(request, remaining, hedge, audio_seconds)
+                # 等待空位的時間計入截止時間；退避期間不佔用空位
+                if not self._slots.acquire(timeout=remaining):
+                    raise DeadlineExceeded(f"No request slot within {remaining:.1f}s")
+                try:
+                    return self._attempt(request, deadline_at - time.monotonic(), hedge, audio_seconds)
+                finally:
+                    self._slots.release()
+            except Exception as e:
+                if not is_retryable(e):
+                    # 400/401/413 和 StreamInterrupted（已輸出的文字無法撤回）等錯誤原樣拋出，
+                    # 即使同時超過截止時間也不能變成可重試的 DeadlineExceeded
+                    raise
+                if time.monotonic() >= deadline_at:
+                    self._count("deadlines_exceeded")
+                    if isinstance(e, DeadlineExceeded):
+                        raise
+                    raise DeadlineExceeded(f"Request deadline exceeded: {e}") from e
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                suggested = retry_after(e)
+                if suggested is not None:
+                    delay = max(delay, suggested)
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                self._count("retries")
+                logger.warning(f"{type(e).__name__}, retrying in {delay:.2f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+
+    def _record(self, seconds, audio_seconds=0.0):
+        with self._lock:
+            bucket = bisect.bisect_right(HEDGE_DURATION_BUCKETS, audio_seconds)
+            self.latency.setdefault(bucket, LatencyHistogram()).record(seconds)
+
+    def _attempt(self, request, timeout, hedge=None, audio_seconds=0.0):
+        """一次嘗試；需要時發出對沖請求"""
+        hedge_delay = self.hedge_delay(hedge, audio_seconds)
+        start = time.monotonic()
+        if hedge_delay is None or hedge_delay >= timeout:
+            result = request(timeout)
+            self._record(time.monotonic() - start, audio_seconds)
+            return result
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="request")
+            executor = self._executor
+        deadline_at = start + timeout
+        primary = executor.submit(request, timeout)
+        started = {primary: start}
+        pending = {primary}
+        done, _ = wait(pending, timeout=hedge_delay)
+        if not done:
+            self._count("hedges_fired")
+            logger.info(f"No response after {hedge_delay * 1000:.0f} ms, sending hedged request")
+            hedged = executor.submit(request, deadline_at - time.monotonic())
+            started[hedged] = time.monotonic()
+            pending.add(hedged)
+
+        # 採用第一個成功的回應；全部失敗時拋出最先失敗的錯誤
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline_at - time.monotonic(), 0),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"No response within {timeout:.1f}s")
+            for future in done:
+                if future.exception() is None:
+                    self._record(time.monotonic() - started[future], audio_seconds)
+                    if future is not primary:
+                        self._count("hedges_won")
+                    # 另一個請求在背景完成（受超時限制），結果被丟棄
+                    return future.result()
+                error = error or future.exception()
+        raise error
@@ -0,0 +1,165 @@
+"""
+簡繁轉換階段
+Language-aware script conversion stage
+
+轉錄結果在送進 OpenCC 之前先做一次向量化的字元範圍檢查：
+- 沒有漢字（英文等）或假名佔比高（日文）時直接跳過；中文裡零星的假名（例如「の」）不影響轉換
+- 語言設定為非中文時跳過
+- 中英混合時只轉換非 ASCII 的片段（s2t / s2tw / s2hk 的詞典不含 ASCII，結果不變）
+轉換器按設定檔 (s2t, s2tw, s2hk) 快取，整個進程共用。
+"""
+
+import logging
+import threading
+
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+opencc = lazy_import("opencc")
+
+logger = logging.getLogger(__name__)
+
+# 可選的轉換設定檔；none 表示不轉換
+PROFILES = ("s2t", "s2tw", "s2hk", "none")
+
+# 需要簡繁轉換的語言代碼（OpenAI 的 language 參數為 ISO-639-1）
+CHINESE_LANGUAGES = ("zh", "yue")
+
+# 漢字與假名的 Unicode 範圍（含首尾）
+HAN_RANGES = (
+    (0x3400, 0x4DBF),    # CJK 擴展 A
+    (0x4E00, 0x9FFF),    # CJK 統一漢字
+    (0xF900, 0xFAFF),    # CJK 相容漢字
+    (0x20000, 0x2FA1F),  # CJK 擴展 B 以後及相容補充
+)
+KANA_RANGES = (
+    (0x3040, 0x30FF),    # 平假名、片假名
+    (0x31F0, 0x31FF),    # 片假名語音擴展
+    (0xFF66, 0xFF9F),    # 半形片假名
+)
+
+# 假名數量達到漢字數量的這個比例時視為日文（日文中假名通常多於漢字）
+KANA_SKIP_RATIO = 0.5
+
+_converters = {}
+_converters_lock = threading.Lock()
+
+
+def get_converter(profile):
+    """取得（並快取）OpenCC 轉換器"""
+    with _converters_lock:
+        converter = _converters.get(profile)
+        if converter is None:
+            converter = _converters[profile] = opencc.OpenCC(profile)
+        return converter
+
+
+def _in_ranges(codes, ranges):
+    mask = np.zeros(len(codes), dtype=bool)
+    for low, high in ranges:
+        mask |= (codes >= low) & (codes <= high)
+    return mask
+
+
+class ScriptInfo:
+    """文字的字元組成"""
+
+    def __init__(self, codes=None, han=0, kana=0):
+        self.codes = codes
+        self.han = han
+        self.kana = kana
+
+
+def detect_script(text):
+    """向量化統計文字中的漢字與假名數量
+
+    Returns:
+        ScriptInfo；純 ASCII 文字不建立碼位數組
+    """
+    if text.isascii():
+        return ScriptInfo()
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    return ScriptInfo(
+        codes,
+        han=int(np.count_nonzero(_in_ranges(codes, HAN_RANGES))),
+        kana=int(np.count_nonzero(_in_ranges(codes, KANA_RANGES)))
+    )
+
+
+def _non_ascii_runs(codes):
+    """回傳非 ASCII 連續片段的 (start, end) 列表"""
+    non_ascii = np.concatenate(([False], codes > 0x7F, [False]))
+    edges = np.flatnonzero(non_ascii[1:] != non_ascii[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+class ConversionStage:
+    """按語言與字元組成決定是否以及如何做簡繁轉換"""
+
+    def __init__(self, profile="s2t"):
+        """
+        Args:
+            profile: s2t（繁體）、s2tw（台灣）、s2hk（香港）或 none
+        """
+        if profile not in PROFILES:
+            raise ValueError(f"Unsupported conversion profile: {profile}")
+        self.profile = profile
+
+    def warm_up(self):
+        """預先載入 numpy 與目前設定檔的轉換器"""
+        detect_script("預熱")
+        if self.profile != "none":
+            get_converter(self.profile)
+
+    def _skip_reason(self, text, language, script):
+        if self.profile == "none":
+            return "profile none"
+        if language and language.split("-")[0].lower() not in CHINESE_LANGUAGES:
+            return f"language {language}"
+        if script.han == 0:
+            return "no Han characters"
+        if script.kana >= script.han * KANA_SKIP_RATIO:
+            return "Japanese kana"
+        return None
+
+    def convert(self, text, language=None):
+        """轉換一段轉錄結果
+
+        Args:
+            text: 轉錄文字
+            language: 使用者設定的語言代碼，None 表示自動偵測
+
+        Returns:
+            轉換後的文字（不需要轉換時原樣回傳）
+        """
+        return self.convert_with_action(text, language)[0]
+
+    def convert_with_action(self, text, language=None):
+        """轉換一段轉錄結果，並說明是否轉換（多個線程可同時呼叫）
+
+        Returns:
+            (轉換後的文字, 說明)；說明如 "skipped (no Han characters)" 或 "converted (s2t, 1 runs)"，
+            空字串時為 None
+        """
+        if not text:
+            return text, None
+        script = detect_script(text)
+        reason = self._skip_reason(text, language, script)
+        if reason:
+            return text, f"skipped ({reason})"
+
+        converter = get_converter(self.profile)
+        runs = _non_ascii_runs(script.codes)
+        if len(runs) == 1 and runs[0] == (0, len(text)):
+            result = converter.convert(text)
+        else:
+            # 只轉換非 ASCII 片段，英文、數字和空白原樣保留
+            parts = []
+            position = 0
+            for start, end in runs:
+                parts.append(text[position:start])
+                parts.append(converter.convert(text[start:end]))
+                position = end
+            parts.append(text[position:])
+            result = "".join(parts)
+        return result, f"converted ({self.profile}, {len(runs)} runs)"
@@ -0,0 +1,387 @@
+"""
+錄音中分段轉錄
+Incremental segment transcription while recording
+
+在錄音過程中於自然停頓處切分音頻，並在背景將已完成的片段送去轉錄，
+停止錄音時只需等待最後一小段，再按順序拼接結果。音頻回調只把區塊放入隊列，
+切分在 BackgroundSegmenter 的線程中進行；片段到達長度上限時以 split_long_audio
+找切點，找不到停頓時與下一個片段重疊，拼接時以 merge_overlap 去重。
+
+split_long_audio / transcribe_chunked 用於已錄完的長音頻：在低能量處切成
+不超過上傳限制的區塊，並行轉錄後按順序拼接（強制切分的重疊部分去重）。
+"""
+
+import logging
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_vad import frame_features, mono_samples
+from lazy_import import lazy_import
+
+np = lazy_import("numpy")
+
+logger = logging.getLogger(__name__)
+
+
+def join_segment_texts(texts):
+    """按順序拼接片段文字
+
+    中文等文字直接相連；兩側都是英數字時補一個空格。
+    """
+    result = ""
+    for text in texts:
+        text = text.strip()
+        if not text:
+            continue
+        if result and result[-1].isascii() and result[-1].isalnum() \
+                and text[0].isascii() and text[0].isalnum():
+            result += " "
+        result += text
+    return result
+
+
+def merge_overlap(left, right, max_overlap=64, min_overlap=2):
+    """拼接兩段重疊音頻的文字：right 開頭若重複了 left 的結尾，只保留一次
+
+    Args:
+        left: 前一段文字
+        right: 後一段文字（其音頻開頭與前一段結尾重疊）
+        max_overlap: 最多比對的字元數
+        min_overlap: 至少重複多少字元才視為重疊，避免誤刪單字
+
+    Returns:
+        拼接後的文字
+    """
+    left = left.rstrip()
+    right = right.lstrip()
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return join_segment_texts([left, right[size:]])
+    return join_segment_texts([left, right])
+
+
+def split_long_audio(audio, sample_rate, max_chunk=120.0, search=0.25,
+                     silence_threshold=500, overlap=1.0, frame_ms=30):
+    """把長音頻切成不超過 max_chunk 秒的區塊，切點選在低能量處
+
+    每個區塊在最後 search 比例的範圍內找能量最低的幀，在它所在的停頓中間切分；
+    範圍內沒有低於 silence_threshold 的幀（連續說話）時在上限處強制切分，
+    並讓下一個區塊往前重疊 overlap 秒，避免把一個字切成兩半。
+
+    Returns:
+        [(start, end, overlapped), ...] 樣本範圍；overlapped 表示與前一個區塊重疊
+    """
+    samples = mono_samples(audio)
+    total = len(samples)
+    max_samples = int(max_chunk * sample_rate)
+    if total <= max_samples:
+        return [(0, total, False)]
+
+    frame_size = max(1, int(sample_rate * frame_ms / 1000))
+    rms, _ = frame_features(samples, frame_size)
+    overlap_samples = min(int(overlap * sample_rate), max_samples // 2)
+
+    chunks = []
+    start, overlapped = 0, False
+    while total - start > max_samples:
+        limit = start + max_samples
+        first_frame = -(-(limit - int(max_samples * search)) // frame_size)
+        last_frame = limit // frame_size
+        quietest = first_frame + int(np.argmin(rms[first_frame:last_frame])) \
+            if last_frame > first_frame else None
+        if quietest is not None and rms[quietest] < silence_threshold:
+            # 在停頓中間切開（兩側都保留一點靜音），不需要重疊
+            left = right = quietest
+            while left > first_frame and rms[left - 1] < silence_threshold:
+                left -= 1
+            while right + 1 < last_frame and rms[right + 1] < silence_threshold:
+                right += 1
+            end = min((left + right + 1) * frame_size // 2, limit)
+            chunks.append((start, end, overlapped))
+            start, overlapped = end, False
+        else:
+            chunks.append((start, limit, overlapped))
+            start, overlapped = limit - overlap_samples, overlap_samples > 0
+    chunks.append((start, total, overlapped))
+    return chunks
+
+
+def transcribe_chunked(audio, sample_rate, transcribe_fn, max_chunk=120.0, max_workers=4,
+                       executor=None, **kwargs):
+    """切分長音頻、並行轉錄並按順序拼接
+
+    Args:
+        audio: int16 音頻數組
+        sample_rate: 採樣率
+        transcribe_fn: 轉錄函數 (audio_array) -> str，會在多個線程中同時呼叫
+        max_chunk: 每個區塊最長（秒）
+        max_workers: 同時進行的轉錄請求數（沒有 executor 時）
+        executor: 共用的線程池（例如批次轉錄中所有文件共用），默認建立自己的線程池
+        kwargs: 傳給 split_long_audio 的其他參數
+
+    Returns:
+        拼接後的文字
+    """
+    chunks = split_long_audio(audio, sample_rate, max_chunk, **kwargs)
+    if len(chunks) == 1:
+        return transcribe_fn(audio)
+    logger.info(f"Transcribing {len(audio) / sample_rate:.0f}s of audio as {len(chunks)} chunks")
+    if executor is not None:
+        texts = _transcribe_chunks(executor, audio, chunks, transcribe_fn)
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks)),
+                                thread_name_prefix="chunk") as executor:
+            texts = _transcribe_chunks(executor, audio, chunks, transcribe_fn)
+
+    result = ""
+    for text, (_, _, overlapped) in zip(texts, chunks):
+        result = merge_overlap(result, text) if overlapped else join_segment_texts([result, text])
+    return result
+
+
+def _transcribe_chunks(executor, audio, chunks, transcribe_fn):
+    futures = [executor.submit(transcribe_fn, audio[start:end]) for start, end, _ in chunks]
+    try:
+        return [future.result() for future in futures]
+    except Exception:
+        for future in futures:
+            future.cancel()
+        raise
+
+
+class PauseSegmenter:
+    """根據靜音停頓切分音頻流"""
+
+    def __init__(self, sample_rate, silence_threshold=500, min_pause=0.6,
+                 min_segment=3.0, max_segment=30.0, overlap=1.0):
+        """
+        Args:
+            sample_rate: 採樣率
+            silence_threshold: 判定為靜音的 RMS 門檻（int16 振幅）
+            min_pause: 停頓至少持續多久（秒）才切分
+            min_segment: 片段至少多長（秒）才允許切分，避免過多短請求
+            max_segment: 片段最長（秒），超過時在最後一段的低能量處切分
+            overlap: 找不到低能量處而強制切分時，下一個片段往前重疊的秒數
+        """
+        self.sample_rate = sample_rate
+        self.silence_threshold = silence_threshold
+        self.min_pause_samples = int(min_pause * sample_rate)
+        self.min_segment_samples = int(min_segment * sample_rate)
+        self.max_segment_samples = int(max_segment * sample_rate)
+        self.overlap = overlap
+        # 最近取出的片段開頭是否與前一個片段重疊（拼接時需要 merge_overlap）
+        self.overlapped = False
+        self._overlapped = False  # 累積中的片段是否以重疊開頭
+        self._blocks = []
+        self._samples = 0
+        self._silent_samples = 0
+        self._has_voice = False
+
+    def feed(self, block):
+        """送入一個音頻區塊
+
+        Returns:
+            已完成的片段（可能為 None）
+        """
+        samples = block.astype(np.float32)
+        rms = float(np.sqrt(np.mean(samples * samples))) if len(samples) else 0.0
+
+        self._blocks.append(block)
+        self._samples += len(block)
+
+        if rms < self.silence_threshold:
+            self._silent_samples += len(block)
+        else:
+            self._silent_samples = 0
+            self._has_voice = True
+
+        if self._samples >= self.max_segment_samples:
+            # 整段都是靜音時丟棄（與 flush(keep_silent=False) 相同），不送出無意義的請求
+            if not self._has_voice:
+                self._cut()
+                return None
+            return self._split()
+        if (self._has_voice
+                and self._samples >= self.min_segment_samples
+                and self._silent_samples >= self.min_pause_samples):
+            return self._cut()
+        return None
+
+    def flush(self, keep_silent=True):
+        """取出尚未切分的尾段
+
+        Args:
+            keep_silent: 尾段全為靜音時是否仍然回傳；
+                已有其他片段時可設為 False，省去一次無意義的請求
+        """
+        if not self._blocks:
+            return None
+        if not keep_silent and not self._has_voice:
+            self._cut()
+            return None
+        return self._cut()
+
+    def _cut(self):
+        segment = np.concatenate(self._blocks, axis=0)
+        self._blocks = []
+        self._samples = 0
+        self._silent_samples = 0
+        self._has_voice = False
+        self.overlapped, self._overlapped = self._overlapped, False
+        return segment
+
+    def _split(self):
+        """片段達到上限：與長錄音相同，在最後一段的低能量處切開；連續說話時在上限處切開，
+        剩下的音頻（含重疊部分）留作下一個片段的開頭"""
+        audio = np.concatenate(self._blocks, axis=0)
+        # split_long_audio 只切分超過上限的音頻；區塊剛好湊滿上限時少算一個樣本
+        max_chunk = min(self.max_segment_samples, len(audio) - 1) / self.sample_rate
+        chunks = split_long_audio(audio, self.sample_rate, max_chunk,
+                                  silence_threshold=self.silence_threshold, overlap=self.overlap)
+        (_, end, _), (start, _, overlapped) = chunks[0], chunks[1]
+        segment, rest = audio[:end], audio[start:]
+        samples = rest.astype(np.float32)
+        self._blocks = [rest]
+        self._samples = len(rest)
+        self._silent_samples = 0
+        self._has_voice = bool(len(samples)) and float(np.sqrt(np.mean(samples * samples))) >= self.silence_threshold
+        self.overlapped, self._overlapped = self._overlapped, overlapped
+        return segment
+
+
+class BackgroundSegmenter:
+    """在背景線程中切分音頻流並提交片段轉錄
+
+    feed 只把區塊放入隊列，可以在音頻回調或事件循環中呼叫；
+    PauseSegmenter 的拼接、能量計算和提交請求都在 "segmenter" 線程中進行。
+    """
+
+    def __init__(self, segmenter, transcriber):
+        """
+        Args:
+            segmenter: PauseSegmenter
+            transcriber: SegmentTranscriber，完成的片段送到這裡
+        """
+        self.segmenter = segmenter
+        self.transcriber = transcriber
+        self._cancelled = False
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="segmenter", daemon=True)
+        self._thread.start()
+
+    @property
+    def overlapped(self):
+        """flush 取出的尾段開頭是否與前一個片段重疊"""
+        return self.segmenter.overlapped
+
+    def feed(self, block):
+        """送入一個音頻區塊（立即返回；區塊之後不可再被修改）"""
+        self._queue.put(block)
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None or self._cancelled:
+                return
+            segment = self.segmenter.feed(block)
+            if segment is None:
+                continue
+            try:
+                self.transcriber.submit(segment, self.segmenter.overlapped)
+            except RuntimeError:
+                # 轉錄已取消（線程池已關閉）
+                logger.info("Segment transcription cancelled, dropping remaining audio")
+                return
+
+    def flush(self):
+        """等待隊列中的區塊切分完，取出尾段；已有片段時丟棄全為靜音的尾段"""
+        self._queue.put(None)
+        self._thread.join()
+        return self.segmenter.flush(keep_silent=self.transcriber.segment_count == 0)
+
+    def cancel(self):
+        """停止切分並取消尚未開始的片段"""
+        self._cancelled = True
+        self._queue.put(None)
+        self.transcriber.cancel()
+
+
+class SegmentTranscriber:
+    """在背景轉錄已完成的片段，停止時按順序拼接"""
+
+    def __init__(self, transcribe_fn, max_workers=2, executor=None):
+        """
+        Args:
+            transcribe_fn: 轉錄函數 (audio_array) -> str
+            max_workers: 同時進行的轉錄請求數（沒有 executor 時）
+            executor: 共用的線程池（例如本機服務的轉錄線程池）；默認建立自己的線程池
+        """
+        self.transcribe_fn = transcribe_fn
+        self._owns_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=max_workers,
+                                                        thread_name_prefix="segment")
+        self._futures = []
+        self._overlapped = []  # 每個片段的開頭是否與前一個片段重疊
+        self._lock = threading.Lock()
+
+    @property
+    def segment_count(self):
+        with self._lock:
+            return len(self._futures)
+
+    def submit(self, segment, overlapped=False):
+        """提交一個片段到背景轉錄
+
+        Args:
+            segment: 片段音頻
+            overlapped: 片段開頭是否與前一個片段重疊（拼接時去掉重複的文字）
+        """
+        with self._lock:
+            index = len(self._futures)
+            logger.info(f"Submitting segment {index}: {len(segment)} samples")
+            self._futures.append(self._executor.submit(self.transcribe_fn, segment))
+            self._overlapped.append(overlapped)
+        return index
+
+    def finish(self, tail=None, timeout=None, overlapped=False):
+        """在呼叫線程中轉錄尾段，並等待之前的片段完成
+
+        尾段不再排入線程池：呼叫方本身可能是共用線程池的工作線程，
+        在池中等待自己排在後面的尾段會在線程用完時死鎖。
+
+        Args:
+            tail: 最後一段音頻（可為 None）
+            timeout: 每個片段的最長等待時間（秒）
+            overlapped: 尾段開頭是否與前一個片段重疊
+
+        Returns:
+            按錄音順序拼接的文字
+        """
+        with self._lock:
+            futures = list(self._futures)
+            flags = list(self._overlapped)
+        try:
+            tail_text = self.transcribe_fn(tail) if tail is not None and len(tail) else ""
+            texts = [future.result(timeout=timeout) for future in futures]
+        except BaseException:
+            self.cancel()
+            raise
+        finally:
+            self._shutdown()
+        result = ""
+        for text, overlap in zip(texts + [tail_text], flags + [overlapped]):
+            result = merge_overlap(result, text) if overlap else join_segment_texts([result, text])
+        return result
+
+    def cancel(self):
+        """取消尚未開始的片段"""
+        with self._lock:
+            for future in self._futures:
+                future.cancel()
+        self._shutdown()
+
+    def _shutdown(self):
+        # 共用的線程池由建立者關閉
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
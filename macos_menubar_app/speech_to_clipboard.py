@@ -5,66 +5,48 @@ Speech-to-Text macOS Menubar App
 """
 
 import rumps
-import sounddevice as sd
-import numpy as np
 import threading
-import queue
 import os
-import time
-from openai import OpenAI
-import pyperclip
-from scipy.io import wavfile
-import tempfile
+import subprocess
 import logging
-from opencc import OpenCC
-
-# 將不常用的繁體字改成常用的（來自 clip2trad-python）
-MANUAL_MAPPINGS = {
-    '瞭解': '了解',
-    '羣': '群',
-    '臺': '台',
-    '峯': '峰',
-    '喫': '吃',
-    '纔': '才',
-}
-
-
-def apply_manual_mappings(text, mappings):
-    """
-    根據手動映射字典替換文本中的指定詞彙。
-
-    :param text: 要處理的文本
-    :param mappings: 替換映射字典
-    :return: 替換後的文本
-    """
-    for key, value in mappings.items():
-        text = text.replace(key, value)
-    return text
-
-# macOS Accessibility 和按鍵模擬
-from AppKit import NSWorkspace
-from ApplicationServices import (
-    AXUIElementCreateSystemWide,
-    AXUIElementCopyAttributeValue,
-    kAXFocusedApplicationAttribute,
-    kAXFocusedUIElementAttribute,
-    kAXRoleAttribute,
-    AXIsProcessTrustedWithOptions,
-    kAXTrustedCheckOptionPrompt
-)
-from Quartz import (
-    CGEventCreateKeyboardEvent,
-    CGEventPost,
-    kCGEventKeyDown,
-    kCGEventKeyUp,
-    kCGHIDEventTap,
-    CGEventSetFlags,
-    kCGEventFlagMaskCommand
-)
-from CoreFoundation import CFPreferencesCopyAppValue
-
-# 全局快捷鍵
-from pynput import keyboard
+import time
+
+from audio_encoding import FORMATS
+from history_store import HistoryStore
+from latency_metrics import MetricsRegistry
+from lazy_import import lazy_import
+from macos_adapters import PasteSink, check_accessibility_permission
+from recording_spool import RecordingSpool
+from script_conversion import PROFILES, ConversionStage
+from text_rewriter import MANUAL_MAPPINGS, UserDictionary
+from transcription_engine import (APP_SUPPORT_DIR, MAX_RECORDING_SECONDS, USER_DICTIONARY_PATH, NoAudioError,
+                                  PostProcessor, TranscriptionEngine)
+from ui_dispatcher import UIDispatcher, prepended_count
+
+# 每段錄音的各階段延遲（JSONL，每行一段錄音）
+LATENCY_LOG_PATH = os.path.join(APP_SUPPORT_DIR, "latency.jsonl")
+
+# 轉錄記錄（SQLite，可全文搜尋）
+HISTORY_PATH = os.path.join(APP_SUPPORT_DIR, "history.sqlite3")
+
+# 錄音暫存區：轉錄完成前的錄音保存在這裡，重新啟動後重放
+SPOOL_DIR = os.path.join(APP_SUPPORT_DIR, "spool")
+
+# 原始音頻擷取記錄（除錯用，以 replay_capture.py 重放）
+CAPTURE_DIR = os.path.join(APP_SUPPORT_DIR, "captures")
+
+# 介面更新的最短間隔（秒）：其他線程的狀態變化合併後在主線程套用
+UI_REFRESH_INTERVAL = 0.05
+
+# 最近結果顯示的條數
+RECENT_RESULTS_COUNT = 5
+
+# 常駐收音：預錄長度，以及閒置多久後釋放麥克風（秒）
+PREROLL_SECONDS = 0.5
+PREROLL_IDLE_TIMEOUT = 300
+
+# 全局快捷鍵（較重的依賴延遲載入）
+pynput = lazy_import("pynput")
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -80,26 +62,32 @@ class SpeechToClipboardApp(rumps.App):
             quit_button=None  # 自定義退出按鈕
         )
 
-        # 初始化 OpenAI 客戶端
-        api_key = os.getenv('OPENAI_API_KEY')
-        if not api_key:
+        # 檢查 OpenAI API key（客戶端延遲到第一次使用時建立）
+        self.api_key = os.getenv('OPENAI_API_KEY')
+        if not self.api_key:
             rumps.alert("錯誤", "請設置 OPENAI_API_KEY 環境變量")
             raise ValueError("OPENAI_API_KEY not set")
 
-        self.client = OpenAI(api_key=api_key)
-
-        # 初始化簡繁轉換器（簡體轉繁體）
-        self.cc = OpenCC('s2t')
+        # 詞典替換：內建映射 + 自定義詞典，編譯為單次掃描的替換器，文件變更時才重建
+        self.user_dictionary = UserDictionary(USER_DICTIONARY_PATH, MANUAL_MAPPINGS)
+        # 輸出：複製到剪貼板並自動粘貼到焦點應用（macOS 適配器）
+        self.paste_sink = PasteSink()
+        # 轉錄流程（錄音、編碼、轉錄、後處理）由與介面無關的引擎負責；
+        # 簡繁轉換按語言和字元組成決定是否轉換，轉換器按設定檔快取
+        # 各階段延遲記錄在記憶體直方圖中，並逐段錄音追加到 latency.jsonl
+        os.makedirs(APP_SUPPORT_DIR, exist_ok=True)
+        self.engine = TranscriptionEngine(
+            api_key=self.api_key,
+            post_processor=PostProcessor(ConversionStage('s2t'), self.user_dictionary),
+            sink=self.paste_sink,
+            metrics=MetricsRegistry(LATENCY_LOG_PATH)
+        )
+        # 停止的錄音先落盤再轉錄，API 故障時不會遺失
+        self.engine.spool = RecordingSpool(SPOOL_DIR)
+        # 錄音到達長度上限時錄音器已自行停止，這裡把錄音送去轉錄
+        self.engine.on_recording_limit = self._on_recording_limit
 
-        # 錄音參數
-        self.sample_rate = 16000  # Whisper 推薦 16kHz
-        self.channels = 1
         self.recording = False
-        self.processing = False  # 新增：標記是否正在處理音頻
-        self.audio_queue = queue.Queue()
-        self.audio_data = []
-        self.audio_lock = threading.Lock()  # 新增：保護 audio_data
-        self.recording_thread = None 
 
         # 設置菜單
         self.menu = [
@@ -108,8 +96,11 @@ class SpeechToClipboardApp(rumps.App):
             rumps.MenuItem("錄音中...", callback=None),
             rumps.separator,
             rumps.MenuItem("最近結果"),
+            rumps.MenuItem("搜尋記錄...", callback=self.search_history),
             rumps.separator,
             rumps.MenuItem("設定"),
+            rumps.MenuItem("延遲統計...", callback=self.show_latency_stats),
+            rumps.MenuItem("音頻擷取狀態...", callback=self.show_capture_health),
             rumps.MenuItem("關於"),
             rumps.separator,
             rumps.MenuItem("退出", callback=self.quit_app)
@@ -119,48 +110,124 @@ class SpeechToClipboardApp(rumps.App):
         self.menu["錄音中..."].set_callback(None)
         self.menu["錄音中..."].state = False
 
-        # 初始化最近結果子菜單
-        self.recent_results = []
+        # 介面狀態只在主線程套用：其他線程透過 self.ui.set 提交，計時器合併後套用差異
+        self.ui = UIDispatcher()
+        self.ui.register("icon", lambda icon: setattr(self, "title", icon))
+        self.ui.register("record_item",
+                         lambda title: setattr(self.menu["開始錄音 (⌃⌥A)"], "title", title))
+        self.ui.register("recording_indicator",
+                         lambda state: setattr(self.menu["錄音中..."], "state", state))
+        self.ui.register("recent_results", self._apply_recent_results)
+        self.ui.register("notification", lambda args: rumps.notification(*args))
+        self._status_lock = threading.Lock()
+        self._ui_timer = rumps.Timer(self.ui.flush, UI_REFRESH_INTERVAL)
+        self._ui_timer.start()
+
+        # 最近結果的菜單項只建立一次，新結果重用最舊的菜單項並移到最上面
+        placeholder = rumps.MenuItem("(無記錄)", callback=None)
+        self.menu["最近結果"].add(placeholder)
+        self._recent_items = [placeholder]
+        self._recent_texts = []
+
+        # 轉錄記錄：保存在 SQLite，記憶體中只保留最近幾條
+        self.history = HistoryStore(HISTORY_PATH)
         self.update_recent_results_menu()
 
-        # 自動粘貼設置（默認開啟）
-        self.auto_paste_enabled = True
-
         # 全局快捷鍵設置
         self.global_hotkey_enabled = True
         self.hotkey_listener = None
 
+        # 常駐收音（默認關閉：麥克風只在錄音時打開）
+        self.preroll_enabled = False
+
+        # 原始音頻擷取記錄（默認關閉：只在重現問題時開啟）
+        self.capture_log_path = None
+
         # 初始化設定子菜單
         self.setup_settings_menu()
 
+        # 圖示出現後再檢查權限、啟動快捷鍵監聽並預熱轉錄流程
+        self._startup_timer = rumps.Timer(self._on_startup, 0.05)
+        self._startup_timer.start()
+
+    @property
+    def conversion_stage(self):
+        return self.engine.post_processor.conversion_stage
+
+    def _on_startup(self, timer):
+        """事件循環開始後執行一次：權限檢查、快捷鍵監聽，並啟動背景預熱"""
+        timer.stop()
+
         # 檢查輔助功能權限
         self.check_accessibility_permission()
 
         # 啟動全局快捷鍵監聽
         self.start_global_hotkey_listener()
 
+        threading.Thread(target=self._warm_up, daemon=True).start()
+
+        # 重放上次退出前未完成的錄音
+        self.replay_spool()
+
+    def _warm_up(self):
+        """在背景載入轉錄流程用到的模組和物件，讓第一次按快捷鍵時不必等待"""
+        try:
+            self.engine.warm_up()
+        except Exception as e:
+            logger.warning(f"Warm-up failed: {e}")
+
+    def replay_spool(self):
+        """重放暫存區中未完成的錄音：結果保存到記錄並通知，不粘貼到目前的焦點應用"""
+        replays = self.engine.replay_spool()
+        if not replays:
+            return
+        self._update_status_icon()
+        rumps.notification("語音轉文字", f"正在重新轉錄 {len(replays)} 段未完成的錄音", "完成後可在「最近結果」中找到")
+        for _, future in replays:
+            future.add_done_callback(self._on_replay_done)
+
+    def _on_replay_done(self, future):
+        """一段重放的錄音處理完成（在工作線程中呼叫）"""
+        try:
+            result = future.result()
+            self.history.add_result(result)
+            self.update_recent_results_menu()
+            self.notify("已恢復錄音", "已保存到最近結果",
+                        result.text[:100] + "..." if len(result.text) > 100 else result.text)
+        except Exception as e:
+            logger.error(f"Spool replay error: {e}", exc_info=True)
+        finally:
+            self._update_status_icon()
+
     def check_accessibility_permission(self):
         """檢查輔助功能權限"""
-        options = {kAXTrustedCheckOptionPrompt: True}
-        trusted = AXIsProcessTrustedWithOptions(options)
-        if not trusted:
-            logger.warning("Accessibility permission required for auto-paste")
-        return trusted
+        return check_accessibility_permission()
 
     def setup_settings_menu(self):
         """設置設定子菜單"""
         settings_menu = [
             rumps.MenuItem("語言: 自動偵測", callback=self.change_language),
             rumps.MenuItem("✓ 自動粘貼到焦點應用", callback=self.toggle_auto_paste),
+            rumps.MenuItem("✓ 按錄音順序粘貼", callback=self.toggle_ordered_paste),
+            rumps.MenuItem("串流輸出（邊轉錄邊粘貼）", callback=self.toggle_streaming),
             rumps.MenuItem("✓ 全局快捷鍵 (⌃⌥A)", callback=self.toggle_global_hotkey),
-            rumps.MenuItem("模型: gpt-4o-mini-transcribe", callback=None),
+            rumps.MenuItem("分段轉錄（錄音中轉錄）", callback=self.toggle_segmented_transcription),
+            rumps.MenuItem("常駐收音（預錄 0.5 秒）", callback=self.toggle_preroll),
+            rumps.MenuItem("對沖慢請求（降低長尾延遲）", callback=self.toggle_hedging),
+            rumps.MenuItem("✓ 上傳前修剪靜音", callback=self.toggle_vad),
+            rumps.MenuItem(f"靜音門檻: {self.engine.vad_config.energy_threshold:.0f}", callback=self.change_vad_threshold),
+            rumps.MenuItem(f"上傳格式: {self.engine.upload_format.upper()}", callback=self.change_upload_format),
+            rumps.MenuItem(f"模型: {self.engine.model_spec}", callback=self.change_model),
+            rumps.MenuItem(f"簡繁轉換: {self.conversion_stage.profile}", callback=self.change_conversion_profile),
+            rumps.MenuItem("編輯自定義詞典...", callback=self.open_user_dictionary),
+            rumps.MenuItem("記錄原始音頻（除錯）", callback=self.toggle_capture_log),
         ]
         self.menu["設定"] = settings_menu
 
     def toggle_auto_paste(self, sender):
         """切換自動粘貼功能"""
-        self.auto_paste_enabled = not self.auto_paste_enabled
-        if self.auto_paste_enabled:
+        self.paste_sink.auto_paste_enabled = not self.paste_sink.auto_paste_enabled
+        if self.paste_sink.auto_paste_enabled:
             sender.title = "✓ 自動粘貼到焦點應用"
             # 檢查權限
             if not self.check_accessibility_permission():
@@ -171,7 +238,192 @@ class SpeechToClipboardApp(rumps.App):
                 )
         else:
             sender.title = "自動粘貼到焦點應用"
-        logger.info(f"Auto-paste: {'Enabled' if self.auto_paste_enabled else 'Disabled'}")
+        logger.info(f"Auto-paste: {'Enabled' if self.paste_sink.auto_paste_enabled else 'Disabled'}")
+
+    def toggle_ordered_paste(self, sender):
+        """切換輸出順序：按錄音順序，或先完成的先粘貼"""
+        jobs = self.engine.jobs
+        jobs.ordered = not jobs.ordered
+        if jobs.ordered:
+            sender.title = "✓ 按錄音順序粘貼"
+        else:
+            sender.title = "按錄音順序粘貼"
+        logger.info(f"Ordered paste: {'Enabled' if jobs.ordered else 'Disabled'}")
+
+    def toggle_streaming(self, sender):
+        """切換串流輸出：轉錄文字到達時逐段後處理並粘貼"""
+        engine = self.engine
+        engine.streaming_enabled = not engine.streaming_enabled
+        if engine.streaming_enabled:
+            sender.title = "✓ 串流輸出（邊轉錄邊粘貼）"
+        else:
+            sender.title = "串流輸出（邊轉錄邊粘貼）"
+        logger.info(f"Streaming output: {'Enabled' if engine.streaming_enabled else 'Disabled'}")
+
+    def toggle_segmented_transcription(self, sender):
+        """切換分段轉錄功能"""
+        engine = self.engine
+        engine.segmented_transcription_enabled = not engine.segmented_transcription_enabled
+        if engine.segmented_transcription_enabled:
+            sender.title = "✓ 分段轉錄（錄音中轉錄）"
+        else:
+            sender.title = "分段轉錄（錄音中轉錄）"
+        logger.info(f"Segmented transcription: {'Enabled' if engine.segmented_transcription_enabled else 'Disabled'}")
+
+    def toggle_preroll(self, sender):
+        """切換常駐收音：輸入流保持開啟，錄音包含按快捷鍵前 0.5 秒的音頻"""
+        self.preroll_enabled = not self.preroll_enabled
+        try:
+            self.engine.set_preroll(PREROLL_SECONDS if self.preroll_enabled else 0,
+                                    idle_timeout=PREROLL_IDLE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Failed to open input stream: {e}")
+            self.preroll_enabled = False
+            rumps.notification("錯誤", "無法開啟麥克風", str(e))
+        if self.preroll_enabled:
+            sender.title = "✓ 常駐收音（預錄 0.5 秒）"
+        else:
+            sender.title = "常駐收音（預錄 0.5 秒）"
+        logger.info(f"Always-on capture: {'Enabled' if self.preroll_enabled else 'Disabled'}")
+
+    def toggle_capture_log(self, sender):
+        """切換原始音頻擷取記錄：每個音頻回調的區塊寫入文件，可用 replay_capture.py 重放"""
+        if self.capture_log_path is None:
+            os.makedirs(CAPTURE_DIR, exist_ok=True)
+            path = os.path.join(CAPTURE_DIR, time.strftime("%Y%m%d-%H%M%S") + ".cap")
+            try:
+                self.engine.set_capture_log(path)
+            except OSError as e:
+                logger.error(f"Failed to open capture log: {e}")
+                rumps.notification("錯誤", "無法建立擷取記錄", str(e))
+                return
+            self.capture_log_path = path
+            sender.title = "✓ 記錄原始音頻（除錯）"
+            rumps.notification("語音轉文字", "開始記錄原始音頻", path)
+        else:
+            self.engine.set_capture_log(None)
+            rumps.notification("語音轉文字", "原始音頻已保存", self.capture_log_path)
+            self.capture_log_path = None
+            sender.title = "記錄原始音頻（除錯）"
+        logger.info(f"Capture log: {'Enabled' if self.capture_log_path else 'Disabled'}")
+
+    def toggle_hedging(self, sender):
+        """切換對沖請求：超過同長度音頻的 p95 延遲仍未回應時再發一個相同請求"""
+        policy = self.engine.request_policy
+        policy.hedge = not policy.hedge
+        if policy.hedge:
+            sender.title = "✓ 對沖慢請求（降低長尾延遲）"
+        else:
+            sender.title = "對沖慢請求（降低長尾延遲）"
+        logger.info(f"Request hedging: {'Enabled' if policy.hedge else 'Disabled'}")
+
+    def toggle_vad(self, sender):
+        """切換上傳前靜音修剪"""
+        self.engine.vad_enabled = not self.engine.vad_enabled
+        if self.engine.vad_enabled:
+            sender.title = "✓ 上傳前修剪靜音"
+        else:
+            sender.title = "上傳前修剪靜音"
+        logger.info(f"Silence trimming: {'Enabled' if self.engine.vad_enabled else 'Disabled'}")
+
+    def change_vad_threshold(self, sender):
+        """更改靜音判定門檻"""
+        response = rumps.Window(
+            "設定靜音門檻",
+            "輸入語音能量門檻 (RMS, int16 振幅)，環境吵雜時調高:",
+            default_text=f"{self.engine.vad_config.energy_threshold:.0f}",
+            ok="確定",
+            cancel="取消"
+        ).run()
+
+        if response.clicked:
+            try:
+                threshold = float(response.text.strip())
+            except ValueError:
+                rumps.alert("錯誤", "請輸入數字")
+                return
+            self.engine.vad_config.energy_threshold = threshold
+            sender.title = f"靜音門檻: {threshold:.0f}"
+            logger.info(f"VAD energy threshold: {threshold}")
+
+    def change_upload_format(self, sender):
+        """更改上傳音頻格式"""
+        response = rumps.Window(
+            "設定上傳格式",
+            "輸入格式 (wav, flac, ogg)。flac 無損約小 1.5-2 倍，ogg (Opus) 約小 5-10 倍:",
+            default_text=self.engine.upload_format,
+            ok="確定",
+            cancel="取消"
+        ).run()
+
+        if response.clicked:
+            fmt = response.text.strip().lower()
+            if fmt not in FORMATS:
+                rumps.alert("錯誤", f"不支援的格式: {fmt}")
+                return
+            self.engine.upload_format = fmt
+            sender.title = f"上傳格式: {fmt.upper()}"
+            logger.info(f"Upload format: {fmt}")
+
+    def change_model(self, sender):
+        """更改轉錄模型／後端"""
+        response = rumps.Window(
+            "設定模型",
+            "輸入 OpenAI 模型 (gpt-4o-mini-transcribe, gpt-4o-transcribe, whisper-1)\n"
+            "或本機模型 local:<大小> (例如 local:small, local:base，需安裝 faster-whisper):",
+            default_text=self.engine.backend.name,
+            ok="確定",
+            cancel="取消"
+        ).run()
+
+        if not response.clicked or not response.text.strip():
+            return
+
+        try:
+            backend = self.engine.set_model(response.text)
+        except ValueError as e:
+            rumps.alert("錯誤", str(e))
+            return
+        sender.title = f"模型: {backend.name}"
+        logger.info(f"Transcription backend: {backend.name}")
+
+        # 在背景預先載入模型，第一次轉錄不必等待
+        def warm_up():
+            try:
+                backend.warm_up()
+            except Exception as e:
+                logger.error(f"Failed to warm up {backend.name}: {e}")
+                self.notify("模型錯誤", f"無法載入 {backend.name}", str(e)[:100])
+        threading.Thread(target=warm_up, daemon=True).start()
+
+    def change_conversion_profile(self, sender):
+        """更改簡繁轉換設定檔"""
+        response = rumps.Window(
+            "設定簡繁轉換",
+            "輸入轉換設定檔: s2t（繁體）、s2tw（台灣）、s2hk（香港）或 none（不轉換）:",
+            default_text=self.conversion_stage.profile,
+            ok="確定",
+            cancel="取消"
+        ).run()
+
+        if response.clicked:
+            profile = response.text.strip().lower()
+            if profile not in PROFILES:
+                rumps.alert("錯誤", f"不支援的設定檔: {profile}")
+                return
+            self.engine.post_processor.conversion_stage = ConversionStage(profile)
+            sender.title = f"簡繁轉換: {profile}"
+            logger.info(f"Conversion profile: {profile}")
+
+    def open_user_dictionary(self, _):
+        """用預設編輯器打開自定義詞典（不存在時建立範本）"""
+        path = self.user_dictionary.path
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("# 自定義詞典：每行一條「原詞<TAB>替換詞」或「原詞=替換詞」\n"
+                        "# 保存後下一次轉錄自動生效\n")
+        subprocess.run(["open", "-t", path], check=False)
 
     def toggle_global_hotkey(self, sender):
         """切換全局快捷鍵功能"""
@@ -195,6 +447,7 @@ class SpeechToClipboardApp(rumps.App):
 
         try:
             # 定義快捷鍵組合：Control + Option + A
+            keyboard = pynput.keyboard
             hotkey_combination = keyboard.HotKey(
                 keyboard.HotKey.parse('<ctrl>+<alt>+a'),
                 self.on_hotkey_pressed
@@ -248,127 +501,66 @@ class SpeechToClipboardApp(rumps.App):
             lang = response.text.strip()
             if lang:
                 sender.title = f"語言: {lang}"
-                self.language = lang
+                self.engine.language = lang
             else:
                 sender.title = "語言: 自動偵測"
-                self.language = None
-
-    def get_focused_app_info(self):
-        """獲取當前焦點應用信息"""
-        try:
-            # 使用 NSWorkspace 獲取前台應用
-            frontmost_app = NSWorkspace.sharedWorkspace().frontmostApplication()
-            if frontmost_app:
-                app_name = frontmost_app.localizedName()
-                bundle_id = frontmost_app.bundleIdentifier()
-                return {
-                    'name': app_name,
-                    'bundle_id': bundle_id
-                }
-        except Exception as e:
-            logger.error(f"Failed to get focused app: {e}")
-        return None
-
-    def simulate_command_v(self):
-        """模擬按下 Command+V"""
-        try:
-            # V 鍵的虛擬鍵碼
-            v_keycode = 0x09
-
-            # 創建 Command 按下事件
-            cmd_down = CGEventCreateKeyboardEvent(None, 0x37, True)  # 0x37 是 Command 鍵
-            CGEventSetFlags(cmd_down, kCGEventFlagMaskCommand)
-
-            # 創建 V 按下事件
-            v_down = CGEventCreateKeyboardEvent(None, v_keycode, True)
-            CGEventSetFlags(v_down, kCGEventFlagMaskCommand)
-
-            # 創建 V 釋放事件
-            v_up = CGEventCreateKeyboardEvent(None, v_keycode, False)
-            CGEventSetFlags(v_up, kCGEventFlagMaskCommand)
-
-            # 創建 Command 釋放事件
-            cmd_up = CGEventCreateKeyboardEvent(None, 0x37, False)
-
-            # 發送事件序列
-            CGEventPost(kCGHIDEventTap, cmd_down)
-            time.sleep(0.01)
-            CGEventPost(kCGHIDEventTap, v_down)
-            time.sleep(0.01)
-            CGEventPost(kCGHIDEventTap, v_up)
-            time.sleep(0.01)
-            CGEventPost(kCGHIDEventTap, cmd_up)
-
-            logger.info("Simulated Command+V")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to simulate key press: {e}")
-            return False
-
-    def auto_paste_to_focused_app(self, text):
-        """自動粘貼文字到焦點應用"""
-        if not self.auto_paste_enabled:
-            logger.info("Auto-paste disabled")
-            return False
-
-        # 檢查權限
-        if not AXIsProcessTrustedWithOptions(None):
-            logger.warning("No accessibility permission, cannot auto-paste")
-            return False
-
-        try:
-            # 獲取當前焦點應用
-            app_info = self.get_focused_app_info()
-            if app_info:
-                app_name = app_info['name']
-                logger.info(f"Target app: {app_name}")
-
-                # 先確保文字在剪貼板中
-                pyperclip.copy(text)
-                time.sleep(0.1)  # 等待剪貼板更新
-
-                # 模擬 Command+V
-                if self.simulate_command_v():
-                    logger.info(f"Auto-pasted to {app_name}")
-                    return True
-            else:
-                logger.warning("Cannot get focused app")
-                return False
-
-        except Exception as e:
-            logger.error(f"Auto-paste failed: {e}")
-            return False
+                self.engine.language = None
 
     def update_recent_results_menu(self):
-        """更新最近結果菜單"""
-        if not self.recent_results:
-            self.menu["最近結果"] = [
-                rumps.MenuItem("(無記錄)", callback=None)
-            ]
-        else:
-            recent_menu = []
-            for i, text in enumerate(self.recent_results[-5:]):  # 最多顯示 5 條
-                # 截取前 50 個字符
-                display_text = text[:50] + "..." if len(text) > 50 else text
-                menu_item = rumps.MenuItem(
-                    display_text,
-                    callback=lambda sender, t=text: self.copy_to_clipboard(t)
-                )
-                recent_menu.append(menu_item)
-            self.menu["最近結果"] = recent_menu
+        """提交最近結果（任何線程皆可呼叫，由主線程套用）"""
+        entries = self.history.recent(RECENT_RESULTS_COUNT)
+        self.ui.set("recent_results", tuple(entry.text for entry in entries))
+
+    def _apply_recent_results(self, texts):
+        """最新的結果在最上面；每個新結果只改一個菜單項：重用最下面（最舊）的菜單項並移到頂部（在主線程中呼叫）"""
+        submenu = self.menu["最近結果"]
+        added = prepended_count(self._recent_texts, texts)
+        # 記錄只會增加，從最舊的新結果開始逐個放到頂部
+        for text in reversed(texts[:added]):
+            if len(self._recent_items) < len(texts):
+                # rumps 以標題作為鍵，先用唯一的標題加入，再改成結果文字
+                item = rumps.MenuItem(f"recent-{len(self._recent_items)}")
+                submenu.add(item)
+            else:
+                item = self._recent_items.pop()
+            # rumps 沒有移動菜單項的介面，直接在 NSMenu 中移到頂部
+            submenu._menu.removeItem_(item._menuitem)
+            submenu._menu.insertItem_atIndex_(item._menuitem, 0)
+            self._recent_items.insert(0, item)
+            # 截取前 50 個字符
+            item.title = text[:50] + "..." if len(text) > 50 else text
+            item.set_callback(self._copy_recent_result)
+        self._recent_texts = list(texts)
+
+    def _copy_recent_result(self, sender):
+        self.copy_to_clipboard(self._recent_texts[self._recent_items.index(sender)])
+
+    def search_history(self, _):
+        """全文搜尋轉錄記錄，可複製第一個結果"""
+        response = rumps.Window(
+            message="輸入要搜尋的文字",
+            title="搜尋記錄",
+            default_text="",
+            ok="搜尋",
+            cancel="取消",
+            dimensions=(300, 24)
+        ).run()
+        if not response.clicked or not response.text.strip():
+            return
+        entries = self.history.search(response.text, limit=10)
+        if not entries:
+            rumps.alert("搜尋記錄", f"找不到「{response.text.strip()}」")
+            return
+        lines = []
+        for entry in entries:
+            when = time.strftime("%m-%d %H:%M", time.localtime(entry.created_at))
+            text = entry.text[:60] + "..." if len(entry.text) > 60 else entry.text
+            lines.append(f"{when}  {text}")
+        if rumps.alert("搜尋記錄", "\n".join(lines), ok="複製第一個", cancel="關閉") == 1:
+            self.copy_to_clipboard(entries[0].text)
 
     def toggle_recording(self, sender):
-        """切換錄音狀態"""
-        # 如果正在處理音頻，忽略請求
-        if self.processing:
-            logger.warning("Still processing previous recording, please wait...")
-            rumps.notification(
-                "請稍候",
-                "正在處理上一段錄音",
-                "請等待處理完成後再開始新錄音"
-            )
-            return
-        
+        """切換錄音狀態（上一段錄音仍在處理時也可以開始新錄音）"""
         if not self.recording:
             self.start_recording()
         else:
@@ -376,241 +568,142 @@ class SpeechToClipboardApp(rumps.App):
 
     def start_recording(self):
         """開始錄音"""
-        if self.recording_thread and self.recording_thread.is_alive():
-            logger.warning("Previous recording thread still running, waiting for it to finish...")
-            self.recording_thread.join(timeout=1.0)
-            if self.recording_thread.is_alive():
-                logger.error("Previous recording thread did not finish in time")
-        
-        self.recording = True
-        
-        # 清空之前的音頻數據和隊列
-        with self.audio_lock:
-            self.audio_data = []
-        
-        # 清空 audio_queue 中的殘留數據
-        while not self.audio_queue.empty():
-            try:
-                self.audio_queue.get_nowait()
-            except queue.Empty:
-                break
-        
-        self.title = "🔴"  # 改變狀態列圖示為紅點
-        self.menu["開始錄音 (⌃⌥A)"].title = "停止錄音 (⌃⌥A)"
-        self.menu["錄音中..."].state = True
-
-        logger.info("Recording started...")
-
-        self.recording_thread = threading.Thread(target=self._record_audio, daemon=True)
-        self.recording_thread.start()
-
-    def _record_audio(self):
-        """錄音線程"""
-        def audio_callback(indata, frames, time, status):
-            if status:
-                logger.warning(f"Recording status: {status}")
-            # 只有在錄音狀態時才將數據放入隊列
-            if self.recording:
-                try:
-                    self.audio_queue.put_nowait(indata.copy())
-                except queue.Full:
-                    logger.warning("Audio queue full, dropping audio chunk")
-
         try:
-            with sd.InputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                callback=audio_callback,
-                dtype=np.int16,
-                blocksize=1024
-            ):
-                while self.recording:
-                    try:
-                        data = self.audio_queue.get(timeout=0.1)
-                        with self.audio_lock:
-                            self.audio_data.append(data)
-                    except queue.Empty:
-                        if not self.recording:
-                            break
-                        continue
-                
-                end_time = time.time() + 1.0
-                while time.time() < end_time:
-                    try:
-                        data = self.audio_queue.get(timeout=0.1)
-                        with self.audio_lock:
-                            self.audio_data.append(data)
-                    except queue.Empty:
-                        if self.audio_queue.empty():
-                            break
-                        continue
-                    
-            remaining_count = 0
-            while not self.audio_queue.empty():
-                try:
-                    data = self.audio_queue.get_nowait()
-                    with self.audio_lock:
-                        self.audio_data.append(data)
-                    remaining_count += 1
-                except queue.Empty:
-                    break
-            
-            if remaining_count > 0:
-                logger.info(f"Processed {remaining_count} remaining audio chunks after stream closed")
-                    
-            with self.audio_lock:
-                total_chunks = len(self.audio_data)
-            logger.info(f"Recording thread ended, collected {total_chunks} audio chunks")
-            
+            self.engine.start_recording()
         except Exception as e:
             logger.error(f"Recording error: {e}", exc_info=True)
-            rumps.notification(
+            self.notify(
                 "錄音錯誤",
                 "無法訪問麥克風",
                 str(e)
             )
+            return
+
+        self.recording = True
+
+        self._update_status_icon()  # 狀態列圖示改為紅點
+        self.ui.set("record_item", "停止錄音 (⌃⌥A)")
+        self.ui.set("recording_indicator", True)
 
     def stop_recording(self):
-        """停止錄音並轉換為文字"""
+        """停止錄音並把錄音排入工作隊列"""
         self.recording = False
-        self.processing = True  # 標記開始處理
-        self.title = "🔄"  # 立即顯示處理中圖標
-        self.menu["開始錄音 (⌃⌥A)"].title = "處理中..."
-        self.menu["錄音中..."].state = False
+        self.ui.set("record_item", "開始錄音 (⌃⌥A)")
+        self.ui.set("recording_indicator", False)
 
-        logger.info("Recording stopped, waiting for audio thread to finish...")
+        # 請求停止輸入流後立即返回；最後一個區塊落地由工作線程等待
+        session = self.engine.stop_recording()
 
-        if self.recording_thread and self.recording_thread.is_alive():
-            self.recording_thread.join(timeout=2.0)
-            if self.recording_thread.is_alive():
-                logger.warning("Recording thread did not finish in time, proceeding anyway")
+        # 工作線程轉錄、後處理並按錄音順序複製／粘貼；每次錄音都有獨立的緩衝區
+        future = self.engine.submit_recording(session)
+        self._update_status_icon()  # 處理中圖標
+        future.add_done_callback(self._on_job_done)
+
+    def _on_recording_limit(self):
+        """錄音到達長度上限（在音頻線程中呼叫，收尾交給其他線程）"""
+        def stop():
+            if self.recording:
+                self.stop_recording()
+                self.notify("語音轉文字", "錄音已達長度上限",
+                            f"已自動停止（上限 {MAX_RECORDING_SECONDS // 60} 分鐘）並開始轉錄")
+
+        threading.Thread(target=stop, daemon=True).start()
+
+    def notify(self, title, subtitle, message):
+        """顯示通知（任何線程皆可呼叫，由主線程顯示）"""
+        self.ui.post("notification", (title, subtitle, message))
+
+    def _update_status_icon(self):
+        """錄音中 🔴，仍有錄音在處理 🔄，否則 🎤（任何線程皆可呼叫）"""
+        # 讀取狀態和提交圖示在同一個鎖內，較晚提交的一定反映較新的狀態
+        with self._status_lock:
+            if self.recording:
+                icon = "🔴"
+            elif self.engine.pending:
+                icon = "🔄"
             else:
-                logger.info("Recording thread finished successfully")
-        
-        time.sleep(0.1)
-
-        with self.audio_lock:
-            audio_data_copy = list(self.audio_data)
-        
-        logger.info(f"Collected {len(audio_data_copy)} audio chunks, starting transcription...")
-
-        if not audio_data_copy:
-            self.title = "🎤"  # 恢復狀態列圖示
-            self.processing = False
-            self.menu["開始錄音 (⌃⌥A)"].title = "開始錄音 (⌃⌥A)"
-            rumps.notification(
-                "語音轉文字",
-                "未錄到音頻",
-                "請確保麥克風已開啟"
-            )
-            return
+                icon = "🎤"
+            self.ui.set("icon", icon)
 
-        # 在新線程中處理音頻，傳入複製的數據
-        threading.Thread(target=self._process_audio, args=(audio_data_copy,), daemon=True).start()
+    def _on_job_done(self, future):
+        """一段錄音處理完成（在工作線程中呼叫）
 
-    def _process_audio(self, audio_data_copy):
-        """處理音頻並轉換為文字
-        
         Args:
-            audio_data_copy: 音頻數據的副本，避免競爭條件
+            future: engine.submit_recording 回傳的 Future
         """
-        temp_path = None
         try:
-            logger.info(f"Processing {len(audio_data_copy)} audio chunks...")
-            
-            # 合併音頻數據
-            if not audio_data_copy:
-                raise ValueError("No audio data to process")
-            
-            audio_array = np.concatenate(audio_data_copy, axis=0)
-            logger.info(f"Audio array shape: {audio_array.shape}, duration: {len(audio_array)/self.sample_rate:.2f}s")
-
-            # 保存為臨時 WAV 文件
-            with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
-                temp_path = temp_file.name
-                wavfile.write(temp_path, self.sample_rate, audio_array)
-
-            logger.info(f"Audio saved to: {temp_path}")
-
-            # 使用 OpenAI Whisper API 轉換
-            logger.info("Calling OpenAI Whisper API...")
-            with open(temp_path, 'rb') as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model="gpt-4o-mini-transcribe",
-                    file=audio_file,
-                    language=getattr(self, 'language', None)  # 可選語言參數
-                )
-
-            text = transcript.text
-            logger.info(f"Transcription result (original): {text}")
-            
-            # 將簡體中文轉換為繁體中文
-            text = self.cc.convert(text)
-            # 將不常用的繁體字改成常用的
-            text = apply_manual_mappings(text, MANUAL_MAPPINGS)
-            logger.info(f"Transcription result (traditional): {text}")
+            result = future.result()
+            text = result.text
 
-            # 恢復圖示和狀態
-            self.title = "🎤"
-            self.menu["開始錄音 (⌃⌥A)"].title = "開始錄音 (⌃⌥A)"
-
-            # 複製到剪貼板
-            self.copy_to_clipboard(text)
-
-            # 添加到最近結果
-            self.recent_results.append(text)
+            # 保存記錄並更新最近結果
+            self.history.add_result(result)
             self.update_recent_results_menu()
 
-            # 自動粘貼到焦點應用
-            pasted = False
-            if self.auto_paste_enabled:
-                pasted = self.auto_paste_to_focused_app(text)
-
             # 顯示通知
-            if pasted:
-                app_info = self.get_focused_app_info()
-                app_name = app_info['name'] if app_info else "應用"
-                rumps.notification(
+            delivery = result.delivery
+            if delivery.pasted:
+                self.notify(
                     "語音轉文字完成",
-                    f"已自動粘貼到 {app_name}",
+                    f"已自動粘貼到 {delivery.target}",
                     text[:100] + "..." if len(text) > 100 else text
                 )
             else:
-                rumps.notification(
+                self.notify(
                     "語音轉文字完成",
-                    "已複製到剪貼板" if not self.auto_paste_enabled else "已複製到剪貼板（粘貼失敗）",
+                    "已複製到剪貼板" if not self.paste_sink.auto_paste_enabled else "已複製到剪貼板（粘貼失敗）",
                     text[:100] + "..." if len(text) > 100 else text
                 )
 
+        except NoAudioError:
+            self.notify(
+                "語音轉文字",
+                "未錄到音頻",
+                "請確保麥克風已開啟"
+            )
         except Exception as e:
             logger.error(f"Audio processing error: {e}", exc_info=True)
-            # 恢復圖示和狀態
-            self.title = "🎤"
-            self.menu["開始錄音 (⌃⌥A)"].title = "開始錄音 (⌃⌥A)"
-            rumps.notification(
+            self.notify(
                 "轉換錯誤",
-                "無法轉換語音為文字",
+                "無法轉換語音為文字（錄音已保存，下次啟動時重試）",
                 str(e)[:100]
             )
         finally:
-            # 確保 processing 標誌被重置
-            self.processing = False
-            logger.info("Processing completed, ready for next recording")
-            
-            # 清理臨時文件
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except Exception as e:
-                    logger.warning(f"Failed to delete temp file: {e}")
+            # 恢復圖示（其他錄音仍在處理時保持 🔄）
+            self._update_status_icon()
+            logger.info(f"Processing completed, {self.engine.pending} recordings pending")
 
     def copy_to_clipboard(self, text):
         """複製文字到剪貼板"""
-        try:
-            pyperclip.copy(text)
-            logger.info("Copied to clipboard")
-        except Exception as e:
-            logger.error(f"Failed to copy to clipboard: {e}")
+        self.paste_sink.copy(text)
+
+    def show_latency_stats(self, _):
+        """顯示各階段延遲的 p50/p95/p99"""
+        response = rumps.alert(
+            "延遲統計",
+            self.engine.metrics.format_summary()
+            + f"\n\n{self.engine.request_policy.format_stats()}"
+            + f"\n\n每段錄音的明細: {LATENCY_LOG_PATH}",
+            ok="關閉",
+            cancel="清除統計"
+        )
+        if response == 0:
+            self.engine.metrics.reset()
+
+    def show_capture_health(self, _):
+        """顯示音頻擷取的溢出、丟失區塊、回調抖動和目前的區塊設定"""
+        recorder = self.engine.recorder
+        latency = recorder.latency
+        latency_text = f"{latency * 1000:.0f} ms" if isinstance(latency, (int, float)) else "默認"
+        response = rumps.alert(
+            "音頻擷取狀態",
+            recorder.health.format_stats()
+            + f"\n\n區塊 {recorder.blocksize} 幀（{recorder.blocksize / recorder.sample_rate * 1000:.0f} ms），"
+            + f"輸入延遲 {latency_text}",
+            ok="關閉",
+            cancel="清除統計"
+        )
+        if response == 0:
+            recorder.health.reset()
 
     @rumps.clicked("關於")
     def about(self, _):
@@ -633,6 +726,12 @@ class SpeechToClipboardApp(rumps.App):
         """退出應用"""
         # 停止全局快捷鍵監聽器
         self.stop_global_hotkey_listener()
+        if self.preroll_enabled:
+            self.engine.set_preroll(0)
+        if self.capture_log_path is not None:
+            self.engine.set_capture_log(None)
+        self._ui_timer.stop()
+        self.history.close()
         logger.info("Application quitting...")
         rumps.quit_application()
 
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+音頻編碼測試腳本
+Test script for in-memory upload encoding
+
+檢查 WAV/FLAC/Opus 編碼後解碼回來的樣本和採樣率，以及 soundfile 或編碼器
+不可用時退回 WAV。
+"""
+
+import io
+import sys
+
+import numpy as np
+from scipy.io import wavfile
+
+from audio_encoding import encode_audio
+from transcription_backends import OpenAIBackend
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds=1.0, frequency=440):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * frequency * t) * 8000).astype(np.int16).reshape(-1, 1)
+
+
+def test_lossless_roundtrip():
+    """測試 WAV 和 FLAC 解碼後與原始樣本完全相同"""
+    print("\n測試無損編碼...")
+    import soundfile
+    audio = tone()
+    wav = encode_audio(audio, SAMPLE_RATE, "wav")
+    sample_rate, decoded = wavfile.read(io.BytesIO(wav.data))
+    assert sample_rate == SAMPLE_RATE and np.array_equal(decoded, audio[:, 0])
+    assert wav.as_upload()[0] == "audio.wav" and wav.raw_bytes == audio.nbytes
+
+    flac = encode_audio(audio, SAMPLE_RATE, "flac")
+    decoded, sample_rate = soundfile.read(io.BytesIO(flac.data), dtype="int16", always_2d=True)
+    assert sample_rate == SAMPLE_RATE and np.array_equal(decoded, audio)
+    assert flac.as_upload()[2] == "audio/flac" and flac.size < wav.size
+    print(f"✅ {wav}；{flac}")
+
+
+def test_opus_roundtrip():
+    """測試 Opus 解碼後採樣率和長度一致，波形高度相關"""
+    print("\n測試 Opus 編碼...")
+    import soundfile
+    audio = tone()
+    ogg = encode_audio(audio, SAMPLE_RATE, "ogg")
+    decoded, sample_rate = soundfile.read(io.BytesIO(ogg.data), dtype="int16")
+    assert sample_rate == SAMPLE_RATE and abs(len(decoded) - len(audio)) < SAMPLE_RATE // 100
+    n = min(len(decoded), len(audio))
+    correlation = np.corrcoef(decoded[:n].astype(float), audio[:n, 0].astype(float))[0, 1]
+    assert correlation > 0.95, correlation
+    assert ogg.size < encode_audio(audio, SAMPLE_RATE, "flac").size
+    print(f"✅ {ogg}，相關係數 {correlation:.3f}")
+
+
+def test_unsupported_format():
+    """測試不支援的格式拋出 ValueError"""
+    print("\n測試不支援的格式...")
+    try:
+        encode_audio(tone(), SAMPLE_RATE, "mp3")
+    except ValueError:
+        print("✅ mp3 被拒絕")
+    else:
+        raise AssertionError("不支援的格式應拋出 ValueError")
+
+
+class NoOpusSoundfile:
+    """沒有 Opus 編碼器的舊版 libsndfile"""
+
+    __libsndfile_version__ = "1.0.28"
+
+    @staticmethod
+    def available_subtypes(format):
+        return {"PCM_16": "Signed 16 bit PCM"}
+
+
+def test_fallback_to_wav():
+    """測試 soundfile 未安裝或編碼器不可用時 encode_audio 拋出 ImportError，後端退回 WAV"""
+    print("\n測試退回 WAV...")
+    backend = OpenAIBackend(client=None, upload_format="ogg")
+    saved = sys.modules.get("soundfile")
+    try:
+        for fake in (None, NoOpusSoundfile):
+            # sys.modules 中為 None 時 import 拋出 ImportError
+            sys.modules["soundfile"] = fake
+            try:
+                encode_audio(tone(), SAMPLE_RATE, "ogg")
+            except ImportError as e:
+                print(f"  {e}")
+            else:
+                raise AssertionError("應拋出 ImportError")
+            encoded = backend.encode(tone(), SAMPLE_RATE)
+            assert encoded.format == "wav", encoded.format
+    finally:
+        if saved is None:
+            sys.modules.pop("soundfile", None)
+        else:
+            sys.modules["soundfile"] = saved
+    assert encode_audio(tone(), SAMPLE_RATE, "ogg").format == "ogg"
+    print("✅ 兩種情況都退回 WAV")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("音頻編碼測試")
+    print("Audio Encoding Test")
+    print("=" * 60)
+
+    tests = [
+        ("無損編碼", test_lossless_roundtrip),
+        ("Opus 編碼", test_opus_roundtrip),
+        ("不支援的格式", test_unsupported_format),
+        ("退回 WAV", test_fallback_to_wav),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+靜音修剪測試腳本
+Test script for silence trimming / VAD
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from audio_vad import VADConfig, trim_silence
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds, freq=300, amplitude=5000):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * freq * t) * amplitude).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+def test_trim_leading_trailing_and_pauses():
+    """測試首尾靜音與長停頓修剪"""
+    print("\n測試靜音修剪...")
+    config = VADConfig(pad_ms=100, max_pause_ms=400)
+    audio = np.concatenate([silence(1.0), tone(1.0), silence(3.0), tone(1.0), silence(1.0)])
+    trimmed, report = trim_silence(audio.reshape(-1, 1), SAMPLE_RATE, config)
+
+    assert trimmed.shape[1] == 1
+    assert report.kept_samples == len(trimmed)
+    assert report.leading > 0.8 * SAMPLE_RATE
+    assert report.trailing > 0.8 * SAMPLE_RATE
+    assert report.internal > 2.0 * SAMPLE_RATE
+    # 兩段語音 (2.0s) + 前後緩衝 (4 × 0.1s) + 壓縮後的停頓 (0.4s)
+    assert len(trimmed) <= 2.85 * SAMPLE_RATE, f"保留 {len(trimmed)} 樣本"
+    print(f"✅ {report}")
+
+
+def test_fricative_kept():
+    """測試低能量高過零率的清音不被當作靜音"""
+    print("\n測試清音保留...")
+    rng = np.random.default_rng(0)
+    noise = (rng.standard_normal(SAMPLE_RATE // 2) * 150).astype(np.int16)
+    audio = np.concatenate([silence(1.0), noise, tone(0.5), silence(1.0)])
+    trimmed, report = trim_silence(audio, SAMPLE_RATE, VADConfig(pad_ms=0))
+    assert report.leading <= 1.0 * SAMPLE_RATE + 320
+    assert len(trimmed) >= 0.95 * SAMPLE_RATE
+    print(f"✅ {report}")
+
+
+def test_no_speech_keeps_audio():
+    """測試未偵測到語音時保留原始音頻"""
+    print("\n測試無語音...")
+    audio = silence(2.0)
+    trimmed, report = trim_silence(audio, SAMPLE_RATE)
+    assert not report.speech_detected
+    assert len(trimmed) == len(audio)
+    print(f"✅ {report}")
+
+
+def test_vectorized_speed():
+    """測試 90 秒錄音的修剪耗時"""
+    print("\n測試修剪速度...")
+    audio = np.tile(np.concatenate([tone(2.0), silence(1.0)]), 30)
+    start = time.perf_counter()
+    trim_silence(audio, SAMPLE_RATE)
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.5, f"修剪耗時 {elapsed:.3f}s"
+    print(f"✅ 90 秒音頻修剪耗時 {elapsed * 1000:.1f} ms")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("靜音修剪測試")
+    print("Silence Trimming Test")
+    print("=" * 60)
+
+    tests = [
+        ("靜音修剪", test_trim_leading_trailing_and_pauses),
+        ("清音保留", test_fricative_kept),
+        ("無語音", test_no_speech_keeps_audio),
+        ("修剪速度", test_vectorized_speed),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+批次轉錄測試腳本
+Test script for the batch transcription CLI
+
+使用本地模擬轉錄服務，不需要麥克風或 API 金鑰。
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+from openai import OpenAI
+from scipy.io import wavfile
+
+from batch_transcribe import BatchTranscriber, Manifest, main
+from mock_transcription_server import MockHTTPError, MockTranscriptionServer, decode_audio
+from transcription_engine import NullSink, TranscriptionEngine
+
+SAMPLE_RATE = 16000
+
+
+def write_fixtures(directory, count):
+    """寫入 count 個 WAV 文件，長度 (i + 1) × 0.5 秒，放在子目錄中測試遞迴搜尋"""
+    os.makedirs(os.path.join(directory, "sub"))
+    for i in range(count):
+        t = np.arange(int((i + 1) * 0.5 * SAMPLE_RATE)) / SAMPLE_RATE
+        audio = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+        folder = directory if i % 2 else os.path.join(directory, "sub")
+        wavfile.write(os.path.join(folder, f"clip{i}.wav"), SAMPLE_RATE, audio)
+
+
+def length_responder(audio_bytes, fields):
+    sample_rate, audio = decode_audio(audio_bytes)
+    return f"{len(audio) / sample_rate:.1f}秒"
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_concurrent_batch():
+    """測試並行處理：總時間接近 文件數 × 延遲 / 工作線程數"""
+    print("\n測試並行批次轉錄...")
+    count, latency, workers = 12, 0.3, 4
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(latency=latency, responder=length_responder) as server:
+        write_fixtures(os.path.join(tmp, "audio"), count)
+        output = os.path.join(tmp, "results.jsonl")
+        start = time.perf_counter()
+        status = main([os.path.join(tmp, "audio"), "-o", output, "--workers", str(workers),
+                       "--base-url", server.base_url, "--no-vad"])
+        elapsed = time.perf_counter() - start
+        records = read_jsonl(output)
+
+    assert status == 0
+    assert len(records) == count
+    assert all(r["status"] == "ok" for r in records)
+    assert {r["text"] for r in records} == {f"{(i + 1) * 0.5:.1f}秒" for i in range(count)}
+    serial = count * latency
+    assert elapsed < serial * 0.75, f"{elapsed:.2f}s，未比串行 ({serial:.1f}s) 快"
+    print(f"✅ {count} 個文件 {elapsed:.2f}s（串行約 {serial:.1f}s）")
+
+
+def test_rate_limit_backoff():
+    """測試 429 時按 Retry-After 退避並重試成功"""
+    print("\n測試速率限制退避...")
+    failures = {"left": 2}
+    lock = threading.Lock()
+
+    def flaky_responder(audio_bytes, fields):
+        with lock:
+            if failures["left"]:
+                failures["left"] -= 1
+                raise MockHTTPError(429, "Rate limit reached", retry_after=0.2)
+        return "好"
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(responder=flaky_responder) as server:
+        write_fixtures(os.path.join(tmp, "audio"), 2)
+        output = os.path.join(tmp, "results.jsonl")
+        status = main([os.path.join(tmp, "audio"), "-o", output, "--workers", "1",
+                       "--base-url", server.base_url])
+        records = read_jsonl(output)
+
+    assert status == 0
+    assert [r["status"] for r in records] == ["ok", "ok"]
+    assert sum(r["attempts"] for r in records) == 4
+    print(f"✅ 重試次數: {[r['attempts'] for r in records]}")
+
+
+def test_resume_from_manifest():
+    """測試中斷後重新執行只處理未完成的文件"""
+    print("\n測試清單續傳...")
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(responder=length_responder) as server:
+        audio_dir = os.path.join(tmp, "audio")
+        write_fixtures(audio_dir, 4)
+        output = os.path.join(tmp, "results.jsonl")
+        args = ["-o", output, "--base-url", server.base_url]
+
+        # 第一次只處理其中三個文件，模擬中斷
+        first = sorted(os.listdir(audio_dir))[:1] + ["sub"]
+        main([os.path.join(audio_dir, name) for name in first] + args)
+        requests_before = server.request_count
+
+        main([audio_dir] + args)
+        records = read_jsonl(output)
+
+    assert requests_before == 3
+    assert server.request_count == 4, f"預期只多 1 個請求，實際共 {server.request_count}"
+    assert len({r["path"] for r in records}) == 4
+    print(f"✅ 第二次只處理了 {server.request_count - requests_before} 個文件")
+
+
+def test_bounded_requests_and_missing_files():
+    """測試長文件的區塊和其他文件合計的並行請求數不超過工作線程數；消失的文件記錄為錯誤"""
+    print("\n測試並行上限...")
+    active = [0, 0]  # 進行中、最高並行
+    lock = threading.Lock()
+
+    def counting_responder(audio_bytes, fields):
+        with lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with lock:
+            active[0] -= 1
+        return "好"
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(responder=counting_responder) as server:
+        write_fixtures(os.path.join(tmp, "audio"), 4)
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(os.path.join(tmp, "audio"))
+                       for name in names)
+        missing = os.path.join(tmp, "audio", "deleted.wav")
+        engine = TranscriptionEngine(client=OpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+                                     sink=NullSink())
+        engine.vad_enabled = False
+        engine.max_chunk_seconds = 0.5  # 每個文件切成多個區塊並行轉錄
+        output_path = os.path.join(tmp, "results.jsonl")
+        manifest = Manifest(output_path + ".manifest")
+        try:
+            with open(output_path, "a", encoding="utf-8") as output:
+                batch = BatchTranscriber(engine, output, manifest, workers=2)
+                batch.run([missing] + files)
+        finally:
+            manifest.close()
+        records = read_jsonl(output_path)
+
+    assert batch.succeeded == 4 and batch.failed == 1, (batch.succeeded, batch.failed)
+    error = next(r for r in records if r["path"] == missing)
+    assert error["status"] == "error" and error["error"].startswith("FileNotFoundError"), error
+    assert server.request_count > 4, "長文件應切成區塊"
+    assert active[1] <= 2, f"最多 2 個並行請求，實際 {active[1]}"
+    print(f"✅ {server.request_count} 個請求，最高並行 {active[1]}；消失的文件: {error['error'][:40]}")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("批次轉錄測試")
+    print("Batch Transcription Test")
+    print("=" * 60)
+
+    tests = [
+        ("並行批次轉錄", test_concurrent_batch),
+        ("速率限制退避", test_rate_limit_backoff),
+        ("清單續傳", test_resume_from_manifest),
+        ("並行上限", test_bounded_requests_and_missing_files),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+音頻擷取記錄與重放測試腳本
+Test script for the raw capture log and replay driver
+
+以 audio_simulation.SimulatedAudio 錄製擷取記錄，再用 ReplayAudio 重放，
+不需要麥克風、PortAudio 或 API 金鑰。
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from audio_simulation import CallbackFlags, SimulatedAudio
+from capture_log import CaptureLog, CaptureLogWriter, ReplayAudio
+from mock_transcription_server import MockTranscriptionServer
+from recorder import AudioRecorder
+from replay_capture import replay
+from test_recorder import SAMPLE_RATE, ramp
+
+
+def record_log(path, recordings):
+    """以模擬輸入錄製幾段錄音並寫入擷取記錄（第一個區塊帶溢出旗標）
+
+    Returns:
+        每段錄音的音頻
+    """
+    audio_api = SimulatedAudio(ramp(0.5), speed=0)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api)
+    recorder.capture_log = CaptureLogWriter(path, SAMPLE_RATE, 1)
+    recorded = []
+    for seconds in recordings:
+        audio_api.source = ramp(seconds)
+        audio_api.pending_status = CallbackFlags(input_overflow=True)
+        recorder.start()
+        audio_api.source_consumed.wait(5)
+        recorded.append(np.array(recorder.stop()))
+    recorder.capture_log.close()
+    return recorded
+
+
+def test_log_roundtrip():
+    """測試寫入和讀回：每個輸入流一段，區塊內容、時間戳和旗標保留，截斷的尾部被忽略"""
+    print("\n測試擷取記錄讀寫...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.cap")
+        recorded = record_log(path, [0.5, 1.0])
+        log = CaptureLog(path)
+        assert (log.sample_rate, log.channels) == (SAMPLE_RATE, 1)
+        assert len(log.streams) == 2 and log.blocksizes == [1024, 1024]
+        for index, audio in enumerate(recorded):
+            assert np.array_equal(log.stream_audio(index), audio), f"第 {index + 1} 段內容不一致"
+            flags = [record.flags for record in log.streams[index]]
+            assert flags[0] == 1 and not any(flags[1:]), flags
+            arrivals = [record.arrival for record in log.streams[index]]
+            assert arrivals == sorted(arrivals) and log.streams[index][0].current_time > 0
+
+        # 模擬寫到一半崩潰：最後一條記錄不完整
+        size = os.path.getsize(path)
+        with open(path, "r+b") as f:
+            f.truncate(size - 100)
+        truncated = CaptureLog(path)
+        assert truncated.blocks == log.blocks - 1
+    print(f"✅ {log.blocks} 個區塊，{log.duration:.2f}s，文件 {size / 1024:.0f} KB")
+
+
+def test_replay_through_recorder():
+    """測試重放：錄音器得到相同的音頻和溢出計數，加速重放不改變結果"""
+    print("\n測試重放到錄音器...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.cap")
+        recorded = record_log(path, [0.5, 1.0])
+        for speed in (0, 20):
+            audio_api = ReplayAudio(path, speed=speed)
+            recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api)
+            for audio in recorded:
+                recorder.start()
+                audio_api.source_consumed.wait(5)
+                replayed = recorder.stop()
+                assert np.array_equal(replayed[:len(audio)], audio), f"速度 {speed} 重放內容不一致"
+                assert not replayed[len(audio):].any(), "記錄之後應為靜音"
+            assert audio_api.remaining == 0
+            assert recorder.health.overflows == 2 and recorder.health.dropped_blocks == 0
+    print("✅ 重放內容和溢出旗標與記錄一致")
+
+
+def test_replay_driver():
+    """測試重放驅動：每個輸入流一段錄音走完整條流程"""
+    print("\n測試重放驅動...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "session.cap")
+        record_log(path, [0.5, 1.0, 0.5])
+        with MockTranscriptionServer(responder=lambda audio_bytes, fields: "重放", latency=0) as server:
+            recordings, engine = replay(CaptureLog(path), server, speed=0)
+    assert [r["error"] for r in recordings] == [None] * 3, recordings
+    assert [r["overflows"] for r in recordings] == [1, 1, 1]
+    assert engine.metrics.summary()["total"]["count"] == 3
+    print(f"✅ {len(recordings)} 段錄音，total p50 {engine.metrics.summary()['total']['p50']:.1f} ms")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("音頻擷取記錄與重放測試")
+    print("Capture Log Replay Test")
+    print("=" * 60)
+
+    tests = [
+        ("擷取記錄讀寫", test_log_roundtrip),
+        ("重放到錄音器", test_replay_through_recorder),
+        ("重放驅動", test_replay_driver),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
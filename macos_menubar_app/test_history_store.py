@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+轉錄記錄測試腳本
+Test script for the SQLite transcription history
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+from openai import OpenAI
+
+from history_store import HistoryStore
+from mock_transcription_server import MockTranscriptionServer
+from transcription_engine import CollectingSink, TranscriptionEngine
+
+
+def test_bounded_recent_and_persistence():
+    """測試記憶體只保留最近記錄，重新打開後記錄仍在"""
+    print("\n測試最近記錄與持久化...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "history.sqlite3")
+        store = HistoryStore(path, recent_limit=10)
+        for i in range(100):
+            store.add(f"第 {i} 段", duration=1.0, target_app="Notes", latency=0.25)
+        assert len(store._recent) == 10, "記憶體中的記錄應有上限"
+        assert [e.text for e in store.recent(3)] == ["第 99 段", "第 98 段", "第 97 段"]
+        first_id = store.search("第 0 段")[0].id
+        store.close()
+
+        store = HistoryStore(path, recent_limit=10)
+        assert len(store) == 100
+        assert store.recent(1)[0].text == "第 99 段"
+        entry = store.get(first_id)
+        assert entry.text == "第 0 段" and entry.target_app == "Notes" and entry.latency_ms == 250.0
+        mode = store._conn.execute("PRAGMA journal_mode").fetchone()[0]
+        store.close()
+    assert mode == "wal"
+    print(f"✅ 100 條記錄，記憶體保留 10 條，日誌模式 {mode}")
+
+
+def test_search():
+    """測試全文搜尋（中文、英文、短查詢和特殊字元）"""
+    print("\n測試全文搜尋...")
+    store = HistoryStore(":memory:")
+    store.add("明天下午三點開會討論預算")
+    store.add("Please review the quarterly budget")
+    store.add("今天天氣很好")
+    store.add('100% "done"')
+
+    assert [e.text for e in store.search("討論預算")] == ["明天下午三點開會討論預算"]
+    assert [e.text for e in store.search("budget")] == ["Please review the quarterly budget"]
+    # 少於三個字：trigram 無法索引，改用 LIKE
+    assert [e.text for e in store.search("天氣")] == ["今天天氣很好"]
+    assert [e.text for e in store.search('% "d')] == ['100% "done"']
+    assert store.search("不存在的內容") == []
+    plan = store._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM transcripts_fts WHERE transcripts_fts MATCH '\"預算\"'"
+    ).fetchall()
+    assert any("VIRTUAL TABLE" in row[-1] for row in plan)
+    store.close()
+    print(f"✅ 搜尋使用 FTS5（{store.fts_tokenizer}）索引")
+
+
+def test_engine_result():
+    """測試保存引擎結果（含延遲）"""
+    print("\n測試保存轉錄結果...")
+    audio = (np.sin(np.arange(16000) / 4) * 8000).astype(np.int16)
+    with MockTranscriptionServer(responder=lambda audio_bytes, fields: "記錄測試") as server:
+        engine = TranscriptionEngine(client=OpenAI(api_key="test", base_url=server.base_url),
+                                     sink=CollectingSink())
+        result = engine.transcribe_audio(audio)
+    store = HistoryStore(":memory:")
+    entry = store.add_result(result)
+    assert entry.text == "記錄測試" and entry.latency_ms > 0
+    assert abs(entry.duration - 1.0) < 1e-6
+    store.close()
+    print(f"✅ 已保存，延遲 {entry.latency_ms} ms")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("轉錄記錄測試")
+    print("Transcription History Test")
+    print("=" * 60)
+
+    tests = [
+        ("最近記錄與持久化", test_bounded_recent_and_persistence),
+        ("全文搜尋", test_search),
+        ("保存轉錄結果", test_engine_result),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
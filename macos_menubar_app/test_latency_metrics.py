@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+延遲統計測試腳本
+Test script for per-stage latency metrics
+
+使用本地模擬轉錄服務，不需要麥克風或 API 金鑰。
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+from openai import OpenAI
+
+from latency_metrics import LatencyHistogram, MetricsRegistry, Trace, span
+from mock_transcription_server import MockTranscriptionServer
+from transcription_engine import CollectingSink, TranscriptionEngine
+
+SAMPLE_RATE = 16000
+
+
+def test_histogram_percentiles():
+    """測試對數分桶的百分位數與精確值相差不超過桶寬"""
+    print("\n測試直方圖百分位數...")
+    rng = np.random.default_rng(0)
+    samples = rng.lognormal(mean=-1.5, sigma=0.8, size=5000)
+    histogram = LatencyHistogram()
+    for value in samples:
+        histogram.record(float(value))
+
+    for q in (50, 95, 99):
+        exact = float(np.percentile(samples, q))
+        estimate = histogram.percentile(q)
+        error = abs(estimate - exact) / exact
+        assert error <= LatencyHistogram.GROWTH - 1 + 0.01, f"p{q}: {estimate:.4f} vs {exact:.4f}"
+        print(f"   p{q}: {estimate * 1000:.1f} ms（精確值 {exact * 1000:.1f} ms）")
+    assert histogram.percentile(100) == histogram.max
+    assert len(histogram.counts) < 200, "桶數應與樣本數無關"
+    print("✅ 百分位數誤差在桶寬內")
+
+
+def test_trace_activation():
+    """測試 span 只記錄到目前線程的 trace"""
+    print("\n測試 trace 作用範圍...")
+    trace = Trace()
+    with span("ignored"):
+        pass
+    with trace.activate():
+        with span("encode"):
+            pass
+        # 其他線程沒有目前的 trace
+        thread = threading.Thread(target=lambda: span("other").__enter__())
+        thread.start()
+        thread.join()
+        with span("encode"):
+            pass
+    assert set(trace.spans) == {"encode"}
+    print("✅ span 只記錄在目前的 trace 中")
+
+
+def test_engine_spans_and_export():
+    """測試引擎記錄各階段延遲並匯出 JSONL"""
+    print("\n測試引擎延遲記錄...")
+    t = np.arange(SAMPLE_RATE) / SAMPLE_RATE
+    audio = (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+    with tempfile.TemporaryDirectory() as tmp, MockTranscriptionServer(latency=0.1) as server:
+        export_path = os.path.join(tmp, "latency.jsonl")
+        engine = TranscriptionEngine(
+            client=OpenAI(api_key="test", base_url=server.base_url),
+            sink=CollectingSink(),
+            metrics=MetricsRegistry(export_path)
+        )
+        for _ in range(3):
+            engine.transcribe_audio(audio)
+        with open(export_path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f]
+
+    summary = engine.metrics.summary()
+    for stage in ("vad", "encode", "request_ttfb", "request_body", "postprocess", "total"):
+        assert summary[stage]["count"] == 3, f"{stage} 未記錄"
+    assert summary["request_ttfb"]["p50"] >= 100, "首字節時間應包含服務延遲"
+    assert summary["total"]["p50"] >= summary["request_ttfb"]["p50"]
+    assert list(summary)[-1] == "total"
+    assert len(records) == 3 and all(r["status"] == "ok" for r in records)
+    print(engine.metrics.format_summary())
+    print("✅ 各階段延遲已記錄並匯出")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("延遲統計測試")
+    print("Latency Metrics Test")
+    print("=" * 60)
+
+    tests = [
+        ("直方圖百分位數", test_histogram_percentiles),
+        ("trace 作用範圍", test_trace_activation),
+        ("引擎延遲記錄", test_engine_spans_and_export),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
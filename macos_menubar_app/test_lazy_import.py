@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+延遲載入測試腳本
+Test script for lazy module imports
+
+在臨時目錄中建立一個載入很慢的模組，檢查多個線程同時第一次存取時模組只執行一次、
+每個線程都看到完整的模組，以及可選模組不存在時延後報錯。
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+from lazy_import import MissingModule, is_loaded, lazy_import
+
+# 載入時計數並等待一段時間，讓其他線程有機會同時存取
+SLOW_MODULE = """
+import time
+import builtins
+builtins.slow_module_runs = getattr(builtins, "slow_module_runs", 0) + 1
+FIRST = 1
+time.sleep(0.2)
+LAST = 2
+"""
+
+
+def test_concurrent_first_access():
+    """測試多個線程同時第一次存取屬性：模組只執行一次，不會讀到只執行了一半的模組"""
+    print("\n測試並行載入...")
+    import builtins
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "slow_module.py"), "w", encoding="utf-8") as f:
+            f.write(SLOW_MODULE)
+        sys.path.insert(0, tmp)
+        try:
+            module = lazy_import("slow_module")
+            assert not is_loaded("slow_module")
+            barrier = threading.Barrier(8)
+            results = []
+            errors = []
+
+            def access():
+                barrier.wait()
+                try:
+                    results.append((module.FIRST, module.LAST))
+                except AttributeError as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=access) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            sys.path.remove(tmp)
+            sys.modules.pop("slow_module", None)
+    runs = builtins.__dict__.pop("slow_module_runs", 0)
+    assert not errors, errors
+    assert results == [(1, 2)] * 8, results
+    assert runs == 1, f"模組執行了 {runs} 次"
+    print(f"✅ 8 個線程，模組執行 {runs} 次")
+
+
+def test_missing_modules():
+    """測試不存在的模組：預設立即報錯，optional 時延後到第一次使用"""
+    print("\n測試不存在的模組...")
+    try:
+        lazy_import("no_such_module_for_test")
+    except ModuleNotFoundError:
+        pass
+    else:
+        raise AssertionError("不存在的模組應拋出 ModuleNotFoundError")
+
+    module = lazy_import("no_such_module_for_test", optional=True)
+    assert isinstance(module, MissingModule)
+    try:
+        module.anything
+    except ModuleNotFoundError:
+        pass
+    else:
+        raise AssertionError("使用不存在的可選模組應拋出 ModuleNotFoundError")
+    print("✅ 可選模組延後報錯")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("延遲載入測試")
+    print("Lazy Import Test")
+    print("=" * 60)
+
+    tests = [
+        ("並行載入", test_concurrent_first_access),
+        ("不存在的模組", test_missing_modules),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
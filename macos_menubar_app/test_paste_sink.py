@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+粘貼輸出測試腳本
+Test script for PasteSink clipboard/paste ordering
+
+以假的剪貼板和假的按鍵送出函數代替 pyperclip 和 Quartz：目標應用在收到
+Command+V 之後一小段時間才讀取剪貼板（和真實應用一樣非同步），不需要 macOS。
+"""
+
+import sys
+import threading
+import time
+
+from macos_adapters import PasteSink
+
+# 目標應用收到 Command+V 後讀取剪貼板的延遲（秒）
+READ_DELAY = 0.05
+
+
+class FakeClipboard:
+    def __init__(self, events):
+        self.value = ""
+        self.events = events
+
+    def copy(self, text):
+        self.events.append(("copy", text))
+        self.value = text
+
+    def paste(self):
+        return self.value
+
+
+class FakeApp:
+    """收到 Command+V 後延遲讀取剪貼板的目標應用"""
+
+    def __init__(self, clipboard, events):
+        self.clipboard = clipboard
+        self.events = events
+        self.received = []
+        self._timers = []
+
+    def post_command_v(self, key_event_interval):
+        self.events.append(("paste", self.clipboard.value))
+        timer = threading.Timer(READ_DELAY, lambda: self.received.append(self.clipboard.value))
+        timer.start()
+        self._timers.append(timer)
+        return True
+
+    def wait(self):
+        for timer in self._timers:
+            timer.join()
+
+
+class FocusedPasteSink(PasteSink):
+    def _target_app(self):
+        return "Editor"
+
+
+def make_sink(paste_settle):
+    events = []
+    clipboard = FakeClipboard(events)
+    app = FakeApp(clipboard, events)
+    sink = FocusedPasteSink(paste_settle=paste_settle, clipboard=clipboard, key_poster=app.post_command_v)
+    return sink, app, events
+
+
+def test_streamed_paste_order():
+    """測試串流輸出：每段先複製再粘貼，目標應用讀取後才寫入下一段，最後剪貼板保留完整文字"""
+    print("\n測試串流粘貼順序...")
+    sink, app, events = make_sink(paste_settle=READ_DELAY * 3)
+    sink.begin_stream()
+    for delta in ("你好，", "世界。", "再見"):
+        sink.deliver_delta(delta)
+    report = sink.finish_stream("你好，世界。再見")
+    app.wait()
+
+    assert app.received == ["你好，", "世界。", "再見"], app.received
+    assert events == [("copy", "你好，"), ("paste", "你好，"), ("copy", "世界。"), ("paste", "世界。"),
+                      ("copy", "再見"), ("paste", "再見"), ("copy", "你好，世界。再見")], events
+    assert report.pasted and report.target == "Editor" and sink.clipboard.value == "你好，世界。再見"
+    print(f"✅ 目標應用依序收到 {app.received}")
+
+
+def test_concurrent_deliveries():
+    """測試多個線程同時輸出：複製和粘貼成對執行，每次粘貼讀到的都是自己的文字"""
+    print("\n測試並行輸出...")
+    sink, app, events = make_sink(paste_settle=READ_DELAY * 3)
+    texts = [f"第{i}段" for i in range(4)]
+    threads = [threading.Thread(target=sink.deliver, args=(text,)) for text in texts]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    app.wait()
+
+    for copy, paste in zip(events[::2], events[1::2]):
+        assert copy[0] == "copy" and paste == ("paste", copy[1]), events
+    assert sorted(app.received) == sorted(texts), app.received
+    print(f"✅ {len(texts)} 次輸出，{(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("粘貼輸出測試")
+    print("PasteSink Test")
+    print("=" * 60)
+
+    tests = [
+        ("串流粘貼順序", test_streamed_paste_order),
+        ("並行輸出", test_concurrent_deliveries),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+錄音器測試腳本
+Test script for the arena-buffer recorder
+
+以 audio_simulation.SimulatedAudio 代替麥克風，不需要 PortAudio。
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+
+from audio_simulation import CallbackFlags, SimulatedAudio, TimeInfo
+import recorder as recorder_module
+from recorder import AudioRecorder
+
+SAMPLE_RATE = 16000
+
+
+def ramp(seconds):
+    """每個樣本值不同的測試信號，方便檢查順序和完整性"""
+    return (np.arange(int(seconds * SAMPLE_RATE)) % 30000).astype(np.int16)
+
+
+def test_records_all_blocks():
+    """測試錄音內容與輸入一致，且緩衝區成長時不遺失數據"""
+    print("\n測試錄音完整性...")
+    source = ramp(3.0)
+    audio_api = SimulatedAudio(source, speed=0)
+    blocks = []
+    recorder = AudioRecorder(SAMPLE_RATE, 1, initial_seconds=1.0, audio_api=audio_api,
+                             on_block=lambda block: blocks.append(len(block)))
+    recorder.start()
+    audio_api.source_consumed.wait(5)
+    audio = recorder.stop()
+
+    assert len(audio) >= len(source)
+    assert np.array_equal(audio[:len(source), 0], source)
+    assert not audio[len(source):].any(), "音頻之後應為靜音"
+    assert sum(blocks) == len(audio)
+    assert recorder.capacity >= 3 * SAMPLE_RATE
+    print(f"✅ {len(audio)} 幀，{len(blocks)} 個區塊，緩衝區 {recorder.capacity / SAMPLE_RATE:.0f}s")
+
+
+def test_event_driven_drain():
+    """測試實際時間播放下停止後只等待一個區塊"""
+    print("\n測試停止收尾...")
+    audio_api = SimulatedAudio(ramp(0.5), speed=1)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api)
+    recorder.start()
+    audio_api.source_consumed.wait(5)
+    recorder.request_stop()
+    audio = recorder.wait_drained()
+
+    block_seconds = recorder.blocksize / SAMPLE_RATE
+    assert recorder.last_drain_latency < block_seconds * 2, f"{recorder.last_drain_latency:.3f}s"
+    assert len(audio) >= 0.5 * SAMPLE_RATE
+    print(f"✅ 停止後 {recorder.last_drain_latency * 1000:.1f} ms 收尾（區塊 {block_seconds * 1000:.0f} ms）")
+
+
+def test_preroll():
+    """測試常駐收音：錄音以連續的預錄音頻開頭，不重新打開設備，閒置後暫停"""
+    print("\n測試常駐收音預錄...")
+    audio_api = SimulatedAudio(ramp(1.5), speed=2)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api)
+    recorder.enable_preroll(0.5, idle_timeout=0.6)
+    time.sleep(0.4)
+    recorder.start()
+    time.sleep(0.1)
+    recorder.request_stop()
+    first = recorder.wait_drained()[:, 0]
+    # 停止後立即再錄一段：預錄只包含上一段結束之後的音頻
+    recorder.start()
+    time.sleep(0.05)
+    recorder.request_stop()
+    second = recorder.wait_drained()[:, 0]
+
+    assert audio_api.streams_opened == 1, "常駐收音不應重新打開設備"
+    assert len(first) >= 0.5 * SAMPLE_RATE
+    assert np.all(np.diff(first.astype(np.int32)) == 1), "預錄與錄音之間不應有縫隙或重複"
+    assert second[0] > first[-1], "第二段的預錄不應與第一段重疊"
+    assert recorder.last_preroll_frames <= 0.5 * SAMPLE_RATE
+
+    time.sleep(0.9)
+    assert not recorder.armed, "閒置後應暫停輸入流"
+    recorder.start()
+    recorder.request_stop()
+    recorder.wait_drained()
+    assert audio_api.streams_opened == 2 and recorder.last_preroll_frames == 0
+    recorder.disable_preroll()
+    print(f"✅ 第一段 {len(first) / SAMPLE_RATE:.2f}s（含 0.5s 預錄），閒置後已暫停")
+
+
+def test_disable_preroll_while_recording():
+    """測試錄音中關閉常駐收音：這段錄音完整收尾，之後輸入流關閉、不再寫入環形緩衝區"""
+    print("\n測試錄音中關閉常駐收音...")
+    audio_api = SimulatedAudio(ramp(1.0), speed=4)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api)
+    recorder.enable_preroll(0.25)
+    time.sleep(0.05)
+    recorder.start()
+    time.sleep(0.05)
+    recorder.disable_preroll()
+    assert recorder.recording and recorder.armed, "錄音中不應關閉輸入流"
+    audio_api.source_consumed.wait(5)
+    audio = recorder.stop()[:, 0]
+
+    source = ramp(1.0)
+    start = int(np.flatnonzero(source == audio[0])[0])
+    assert np.array_equal(audio[:len(source) - start], source[start:]), "錄音應完整收尾"
+    assert not recorder.always_on and not recorder.armed, "收尾後應關閉常駐收音"
+    time.sleep(0.1)
+    assert recorder._ring is None and recorder._ring_filled == 0
+
+    # 之後的錄音每次打開設備，沒有預錄
+    recorder.start()
+    time.sleep(0.05)
+    recorder.stop()
+    assert audio_api.streams_opened == 2 and recorder.last_preroll_frames == 0
+    assert not recorder.armed
+    print(f"✅ 錄音 {len(audio) / SAMPLE_RATE:.2f}s，收尾後已關閉輸入流")
+
+
+def test_spill_to_disk():
+    """測試超過門檻後溢出到 memmap，到達長度上限時自動停止"""
+    print("\n測試溢出到磁碟...")
+    source = ramp(8.0)
+    audio_api = SimulatedAudio(source, speed=0)
+    limits = []
+    recorder = AudioRecorder(SAMPLE_RATE, 1, initial_seconds=1.0, audio_api=audio_api,
+                             spill_seconds=2.0, max_seconds=5.0, on_limit=lambda: limits.append(None))
+    recorder.start()
+    assert recorder.drained.wait(5), "到達上限後應自行結束輸入流"
+    assert recorder.spilled
+    audio = recorder.wait_drained()
+
+    assert recorder.limit_reached and len(limits) == 1
+    assert isinstance(audio, np.memmap), type(audio)
+    assert len(audio) == 5 * SAMPLE_RATE
+    assert np.array_equal(audio[:, 0], source[:5 * SAMPLE_RATE])
+    assert not recorder.spilled, "收尾後應停止背景釋放線程"
+
+    # 記憶體中的緩衝區最多成長到 spill_seconds，不會先加倍再溢出
+    audio_api = SimulatedAudio(ramp(3.0), speed=0)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, initial_seconds=1.0, audio_api=audio_api,
+                             spill_seconds=3.0, max_seconds=2.9)
+    recorder.start()
+    assert recorder.drained.wait(5)
+    assert recorder.capacity == 3 * SAMPLE_RATE, recorder.capacity
+    assert not isinstance(recorder.wait_drained(), np.memmap)
+
+    # 實際時間的輸入：溢出文件在 spill-prepare 線程中建立，回調只換上準備好的緩衝區
+    created_in = []
+    original = recorder_module.SpillBuffer
+
+    class TrackedSpillBuffer(original):
+        def __init__(self, *args, **kwargs):
+            created_in.append(threading.current_thread().name)
+            super().__init__(*args, **kwargs)
+
+    recorder_module.SpillBuffer = TrackedSpillBuffer
+    try:
+        source = ramp(3.0)
+        audio_api = SimulatedAudio(source, speed=4)
+        recorder = AudioRecorder(SAMPLE_RATE, 1, initial_seconds=0.5, audio_api=audio_api,
+                                 spill_seconds=1.0, max_seconds=2.5)
+        recorder.start()
+        assert recorder.drained.wait(5)
+        spilled = recorder.wait_drained()
+    finally:
+        recorder_module.SpillBuffer = original
+    assert created_in == ["spill-prepare"], created_in
+    assert isinstance(spilled, np.memmap) and np.array_equal(spilled[:, 0], source[:int(2.5 * SAMPLE_RATE)])
+    print(f"✅ {len(audio) / SAMPLE_RATE:.0f}s 錄音（memmap），到達上限後自動停止；溢出文件在背景準備")
+
+
+def test_capture_health():
+    """測試溢出、時間戳缺口、排隊深度和打開耗時的計數，以及溢出後的自動調整"""
+    print("\n測試擷取健康狀態...")
+    audio_api = SimulatedAudio(ramp(0.5), speed=0, open_latency=0.02)
+    recorder = AudioRecorder(SAMPLE_RATE, 1, audio_api=audio_api, autotune=True)
+    recorder.warm_up()
+    assert recorder.latency == 0.02, "應從設備的低延遲默認值開始"
+
+    settings = []
+    for _ in range(2):
+        audio_api.pending_status = CallbackFlags(input_overflow=True)
+        recorder.start()
+        audio_api.source_consumed.wait(5)
+        recorder.stop()
+        settings.append((recorder.latency, recorder.blocksize))
+    assert settings == [(0.1, 1024), (0.1, 2048)], settings
+
+    health = recorder.health
+    stats = health.stats()
+    assert stats["overflows"] == 2 and stats["callbacks"] > 0
+    assert stats["max_queue_depth"] == 1
+    assert stats["stream_open"]["count"] == 2 and stats["stream_open"]["max"] >= 20
+
+    # 時間戳缺口：第二個區塊之後少了兩個區塊
+    health.reset()
+    block = 1024 / SAMPLE_RATE
+    for adc in (10.0, 10.0 + block, 10.0 + 4 * block):
+        health.record_callback(1024, TimeInfo(adc, adc + block), CallbackFlags(), time.perf_counter())
+    stats = health.stats()
+    assert stats["dropped_blocks"] == 1 and stats["dropped_frames"] == 2048, stats
+    assert stats["jitter"]["count"] == 2
+    print(f"✅ {health.format_stats().splitlines()[0]}")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("錄音器測試")
+    print("Recorder Test")
+    print("=" * 60)
+
+    tests = [
+        ("錄音完整性", test_records_all_blocks),
+        ("停止收尾", test_event_driven_drain),
+        ("常駐收音預錄", test_preroll),
+        ("錄音中關閉常駐收音", test_disable_preroll_while_recording),
+        ("溢出到磁碟", test_spill_to_disk),
+        ("擷取健康狀態", test_capture_health),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
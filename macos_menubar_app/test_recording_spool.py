@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+錄音暫存區測試腳本
+Test script for the durable recording spool
+
+以本地模擬轉錄服務模擬 API 故障和恢復，不需要麥克風或 API 金鑰。
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+from openai import OpenAI
+
+from job_queue import JobQueue
+from mock_transcription_server import MockHTTPError, MockTranscriptionServer
+from recording_spool import RecordingSpool
+from request_policy import StreamInterrupted
+from test_transcription_engine import SAMPLE_RATE, FakeRecorder, speech
+from transcription_engine import CollectingSink, TranscriptionEngine
+
+
+def make_engine(server, spool, audio):
+    engine = TranscriptionEngine(
+        client=OpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+        sink=CollectingSink(),
+        recorder=FakeRecorder(audio)
+    )
+    engine.request_policy.max_retries = 0  # 只測試暫存區的重試
+    engine.spool = spool
+    engine.spool_retry_delays = (0.05, 0.05)
+    return engine
+
+
+def test_persist_and_restart():
+    """測試寫入、讀回、失敗記錄，以及重新打開時清除臨時文件並延續序號"""
+    print("\n測試暫存區文件...")
+    with tempfile.TemporaryDirectory() as tmp:
+        spool = RecordingSpool(tmp, max_replays=2)
+        audio = speech(0.5)
+        first = spool.persist(audio, SAMPLE_RATE)
+        second = spool.persist(audio[:, 0], SAMPLE_RATE)
+        loaded, sample_rate = spool.load(first)
+        assert sample_rate == SAMPLE_RATE and np.array_equal(loaded, audio)
+
+        # 錄音當下的重試不計入重放上限
+        for _ in range(4):
+            spool.record_failure(second, RuntimeError("down\nagain"))
+        assert spool.attempts(second) == 4 and spool.replays(second) == 0
+        assert [e.id for e in spool.pending()] == [first.id, second.id]
+        spool.record_failure(second, RuntimeError("down"), replay=True)
+        spool.record_failure(second, RuntimeError("down"), replay=True)
+        assert spool.attempts(second) == 6 and spool.replays(second) == 2
+        assert [e.id for e in spool.pending()] == [first.id], "重放失敗達到上限的錄音不再重放"
+
+        # 模擬寫到一半崩潰
+        with open(os.path.join(tmp, "00000003.wav.tmp"), "wb") as f:
+            f.write(b"RIFF")
+        spool = RecordingSpool(tmp, max_replays=2)
+        assert not any(name.endswith(".tmp") for name in os.listdir(tmp))
+        assert spool.persist(audio, SAMPLE_RATE).id == 3
+        spool.complete(second)
+        assert [e.id for e in spool.entries()] == [1, 3]
+    print("✅ 寫入、讀回和重新打開正確")
+
+
+def test_retry_through_brownout():
+    """測試 API 暫時故障時在工作線程中退避重試，成功後刪除暫存"""
+    print("\n測試故障重試...")
+    calls = []
+    lock = threading.Lock()
+
+    def responder(audio_bytes, fields):
+        with lock:
+            calls.append(None)
+            if len(calls) <= 2:
+                raise MockHTTPError(503, "Service unavailable")
+        return "恢復了"
+
+    with tempfile.TemporaryDirectory() as tmp, MockTranscriptionServer(responder=responder) as server:
+        spool = RecordingSpool(tmp)
+        engine = make_engine(server, spool, speech(1.0))
+        engine.start_recording()
+        result = engine.submit_recording(engine.stop_recording()).result(timeout=10)
+        assert result.text == "恢復了" and engine.sink.texts == ["恢復了"]
+        assert len(spool) == 0 and os.listdir(tmp) == [], os.listdir(tmp)
+    print(f"✅ {len(calls)} 次請求後成功，暫存區已清空")
+
+
+def test_retry_releases_order():
+    """測試等待重試的錄音讓出工作線程和輸出順序：後面的錄音先輸出"""
+    print("\n測試重試不阻塞...")
+    responses = iter([MockHTTPError(503, "Service unavailable"), "第二", "第一"])
+    lock = threading.Lock()
+
+    def responder(audio_bytes, fields):
+        with lock:
+            response = next(responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    with tempfile.TemporaryDirectory() as tmp, MockTranscriptionServer(responder=responder) as server:
+        spool = RecordingSpool(tmp)
+        engine = make_engine(server, spool, speech(1.0))
+        engine.jobs = JobQueue(workers=1)
+        engine.spool_retry_delays = (1.0,)
+        futures = []
+        for _ in range(2):
+            engine.start_recording()
+            futures.append(engine.submit_recording(engine.stop_recording()))
+        second = futures[1].result(timeout=10)
+        assert second.text == "第二" and engine.sink.texts == ["第二"], engine.sink.texts
+        assert not futures[0].done() and engine.pending == 1, "第一段錄音應在等待重試"
+        assert futures[0].result(timeout=10).text == "第一"
+        assert engine.sink.texts == ["第二", "第一"] and engine.pending == 0
+        assert len(spool) == 0
+    print(f"✅ 輸出順序: {engine.sink.texts}")
+
+
+def test_replay_after_outage():
+    """測試 API 完全故障時錄音留在暫存區，重新啟動後按順序重放"""
+    print("\n測試重啟重放...")
+    with tempfile.TemporaryDirectory() as tmp:
+        def down(audio_bytes, fields):
+            raise MockHTTPError(503, "Service unavailable")
+
+        with MockTranscriptionServer(responder=down) as server:
+            engine = make_engine(server, RecordingSpool(tmp), speech(1.0))
+            futures = []
+            for _ in range(3):
+                engine.start_recording()
+                futures.append(engine.submit_recording(engine.stop_recording()))
+            for future in futures:
+                assert future.exception(timeout=10) is not None
+        spool = RecordingSpool(tmp)
+        assert [e.id for e in spool.pending()] == [1, 2, 3]
+        assert all(spool.attempts(e) == 3 and spool.replays(e) == 0 for e in spool.entries())
+
+        # 重新啟動時服務仍故障：只有重放的失敗計入重放次數
+        with MockTranscriptionServer(responder=down) as server:
+            engine = make_engine(server, spool, speech(1.0))
+            for _, future in engine.replay_spool():
+                assert future.exception(timeout=10) is not None
+        assert all(spool.attempts(e) == 4 and spool.replays(e) == 1 for e in spool.entries())
+
+        # 再次重新啟動：新的引擎和恢復的服務
+        lock = threading.Lock()
+        order = iter(["第一", "第二", "第三"])
+
+        def up(audio_bytes, fields):
+            with lock:
+                return next(order)
+
+        with MockTranscriptionServer(responder=up) as server:
+            engine = make_engine(server, spool, speech(1.0))
+            replays = engine.replay_spool(sink=engine.sink)
+            texts = [future.result(timeout=10).text for _, future in replays]
+        assert texts == engine.sink.texts == ["第一", "第二", "第三"], engine.sink.texts
+        assert len(spool) == 0
+    print(f"✅ 重放 {len(texts)} 段錄音: {texts}")
+
+
+def test_stalled_stream_not_repeated():
+    """測試串流輸出部分文字後停頓超過截止時間：不重試，已輸出的開頭不會再輸出一次"""
+    print("\n測試串流中斷...")
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(responder=lambda audio_bytes, fields: "你好，世界。",
+                                    stream_chunk=3, stream_interval=1.5) as server:
+        spool = RecordingSpool(tmp)
+        engine = make_engine(server, spool, speech(1.0))
+        engine.streaming_enabled = True
+        engine.request_policy.deadline = 1.0
+        engine.request_policy.deadline_per_second = 0.0
+        engine.start_recording()
+        error = engine.submit_recording(engine.stop_recording()).exception(timeout=10)
+        assert isinstance(error, StreamInterrupted), repr(error)
+        assert engine.sink.deltas == ["你好，"] and engine.sink.texts == [], (engine.sink.deltas, engine.sink.texts)
+        assert server.request_count == 1, "串流已輸出文字後不應重新請求"
+        assert [spool.attempts(e) for e in spool.entries()] == [1], "錄音應留在暫存區供重新啟動後重放"
+    print(f"✅ 只輸出一次: {engine.sink.deltas}")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("錄音暫存區測試")
+    print("Recording Spool Test")
+    print("=" * 60)
+
+    tests = [
+        ("暫存區文件", test_persist_and_restart),
+        ("故障重試", test_retry_through_brownout),
+        ("重試不阻塞", test_retry_releases_order),
+        ("重啟重放", test_replay_after_outage),
+        ("串流中斷", test_stalled_stream_not_repeated),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
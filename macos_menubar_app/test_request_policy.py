@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+請求策略測試腳本
+Test script for request deadlines, retries and hedging
+
+使用本地模擬轉錄服務，不需要麥克風或 API 金鑰。
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+from openai import OpenAI
+
+from mock_transcription_server import MockHTTPError, MockTranscriptionServer
+from request_policy import DeadlineExceeded, RequestPolicy
+from transcription_engine import CollectingSink, TranscriptionEngine
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds=0.5):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16)
+
+
+def make_engine(server, policy):
+    engine = TranscriptionEngine(
+        client=OpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+        sink=CollectingSink()
+    )
+    engine.request_policy = policy
+    engine.vad_enabled = False
+    return engine
+
+
+class CountingResponder:
+    """按請求順序決定回應的 responder"""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, audio_bytes, fields):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+        return self.respond(call)
+
+
+def test_retry_with_backoff():
+    """測試 503 錯誤按退避重試後成功"""
+    print("\n測試重試...")
+
+    def respond(call):
+        if call <= 2:
+            raise MockHTTPError(503, "Service unavailable")
+        return "ok"
+
+    policy = RequestPolicy(base_delay=0.01)
+    with MockTranscriptionServer(responder=CountingResponder(respond)) as server:
+        result = make_engine(server, policy).transcribe_audio(tone())
+    assert result.text == "ok"
+    stats = policy.stats()
+    assert stats["requests"] == 1 and stats["retries"] == 2, stats
+    print(f"✅ {policy.format_stats()}")
+
+
+def test_deadline():
+    """測試服務沒有回應時在截止時間拋出 DeadlineExceeded"""
+    print("\n測試截止時間...")
+    policy = RequestPolicy(deadline=0.3, deadline_per_second=0, base_delay=0.01)
+    with MockTranscriptionServer(latency=1.0) as server:
+        engine = make_engine(server, policy)
+        start = time.perf_counter()
+        try:
+            engine.transcribe_audio(tone())
+            raise AssertionError("應拋出 DeadlineExceeded")
+        except DeadlineExceeded:
+            elapsed = time.perf_counter() - start
+    assert elapsed < 0.8, f"截止時間 0.3s，實際 {elapsed:.2f}s"
+    assert policy.stats()["deadlines_exceeded"] == 1
+    print(f"✅ {elapsed:.2f}s 後放棄")
+
+
+def test_late_non_retryable_error():
+    """測試超過截止時間才到達的不可重試錯誤原樣拋出，不變成可重試的 DeadlineExceeded"""
+    print("\n測試截止後的錯誤...")
+    policy = RequestPolicy(deadline=0.05, base_delay=0.01)
+
+    def rejected(timeout):
+        time.sleep(0.1)
+        raise ValueError("400 Bad Request")
+
+    try:
+        policy.call(rejected)
+        raise AssertionError("應拋出 ValueError")
+    except ValueError:
+        pass
+    assert policy.stats() == {"requests": 1, "retries": 0, "hedges_fired": 0, "hedges_won": 0,
+                              "deadlines_exceeded": 0}, policy.stats()
+    print("✅ 不可重試的錯誤原樣拋出")
+
+
+def test_hedging():
+    """測試慢請求超過 p95 後發出對沖請求並採用較快的結果"""
+    print("\n測試對沖請求...")
+    warm_up = 5
+
+    def respond(call):
+        if call == warm_up + 1:
+            time.sleep(1.0)  # 長尾：只有這一個請求很慢
+            return "slow"
+        return "fast"
+
+    policy = RequestPolicy(hedge=True, hedge_min_samples=warm_up, hedge_min_delay=0.05)
+    with MockTranscriptionServer(latency=0.02, responder=CountingResponder(respond)) as server:
+        engine = make_engine(server, policy)
+        for _ in range(warm_up):
+            engine.transcribe_audio(tone())
+        assert policy.stats()["hedges_fired"] == 0
+        start = time.perf_counter()
+        result = engine.transcribe_audio(tone())
+        elapsed = time.perf_counter() - start
+
+    stats = policy.stats()
+    assert result.text == "fast"
+    assert stats["hedges_fired"] == 1 and stats["hedges_won"] == 1, stats
+    assert elapsed < 0.5, f"對沖後應很快回應，實際 {elapsed:.2f}s"
+    print(f"✅ 對沖等待 {policy.hedge_delay() * 1000:.0f} ms，{elapsed * 1000:.0f} ms 內回應")
+
+
+def test_hedge_by_duration():
+    """測試對沖門檻按音頻長度區分：短音頻的延遲分佈不會讓長音頻的正常請求被對沖"""
+    print("\n測試按長度對沖...")
+    warm_up = 5
+    policy = RequestPolicy(hedge=True, hedge_min_samples=warm_up, hedge_min_delay=0.01)
+
+    def request(seconds):
+        return lambda timeout: time.sleep(seconds) or seconds
+
+    for _ in range(warm_up):
+        policy.call(request(0.01), audio_seconds=2.0)
+    assert policy.hedge_delay(audio_seconds=2.0) is not None
+    assert policy.hedge_delay(audio_seconds=45.0) is None, "長音頻區間還沒有樣本"
+    assert policy.call(request(0.2), audio_seconds=45.0) == 0.2
+    assert policy.stats()["hedges_fired"] == 0, policy.stats()
+
+    policy.call(request(0.2), audio_seconds=2.0)
+    assert policy.stats()["hedges_fired"] == 1, "同長度區間的慢請求應對沖"
+    print(f"✅ 短音頻門檻 {policy.hedge_delay(audio_seconds=2.0) * 1000:.0f} ms，長音頻不對沖")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("請求策略測試")
+    print("Request Policy Test")
+    print("=" * 60)
+
+    tests = [
+        ("重試", test_retry_with_backoff),
+        ("截止時間", test_deadline),
+        ("截止後的錯誤", test_late_non_retryable_error),
+        ("對沖請求", test_hedging),
+        ("按長度對沖", test_hedge_by_duration),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+簡繁轉換測試腳本
+Test script for the language-aware script conversion stage
+
+檢查每個設定檔的跳過與轉換：英文、日文、非中文語言設定時跳過，中文裡零星的假名照常轉換，
+中英混合時只轉換非 ASCII 片段，已是目標字形的文字不變，多個線程同時轉換時各自得到自己的說明。
+需要 opencc。
+"""
+
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from script_conversion import PROFILES, ConversionStage, get_converter
+
+SIMPLIFIED = "台湾的里面着手"
+
+# 各設定檔的轉換結果；轉換結果再轉換一次應保持不變
+EXPECTED = {
+    "s2t": "臺灣的裏面着手",
+    "s2tw": "臺灣的裡面著手",
+    "s2hk": "台灣的裏面着手",
+    "none": SIMPLIFIED,
+}
+
+
+def test_profile_selection():
+    """測試每個設定檔的轉換結果，以及不支援的設定檔"""
+    print("\n測試設定檔...")
+    for profile in PROFILES:
+        stage = ConversionStage(profile)
+        result, action = stage.convert_with_action(SIMPLIFIED)
+        assert result == EXPECTED[profile] == stage.convert(SIMPLIFIED), f"{profile}: {result}"
+        if profile == "none":
+            assert action == "skipped (profile none)", action
+        else:
+            assert action.startswith(f"converted ({profile},"), action
+            assert get_converter(profile) is get_converter(profile), "轉換器應按設定檔快取"
+        print(f"  {profile:5} {result}")
+
+    try:
+        ConversionStage("t2s")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("不支援的設定檔應拋出 ValueError")
+    print("✅ 四個設定檔結果正確")
+
+
+def test_already_target_script():
+    """測試已是目標字形的文字轉換後不變"""
+    print("\n測試已是目標字形...")
+    for profile, text in EXPECTED.items():
+        stage = ConversionStage(profile)
+        assert stage.convert(text) == text, f"{profile}: {stage.convert(text)}"
+    print("✅ 目標字形的文字不變")
+
+
+def test_skip_non_chinese():
+    """測試英文、日文和非中文語言設定時每個設定檔都跳過"""
+    print("\n測試跳過...")
+    cases = [
+        ("Hello, world 2.0", None, "skipped (no Han characters)"),
+        ("ひらがなと漢字", None, "skipped (Japanese kana)"),
+        ("汉字", "ja", "skipped (language ja)"),
+        ("", None, None),
+    ]
+    for profile in PROFILES:
+        for text, language, expected in cases:
+            stage = ConversionStage(profile)
+            result, action = stage.convert_with_action(text, language)
+            assert result == text
+            if profile == "none" and text:
+                expected = "skipped (profile none)"
+            assert action == expected, f"{profile} {text!r}: {action}"
+
+    # 中文語言代碼（含地區）照常轉換
+    for language in (None, "zh", "zh-TW", "yue"):
+        stage = ConversionStage("s2t")
+        assert stage.convert("汉字", language) == "漢字", language
+    print("✅ 非中文文字和語言設定不轉換")
+
+
+def test_mixed_text():
+    """測試中英混合時只轉換非 ASCII 片段，英文和標點原樣保留"""
+    print("\n測試中英混合...")
+    text = "我用 Python 写代码 v2.0，OK"
+    for profile in ("s2t", "s2tw", "s2hk"):
+        stage = ConversionStage(profile)
+        result, action = stage.convert_with_action(text)
+        assert result == "我用 Python 寫代碼 v2.0，OK", result
+        assert action == f"converted ({profile}, 3 runs)", action
+    print("✅ 只轉換中文片段")
+
+
+def test_stray_kana():
+    """測試中文裡零星的假名不會讓整段跳過；假名佔比高的日文仍跳過"""
+    print("\n測試零星假名...")
+    stage = ConversionStage("s2t")
+    result, action = stage.convert_with_action("我的の日常生活很开心")
+    assert result == "我的の日常生活很開心" and action.startswith("converted"), (result, action)
+    result, action = stage.convert_with_action("東京の天気は晴れです")
+    assert result == "東京の天気は晴れです" and action == "skipped (Japanese kana)", (result, action)
+    print(f"✅ {result}")
+
+
+def test_concurrent_actions():
+    """測試多個線程共用同一個設定檔時，每次轉換回傳自己的說明"""
+    print("\n測試並行轉換...")
+    stage = ConversionStage("s2t")
+    texts = ["Hello, world", "汉字", "ひらがなと漢字"] * 50
+    expected = {"Hello, world": "skipped (no Han characters)", "汉字": "converted (s2t, 1 runs)",
+                "ひらがなと漢字": "skipped (Japanese kana)"}
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        actions = list(executor.map(lambda text: (text, stage.convert_with_action(text)[1]), texts))
+    assert all(action == expected[text] for text, action in actions), actions
+    print(f"✅ {len(actions)} 次轉換的說明各自正確")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("簡繁轉換測試")
+    print("Script Conversion Test")
+    print("=" * 60)
+
+    tests = [
+        ("設定檔", test_profile_selection),
+        ("已是目標字形", test_already_target_script),
+        ("跳過", test_skip_non_chinese),
+        ("中英混合", test_mixed_text),
+        ("零星假名", test_stray_kana),
+        ("並行轉換", test_concurrent_actions),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
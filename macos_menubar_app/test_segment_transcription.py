@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+分段轉錄測試腳本
+Test script for incremental segment transcription
+
+使用本地模擬轉錄服務，不需要麥克風或 API 金鑰。
+"""
+
+import io
+import sys
+import time
+
+import numpy as np
+from openai import OpenAI
+from scipy.io import wavfile
+
+from mock_transcription_server import MockTranscriptionServer, decode_audio
+from segment_transcriber import (PauseSegmenter, SegmentTranscriber, join_segment_texts,
+                                 merge_overlap, split_long_audio, transcribe_chunked)
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1024
+
+# 每個片段用不同頻率的音調表示，模擬服務以主頻率回傳對應的詞
+WORDS = {440: "alpha", 660: "bravo", 880: "charlie", 1100: "delta"}
+
+
+def tone(freq, seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * freq * t) * 8000).astype(np.int16)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.int16)
+
+
+def tone_responder(audio_bytes, fields):
+    """以音頻主頻率決定回傳的詞"""
+    sample_rate, audio = decode_audio(audio_bytes)
+    spectrum = np.abs(np.fft.rfft(audio.astype(np.float32)))
+    peak = np.fft.rfftfreq(len(audio), 1 / sample_rate)[np.argmax(spectrum)]
+    freq = min(WORDS, key=lambda f: abs(f - peak))
+    return WORDS[freq]
+
+
+def make_transcribe_fn(client):
+    def transcribe(audio_array):
+        buffer = io.BytesIO()
+        wavfile.write(buffer, SAMPLE_RATE, audio_array)
+        transcript = client.audio.transcriptions.create(
+            model="gpt-4o-mini-transcribe",
+            file=("audio.wav", buffer.getvalue()),
+        )
+        return transcript.text
+    return transcribe
+
+
+def blocks(audio):
+    for start in range(0, len(audio), BLOCK_SIZE):
+        yield audio[start:start + BLOCK_SIZE]
+
+
+def test_join_segment_texts():
+    """測試片段拼接"""
+    print("\n測試片段拼接...")
+    assert join_segment_texts(["你好", "世界"]) == "你好世界"
+    assert join_segment_texts(["hello", "world"]) == "hello world"
+    assert join_segment_texts(["hello.", " ", "世界"]) == "hello.世界"
+    print("✅ 片段拼接正常")
+
+
+def test_pause_segmenter():
+    """測試停頓切分"""
+    print("\n測試停頓切分...")
+    segmenter = PauseSegmenter(SAMPLE_RATE, min_pause=0.3, min_segment=0.5)
+    audio = np.concatenate([tone(440, 1.0), silence(0.5), tone(660, 1.0), silence(0.1)])
+    segments = [s for s in (segmenter.feed(b) for b in blocks(audio)) if s is not None]
+    tail = segmenter.flush()
+    assert len(segments) == 1, f"預期 1 個完成片段，得到 {len(segments)}"
+    assert tail is not None
+    assert sum(len(s) for s in segments) + len(tail) == len(audio)
+
+    # 到達 max_segment 時整段都是靜音：丟棄，不送出請求
+    segmenter = PauseSegmenter(SAMPLE_RATE, min_pause=0.3, min_segment=0.5, max_segment=1.0)
+    audio = np.concatenate([silence(2.5), tone(440, 1.5)])
+    forced = [s for s in (segmenter.feed(b) for b in blocks(audio)) if s is not None]
+    assert forced and all(np.abs(s).max() > 500 for s in forced), "靜音片段不應送出"
+    assert sum(len(s) for s in forced) < 2.5 * SAMPLE_RATE
+    print(f"✅ 切分出 {len(segments)} 個片段 + 尾段 {len(tail)} 樣本，丟棄了強制切分的靜音片段")
+
+
+def test_forced_cut_overlap():
+    """測試片段到達上限時：最後一段有短停頓就在停頓處切開；連續說話時重疊切分，文字去重後拼接"""
+    print("\n測試強制切分...")
+    # 0.85 秒處的短停頓（短於 min_pause）落在上限前的搜尋範圍內，在停頓中切開，不需要重疊
+    segmenter = PauseSegmenter(SAMPLE_RATE, min_pause=0.5, min_segment=0.5, max_segment=1.0)
+    audio = np.concatenate([tone(440, 0.85), silence(0.1), tone(440, 0.5)])
+    segments = [s for s in (segmenter.feed(b) for b in blocks(audio)) if s is not None]
+    assert len(segments) == 1 and not segmenter.overlapped
+    assert 0.85 * SAMPLE_RATE < len(segments[0]) < 0.95 * SAMPLE_RATE, len(segments[0])
+    assert len(segments[0]) + len(segmenter.flush()) == len(audio)
+
+    # 連續說話：在上限處切開，下一個片段往前重疊
+    segmenter = PauseSegmenter(SAMPLE_RATE, min_pause=0.5, min_segment=0.5, max_segment=1.0, overlap=0.25)
+    audio = tone(440, 2.5)
+    segments, flags = [], []
+    for block in blocks(audio):
+        segment = segmenter.feed(block)
+        if segment is not None:
+            segments.append(segment)
+            flags.append(segmenter.overlapped)
+    tail = segmenter.flush()
+    flags.append(segmenter.overlapped)
+    assert len(segments) == 3 and flags == [False, True, True, True], flags
+    assert all(len(s) <= SAMPLE_RATE for s in segments)
+    overlap = int(0.25 * SAMPLE_RATE)
+    assert sum(len(s) for s in segments) + len(tail) == len(audio) + 3 * overlap
+    assert np.array_equal(segments[1][:overlap], segments[0][-overlap:])
+
+    # 重疊部分的文字只保留一次
+    texts = dict(zip(map(id, segments + [tail]), ["今天天氣", "天氣很好，", "很好，我們", "我們出去"]))
+    transcriber = SegmentTranscriber(lambda segment: texts[id(segment)])
+    for segment, overlapped in zip(segments, flags):
+        transcriber.submit(segment, overlapped)
+    text = transcriber.finish(tail, overlapped=flags[-1])
+    assert text == "今天天氣很好，我們出去", text
+    print(f"✅ {len(segments)} 個重疊片段 + 尾段，拼接結果: {text}")
+
+
+def test_segments_against_mock_server():
+    """測試錄音中背景轉錄並按順序拼接"""
+    print("\n測試背景分段轉錄...")
+    latency = 0.3
+    with MockTranscriptionServer(latency=latency, responder=tone_responder) as server:
+        client = OpenAI(api_key="test", base_url=server.base_url)
+        segmenter = PauseSegmenter(SAMPLE_RATE, min_pause=0.3, min_segment=0.5)
+        transcriber = SegmentTranscriber(make_transcribe_fn(client))
+
+        parts = []
+        for freq in WORDS:
+            parts += [tone(freq, 0.8), silence(0.4)]
+        audio = np.concatenate(parts)
+
+        # 模擬即時錄音：每個區塊按實際時長送入
+        for block in blocks(audio):
+            segment = segmenter.feed(block)
+            if segment is not None:
+                transcriber.submit(segment)
+            time.sleep(len(block) / SAMPLE_RATE / 4)
+
+        stop_time = time.perf_counter()
+        text = transcriber.finish(segmenter.flush(keep_silent=False))
+        wait = time.perf_counter() - stop_time
+
+    expected = " ".join(WORDS.values())
+    assert text == expected, f"預期 {expected!r}，得到 {text!r}"
+    assert server.request_count >= len(WORDS)
+    print(f"✅ 結果: {text}")
+    print(f"   停止後等待 {wait:.2f}s（{server.request_count} 個請求，每個延遲 {latency}s）")
+
+
+def test_split_long_audio():
+    """測試長音頻在停頓處切分；連續說話時強制切分並重疊"""
+    print("\n測試長音頻切分...")
+    parts = []
+    for freq in WORDS:
+        parts += [tone(freq, 0.8), silence(0.4)]
+    audio = np.concatenate(parts)
+    chunks = split_long_audio(audio, SAMPLE_RATE, max_chunk=1.5, search=0.5)
+    assert all(end - start <= 1.5 * SAMPLE_RATE for start, end, _ in chunks)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(audio)
+    assert all(a[1] == b[0] for a, b in zip(chunks, chunks[1:])), "停頓處切分不應重疊"
+    assert not any(overlapped for _, _, overlapped in chunks)
+    for _, end, _ in chunks[:-1]:
+        assert not audio[end - 80:end + 80].any(), f"切點 {end} 不在停頓中"
+
+    speech = tone(440, 5.0)
+    forced = split_long_audio(speech, SAMPLE_RATE, max_chunk=2.0, overlap=0.5)
+    assert all(overlapped for _, _, overlapped in forced[1:])
+    assert forced[1][0] == forced[0][1] - SAMPLE_RATE // 2
+    assert merge_overlap("今天天氣很好", "很好我們出去") == "今天天氣很好我們出去"
+    assert merge_overlap("see you at the", "the park") == "see you at the park"
+    assert merge_overlap("alpha", "bravo") == "alpha bravo"
+    print(f"✅ 停頓處切成 {len(chunks)} 塊，連續音頻強制切成 {len(forced)} 塊（重疊 0.5s）")
+
+
+def test_chunked_against_mock_server():
+    """測試長音頻的區塊並行轉錄並按順序拼接"""
+    print("\n測試區塊並行轉錄...")
+    latency = 0.3
+    parts = []
+    for freq in WORDS:
+        parts += [tone(freq, 0.8), silence(0.4)]
+    audio = np.concatenate(parts[:-1])  # 引擎中尾部靜音已由 VAD 修剪
+    with MockTranscriptionServer(latency=latency, responder=tone_responder) as server:
+        client = OpenAI(api_key="test", base_url=server.base_url)
+        start = time.perf_counter()
+        text = transcribe_chunked(audio, SAMPLE_RATE, make_transcribe_fn(client),
+                                  max_chunk=1.5, search=0.5, max_workers=4)
+        elapsed = time.perf_counter() - start
+
+    expected = " ".join(WORDS.values())
+    assert text == expected, f"預期 {expected!r}，得到 {text!r}"
+    assert server.request_count == len(WORDS)
+    assert elapsed < latency * 2.5, f"區塊應並行轉錄，耗時 {elapsed:.2f}s"
+    print(f"✅ {server.request_count} 個區塊耗時 {elapsed:.2f}s（每個請求 {latency}s）")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("分段轉錄測試")
+    print("Segment Transcription Test")
+    print("=" * 60)
+
+    tests = [
+        ("片段拼接", test_join_segment_texts),
+        ("停頓切分", test_pause_segmenter),
+        ("強制切分", test_forced_cut_overlap),
+        ("背景分段轉錄", test_segments_against_mock_server),
+        ("長音頻切分", test_split_long_audio),
+        ("區塊並行轉錄", test_chunked_against_mock_server),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
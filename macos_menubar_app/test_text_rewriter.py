@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+詞典替換測試腳本
+Test script for DictionaryRewriter and UserDictionary
+
+檢查重疊詞條的最長匹配、大小寫、空詞典、少量詞條時的逐條替換，
+以及自定義詞典文件修改後重新載入。
+"""
+
+import os
+import sys
+import tempfile
+
+from text_rewriter import MANUAL_MAPPINGS, DictionaryRewriter, UserDictionary
+
+
+def test_longest_match():
+    """測試重疊詞條：同位置取最長，結果與詞條順序無關"""
+    print("\n測試重疊詞條...")
+    mappings = {"瞭": "了", "瞭解": "理解", "瞭解釋": "了解釋"}
+    text = "瞭解和瞭，瞭解釋"
+    expected = "理解和了，了解釋"
+    for order in (mappings, dict(reversed(list(mappings.items())))):
+        rewriter = DictionaryRewriter(order)
+        assert not rewriter._loop, "重疊詞條不應使用逐條替換"
+        assert rewriter.rewrite(text) == expected, rewriter.rewrite(text)
+
+    # 替換結果不會再被其他詞條命中
+    rewriter = DictionaryRewriter({"x": "a", "ab": "Z"})
+    assert not rewriter._loop and rewriter.rewrite("xb ab") == "ab Z"
+    print(f"✅ {text} → {expected}")
+
+
+def test_case_handling():
+    """測試匹配區分大小寫；含 ASCII 詞條時不跳過純 ASCII 文字"""
+    print("\n測試大小寫...")
+    rewriter = DictionaryRewriter({"chatgpt": "ChatGPT", "臺": "台"})
+    assert rewriter.rewrite("chatgpt ChatGPT CHATGPT 臺") == "ChatGPT ChatGPT CHATGPT 台"
+    assert rewriter.rewrite("use chatgpt") == "use ChatGPT"
+
+    # 詞條全為中文時純 ASCII 文字原樣返回
+    chinese = DictionaryRewriter(MANUAL_MAPPINGS)
+    assert chinese.rewrite("Hello World") == "Hello World"
+    print("✅ 只替換完全相同的大小寫")
+
+
+def test_empty_dictionary():
+    """測試空詞典和空字串鍵"""
+    print("\n測試空詞典...")
+    for mappings in ({}, {"": "x"}):
+        rewriter = DictionaryRewriter(mappings)
+        assert len(rewriter) == 0
+        assert rewriter.rewrite("瞭解 text") == "瞭解 text"
+        assert rewriter.rewrite("") == ""
+    print("✅ 空詞典不改變文字")
+
+
+def test_loop_for_small_dictionaries():
+    """測試少量互不重疊的詞條使用逐條替換，結果與單次掃描相同"""
+    print("\n測試逐條替換...")
+    text = "我們瞭解臺灣的羣山，喫飯纔出發。"
+    loop = DictionaryRewriter(MANUAL_MAPPINGS)
+    assert loop._loop, "內建映射應使用逐條替換"
+    compiled = DictionaryRewriter(MANUAL_MAPPINGS)
+    compiled._loop = False
+    compiled._pattern = compiled._compile(compiled.mappings)
+    assert loop.rewrite(text) == compiled.rewrite(text) == "我們了解台灣的群山，吃飯才出發。"
+
+    # 空替換詞可能拼出新的詞條，不使用逐條替換
+    assert not DictionaryRewriter({"x": "", "ab": "Z"})._loop
+    many = {f"詞{i}": f"<{i}>" for i in range(100)}
+    assert not DictionaryRewriter(many)._loop
+    print(f"✅ {loop.rewrite(text)}")
+
+
+def test_reload_after_edit():
+    """測試詞典文件新增、修改、刪除和格式錯誤時的重新載入"""
+    print("\n測試重新載入...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dictionary.txt")
+        dictionary = UserDictionary(path, MANUAL_MAPPINGS)
+        assert dictionary.rewrite("臺北 open ai") == "台北 open ai"
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("# 自定義詞條\nopen ai\tOpenAI\n臺=臺\n")
+        assert dictionary.rewrite("臺北 open ai") == "臺北 OpenAI", "自定義詞條應覆蓋內建映射"
+        rewriter = dictionary.rewriter
+        assert dictionary.rewriter is rewriter, "文件未改變時不應重新編譯"
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("open ai\tOpen AI\n")
+        # 同一毫秒內改寫時 mtime 可能不變，明確推後
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert dictionary.rewrite("臺北 open ai") == "台北 Open AI"
+
+        json_path = os.path.join(tmp, "dictionary.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            f.write("[1, 2]")
+        broken = UserDictionary(json_path, MANUAL_MAPPINGS)
+        assert broken.rewrite("臺北 open ai") == "台北 open ai", "格式錯誤時應只用內建映射"
+
+        os.remove(path)
+        assert dictionary.rewrite("臺北 open ai") == "台北 open ai"
+    print("✅ 文件修改後重新載入")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("詞典替換測試")
+    print("Dictionary Rewriter Test")
+    print("=" * 60)
+
+    tests = [
+        ("重疊詞條", test_longest_match),
+        ("大小寫", test_case_handling),
+        ("空詞典", test_empty_dictionary),
+        ("逐條替換", test_loop_for_small_dictionaries),
+        ("重新載入", test_reload_after_edit),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
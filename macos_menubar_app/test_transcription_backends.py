@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+轉錄後端測試腳本
+Test script for backend selection and runtime model switching
+
+檢查模型設定字串的默認值、未知模型的錯誤訊息，以及執行中切換模型時重建後端。
+以本地模擬服務代替 OpenAI API，不需要 API 金鑰或 faster-whisper。
+"""
+
+import sys
+import tempfile
+
+from openai import OpenAI
+
+from mock_transcription_server import MockTranscriptionServer
+from test_transcription_engine import speech
+from transcription_backends import (DEFAULT_LOCAL_MODEL, DEFAULT_MODEL, LocalWhisperBackend,
+                                    OpenAIBackend, create_backend, normalize_model_spec)
+from transcription_engine import CollectingSink, TranscriptionEngine
+
+
+def openai_client():
+    """連到 api.openai.com 的客戶端（測試中不發出請求）"""
+    return OpenAI(api_key="test")
+
+
+def expect_value_error(function, *args):
+    try:
+        function(*args)
+    except ValueError as e:
+        return str(e)
+    raise AssertionError(f"{function.__name__}{args} 應拋出 ValueError")
+
+
+def test_default_models():
+    """測試空字串、local 和 local: 對應到默認模型"""
+    print("\n測試默認模型...")
+    assert normalize_model_spec("") == normalize_model_spec(None) == DEFAULT_MODEL
+    assert normalize_model_spec(" gpt-4o-transcribe ") == "gpt-4o-transcribe"
+    for spec in ("local", "local:"):
+        assert normalize_model_spec(spec) == f"local:{DEFAULT_LOCAL_MODEL}", spec
+
+    backend = create_backend("  ", openai_client())
+    assert isinstance(backend, OpenAIBackend) and backend.name == DEFAULT_MODEL
+    for spec in ("local", "local:"):
+        backend = create_backend(spec)
+        assert isinstance(backend, LocalWhisperBackend) and backend.name == f"local:{DEFAULT_LOCAL_MODEL}"
+    assert not create_backend("whisper-1", openai_client()).supports_streaming
+    print(f"✅ 默認 {DEFAULT_MODEL}，本機默認 local:{DEFAULT_LOCAL_MODEL}")
+
+
+def test_unknown_models():
+    """測試未知的模型給出明確的錯誤；自架服務和本機模型目錄不受限制"""
+    print("\n測試未知模型...")
+    message = expect_value_error(create_backend, "gpt4", openai_client())
+    assert "'gpt4'" in message and "gpt-4o-mini-transcribe" in message, message
+    print(f"  {message}")
+    message = expect_value_error(create_backend, "local:huge")
+    assert "'huge'" in message and "large-v3" in message, message
+    print(f"  {message}")
+    message = expect_value_error(create_backend, "gpt-4o-transcribe", None)
+    assert "requires an OpenAI client" in message, message
+
+    # 自架的相容服務可使用任何模型名稱；本機模型可以是目錄
+    custom = OpenAI(api_key="test", base_url="http://127.0.0.1:9/v1")
+    assert create_backend("my-whisper", custom).name == "my-whisper"
+    with tempfile.TemporaryDirectory() as model_dir:
+        assert create_backend(f"local:{model_dir}").model_size == model_dir
+    print("✅ 未知模型被拒絕")
+
+
+def test_runtime_model_switch():
+    """測試執行中切換模型：請求改用新模型，未知模型不改變設定，切換回來時重用快取的後端"""
+    print("\n測試切換模型...")
+    with MockTranscriptionServer(responder=lambda audio_bytes, fields: fields["model"], latency=0) as server:
+        engine = TranscriptionEngine(client=OpenAI(api_key="test", base_url=server.base_url),
+                                     sink=CollectingSink())
+        default_backend = engine.backend
+        assert engine.transcribe_audio(speech(0.5)).text == DEFAULT_MODEL
+
+        backend = engine.set_model(" gpt-4o-transcribe ")
+        assert engine.model_spec == "gpt-4o-transcribe" and engine.backend is backend
+        assert backend is not default_backend
+        assert engine.transcribe_audio(speech(0.5)).text == "gpt-4o-transcribe"
+
+        engine.upload_format = "wav"
+        assert default_backend.upload_format == backend.upload_format == "wav"
+
+        engine.client.base_url = "https://api.openai.com/v1"
+        expect_value_error(engine.set_model, "gpt4")
+        assert engine.model_spec == "gpt-4o-transcribe" and "gpt4" not in engine.backends
+        engine.client.base_url = server.base_url
+
+        assert engine.set_model("") is default_backend
+        assert engine.transcribe_audio(speech(0.5)).text == DEFAULT_MODEL
+
+        local = engine.set_model("local")
+        assert engine.backend is local and engine.model_spec == f"local:{DEFAULT_LOCAL_MODEL}"
+    print(f"✅ 已建立的後端: {', '.join(engine.backends)}")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("轉錄後端測試")
+    print("Transcription Backend Test")
+    print("=" * 60)
+
+    tests = [
+        ("默認模型", test_default_models),
+        ("未知模型", test_unknown_models),
+        ("切換模型", test_runtime_model_switch),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
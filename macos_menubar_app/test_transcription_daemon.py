@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+本機轉錄服務測試腳本
+Test script for the local asyncio transcription daemon
+
+服務和模擬轉錄服務都在背景線程中運行，不需要麥克風或 API 金鑰。
+"""
+
+import http.client
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+
+import numpy as np
+from openai import OpenAI
+
+from mock_transcription_server import MockTranscriptionServer
+from test_segment_transcription import SAMPLE_RATE, silence, tone, tone_responder
+from transcription_daemon import DaemonThread
+from transcription_engine import NullSink, TranscriptionEngine
+
+
+def make_engine(server):
+    return TranscriptionEngine(client=OpenAI(api_key="test", base_url=server.base_url, max_retries=0),
+                               sink=NullSink())
+
+
+def post(daemon, body, client_id=None, query="sample_rate=16000"):
+    host, port = daemon.daemon.address
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    headers = {"X-Client-Id": client_id} if client_id else {}
+    conn.request("POST", f"/v1/transcribe?{query}", body=body, headers=headers,
+                 encode_chunked=not isinstance(body, bytes))
+    response = conn.getresponse()
+    result = response.status, json.loads(response.read())
+    conn.close()
+    return result
+
+
+def test_upload_and_stats():
+    """測試整段上傳 PCM、健康檢查和統計"""
+    print("\n測試整段上傳...")
+    audio = tone(440, 1.0)
+    with MockTranscriptionServer(responder=lambda audio_bytes, fields: "我们了解这个软件") as server, \
+            DaemonThread(make_engine(server)) as daemon:
+        status, result = post(daemon, audio.tobytes(), client_id="editor")
+        assert status == 200, result
+        assert result["text"] == "我們了解這個軟件" and abs(result["duration"] - 1.0) < 1e-6, result
+
+        host, port = daemon.daemon.address
+        conn = http.client.HTTPConnection(host, port, timeout=10)
+        for path in ("/v1/health", "/v1/stats", "/v1/missing"):
+            conn.request("GET", path)
+            response = conn.getresponse()
+            body = json.loads(response.read())
+            if path == "/v1/stats":
+                assert body["clients"]["editor"]["requests"] == 1 and body["latency"]["total"]["count"] == 1
+            if path == "/v1/missing":
+                assert response.status == 404
+        conn.close()
+
+        status, result = post(daemon, b"", client_id="editor")
+        assert status == 400, result
+    print(f"✅ 結果: {result}")
+
+
+def test_streamed_upload():
+    """測試串流上傳：停頓處切出的片段在上傳過程中就開始轉錄"""
+    print("\n測試串流上傳...")
+    audio = np.concatenate([tone(440, 4.0), silence(1.0), tone(660, 4.0), silence(0.5)])
+    sent_at = []
+
+    def chunks():
+        # 以約 20 倍實時的速度送出 100 ms 的區塊
+        for start in range(0, len(audio), SAMPLE_RATE // 10):
+            sent_at.append(server.request_count)
+            yield audio[start:start + SAMPLE_RATE // 10].tobytes()
+            time.sleep(0.005)
+
+    with MockTranscriptionServer(responder=tone_responder) as server, \
+            DaemonThread(make_engine(server)) as daemon:
+        status, result = post(daemon, chunks())
+    assert status == 200, result
+    assert result["text"] == "alpha bravo", result
+    assert server.request_count == 2
+    assert sent_at[-1] >= 1, "第一個片段應在上傳結束前送去轉錄"
+    print(f"✅ 結果: {result['text']}（上傳結束前已送出 {sent_at[-1]} 個片段）")
+
+
+def test_per_client_backpressure():
+    """測試單個客戶端超過排隊上限時得到 429，其他客戶端不受影響"""
+    print("\n測試背壓...")
+    audio = tone(440, 0.5).tobytes()
+    with MockTranscriptionServer(responder=lambda audio_bytes, fields: "ok", latency=0.3) as server, \
+            DaemonThread(make_engine(server), max_inflight_per_client=1, max_queued_per_client=1) as daemon:
+        statuses = []
+        lock = threading.Lock()
+
+        def flood():
+            status, _ = post(daemon, audio, client_id="noisy")
+            with lock:
+                statuses.append(status)
+
+        threads = [threading.Thread(target=flood) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        start = time.perf_counter()
+        quiet_status, _ = post(daemon, audio, client_id="quiet")
+        quiet_latency = time.perf_counter() - start
+        for thread in threads:
+            thread.join()
+        stats = daemon.daemon.stats()["clients"]
+
+    assert quiet_status == 200
+    assert quiet_latency < 0.6, f"其他客戶端不應排在後面，等了 {quiet_latency:.2f}s"
+    assert sorted(statuses) == [200, 200, 429, 429, 429], statuses
+    assert stats["noisy"]["rejected"] == 3 and stats["noisy"]["inflight"] == 0
+    print(f"✅ noisy: {sorted(statuses)}，quiet 等了 {quiet_latency * 1000:.0f} ms")
+
+
+def test_shared_workers_and_idle_clients():
+    """測試串流上傳的片段在服務的共用線程池中轉錄、合計並行數有上限，以及清除閒置客戶端"""
+    print("\n測試共用線程池...")
+    audio = np.concatenate([tone(440, 4.0), silence(1.0), tone(660, 4.0), silence(0.5)])
+    threads_used = set()
+    active = [0, 0]  # 進行中、最高並行
+    lock = threading.Lock()
+
+    def chunks():
+        for start in range(0, len(audio), SAMPLE_RATE // 10):
+            yield audio[start:start + SAMPLE_RATE // 10].tobytes()
+            time.sleep(0.002)
+
+    with MockTranscriptionServer(responder=tone_responder, latency=0.1) as server:
+        engine = make_engine(server)
+        transcribe_raw = engine.transcribe_raw
+
+        def tracked(*args, **kwargs):
+            with lock:
+                threads_used.add(threading.current_thread().name.split("_")[0])
+                active[0] += 1
+                active[1] = max(active)
+            try:
+                return transcribe_raw(*args, **kwargs)
+            finally:
+                with lock:
+                    active[0] -= 1
+
+        engine.transcribe_raw = tracked
+        with DaemonThread(engine, workers=2, max_inflight_per_client=4, client_idle_seconds=0.3) as daemon:
+            results = []
+
+            def upload(client_id):
+                results.append(post(daemon, chunks(), client_id=client_id))
+
+            uploads = [threading.Thread(target=upload, args=(f"client-{i}",)) for i in range(4)]
+            for thread in uploads:
+                thread.start()
+            for thread in uploads:
+                thread.join()
+            assert len(daemon.daemon.clients) == 4
+            time.sleep(0.4)
+            status, _ = post(daemon, tone(440, 0.5).tobytes(), client_id="late")
+            clients = list(daemon.daemon.clients)
+
+    assert all(result == (200, {**result[1], "text": "alpha bravo"}) for result in results), results
+    assert threads_used == {"daemon"}, threads_used
+    assert active[1] <= 2, f"最多 2 個轉錄線程，實際並行 {active[1]}"
+    assert status == 200 and clients == ["late"], clients
+    print(f"✅ 片段在 {threads_used} 線程中轉錄，最高並行 {active[1]}，閒置客戶端已清除")
+
+
+def test_unix_socket():
+    """測試透過 Unix socket 上傳，base_url 為 http+unix URL"""
+    print("\n測試 Unix socket...")
+    if not hasattr(socket, "AF_UNIX"):
+        print("⚠️  不支援 Unix socket，跳過")
+        return
+    audio = tone(440, 0.5).tobytes()
+    with tempfile.TemporaryDirectory() as tmp, \
+            MockTranscriptionServer(responder=lambda audio_bytes, fields: "unix") as server, \
+            DaemonThread(make_engine(server), unix_path=os.path.join(tmp, "daemon.sock")) as daemon:
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.connect(daemon.daemon.address)
+            sock.sendall(b"POST /v1/transcribe HTTP/1.1\r\nHost: local\r\nConnection: close\r\n"
+                         + f"Content-Length: {len(audio)}\r\n\r\n".encode() + audio)
+            response = b""
+            while chunk := sock.recv(65536):
+                response += chunk
+        url = urlsplit(daemon.base_url)
+        assert url.scheme == "http+unix" and unquote(url.netloc) == daemon.daemon.address, daemon.base_url
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200"), head
+    assert json.loads(body)["text"] == "unix"
+    print("✅ Unix socket 回應正確")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("本機轉錄服務測試")
+    print("Transcription Daemon Test")
+    print("=" * 60)
+
+    tests = [
+        ("整段上傳", test_upload_and_stats),
+        ("串流上傳", test_streamed_upload),
+        ("背壓", test_per_client_backpressure),
+        ("共用線程池", test_shared_workers_and_idle_clients),
+        ("Unix socket", test_unix_socket),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+轉錄引擎測試腳本
+Test script for the headless transcription engine
+
+使用本地模擬轉錄服務和模擬錄音器，不需要 macOS、麥克風或 API 金鑰。
+"""
+
+import sys
+import threading
+import time
+
+import numpy as np
+from openai import OpenAI
+
+from mock_transcription_server import MockTranscriptionServer
+from segment_transcriber import PauseSegmenter
+from transcription_engine import CollectingSink, NoAudioError, PostProcessor, TranscriptionEngine
+
+SAMPLE_RATE = 16000
+BLOCK_SIZE = 1024
+
+
+class FakeRecorder:
+    """以固定音頻模擬 AudioRecorder：start 時按區塊回調，wait_drained 回傳整段音頻"""
+
+    def __init__(self, audio):
+        self.audio = audio
+        self.on_block = None
+
+    def warm_up(self):
+        pass
+
+    def start(self):
+        if self.on_block is not None:
+            for start in range(0, len(self.audio), BLOCK_SIZE):
+                self.on_block(self.audio[start:start + BLOCK_SIZE])
+
+    def request_stop(self):
+        pass
+
+    def wait_drained(self, timeout=5.0):
+        return self.audio
+
+
+def speech(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (np.sin(2 * np.pi * 440 * t) * 8000).astype(np.int16).reshape(-1, 1)
+
+
+def make_engine(server, audio=None):
+    return TranscriptionEngine(
+        client=OpenAI(api_key="test", base_url=server.base_url),
+        sink=CollectingSink(),
+        recorder=FakeRecorder(audio) if audio is not None else None
+    )
+
+
+def simplified_responder(audio_bytes, fields):
+    return "我们了解这个软件"
+
+
+def test_transcribe_audio():
+    """測試現成音頻經過完整流程（轉錄 → 簡繁轉換 → 詞典替換 → 輸出）"""
+    print("\n測試完整流程...")
+    with MockTranscriptionServer(responder=simplified_responder) as server:
+        engine = make_engine(server)
+        result = engine.transcribe_audio(speech(1.0))
+
+    assert result.raw_text == "我们了解这个软件"
+    # OpenCC 轉為「瞭解」，再由內建映射改回常用的「了解」
+    assert result.text == "我們了解這個軟件", result.text
+    assert engine.sink.texts == [result.text]
+    assert abs(result.duration - 1.0) < 1e-6
+    print(f"✅ 結果: {result.text}")
+
+
+def test_recording_session():
+    """測試以模擬錄音器走完錄音 → 停止 → 處理"""
+    print("\n測試錄音流程...")
+    with MockTranscriptionServer(responder=simplified_responder) as server:
+        engine = make_engine(server, speech(2.0))
+        engine.start_recording()
+        assert engine.recording
+        session = engine.stop_recording()
+        assert not engine.recording
+        result = engine.process_recording(session)
+
+    assert result.text == "我們了解這個軟件", result.text
+    assert server.request_count == 1
+    print(f"✅ 結果: {result.text}")
+
+
+def test_segmented_recording():
+    """測試分段轉錄模式下錄音中送出的片段會按順序拼接，切分不在音頻回調的線程中進行"""
+    print("\n測試分段錄音流程...")
+    silence = np.zeros((int(0.8 * SAMPLE_RATE), 1), dtype=np.int16)
+    audio = np.concatenate([speech(3.5), silence, speech(3.5), silence])
+    threads = set()
+    feed = PauseSegmenter.feed
+
+    def tracked_feed(segmenter, block):
+        threads.add(threading.current_thread().name)
+        return feed(segmenter, block)
+
+    PauseSegmenter.feed = tracked_feed
+    try:
+        with MockTranscriptionServer(responder=lambda audio_bytes, fields: "好") as server:
+            engine = make_engine(server, audio)
+            engine.segmented_transcription_enabled = True
+            engine.start_recording()
+            result = engine.process_recording(engine.stop_recording())
+    finally:
+        PauseSegmenter.feed = feed
+
+    assert result.raw_text == "好好", result.raw_text
+    assert server.request_count == 2
+    assert threads == {"segmenter"}, threads
+    print(f"✅ 結果: {result.text}（{server.request_count} 個請求）")
+
+
+def test_pipelined_recordings():
+    """測試上一段錄音處理中可立即開始新錄音，輸出按錄音順序（或按完成順序）"""
+    print("\n測試工作隊列...")
+    for ordered, expected in ((True, ["第一", "第二"]), (False, ["第二", "第一"])):
+        calls = []
+        lock = threading.Lock()
+
+        def responder(audio_bytes, fields):
+            with lock:
+                calls.append(None)
+                call = len(calls)
+            if call == 1:
+                time.sleep(0.5)  # 第一段錄音的請求較慢
+                return "第一"
+            return "第二"
+
+        with MockTranscriptionServer(responder=responder) as server:
+            engine = make_engine(server, speech(1.0))
+            engine.jobs.ordered = ordered
+            start = time.perf_counter()
+            futures = []
+            for _ in range(2):
+                engine.start_recording()
+                futures.append(engine.submit_recording(engine.stop_recording()))
+                time.sleep(0.05)  # 確保第一個請求先到達
+            started_both = time.perf_counter() - start
+            results = [future.result(timeout=5) for future in futures]
+
+        assert started_both < 0.3, f"第二段錄音應立即開始，等了 {started_both:.2f}s"
+        assert [r.text for r in results] == ["第一", "第二"]
+        assert engine.sink.texts == expected, engine.sink.texts
+        assert engine.jobs.pending == 0
+        print(f"✅ {'按錄音順序' if ordered else '按完成順序'}輸出: {engine.sink.texts}")
+
+
+def test_incremental_postprocessing():
+    """測試逐段後處理與整段處理結果相同（詞組和詞典詞條被片段切開時）"""
+    print("\n測試逐段後處理...")
+    post_processor = PostProcessor()
+    text = "我们了解这个软件，然后开始测试。Hello world! 头发很长"
+    for size in (1, 2, 3, 5):
+        processor = post_processor.stream()
+        chunks = [processor.feed(text[i:i + size]) for i in range(0, len(text), size)]
+        chunks.append(processor.finish(text))
+        assert "".join(chunks) == post_processor.process(text), (size, chunks)
+        assert processor.text == "".join(chunks) and processor.raw_text == text
+    # 「了」和「解」分在兩個片段時不能先輸出
+    processor = post_processor.stream()
+    assert processor.feed("我们了") == ""
+    assert processor.feed("解这个，软") == "我們了解這個，"
+    # 服務端的完整文字比片段多時補上差異
+    assert processor.finish("我们了解这个，软件") == "軟件"
+    print("✅ 逐段結果與整段相同")
+
+
+def test_streaming_output():
+    """測試串流轉錄：文字邊到達邊輸出，第一段文字早於全部完成"""
+    print("\n測試串流輸出...")
+    text = "我们了解这个软件，然后开始测试。最后一句话"
+
+    with MockTranscriptionServer(responder=lambda audio_bytes, fields: text,
+                                 stream_chunk=3, stream_interval=0.05) as server:
+        engine = make_engine(server, speech(1.0))
+        engine.streaming_enabled = True
+        engine.start_recording()
+        session = engine.stop_recording()
+        result = engine.process_recording(session)
+
+        engine.streaming_enabled = False
+        engine.start_recording()
+        plain_result = engine.process_recording(engine.stop_recording())
+
+    assert result.text == plain_result.text == "我們了解這個軟件，然後開始測試。最後一句話", result.text
+    sink = engine.sink
+    assert sink.deltas == ["我們了解這個軟件，", "然後開始測試。", "最後一句話"], sink.deltas
+    assert sink.texts == [result.text, plain_result.text]
+    spans = session.trace.spans
+    assert spans["first_text"] < spans["total"] - 0.2, spans
+    print(f"✅ 第一段文字 {spans['first_text'] * 1000:.0f} ms，全部 {spans['total'] * 1000:.0f} ms")
+
+
+def test_no_audio():
+    """測試沒有錄到音頻時拋出 NoAudioError"""
+    print("\n測試空錄音...")
+    engine = TranscriptionEngine(client=object(), sink=CollectingSink(),
+                                 recorder=FakeRecorder(np.zeros((0, 1), dtype=np.int16)))
+    engine.start_recording()
+    try:
+        engine.process_recording(engine.stop_recording())
+    except NoAudioError:
+        print("✅ 空錄音被拒絕")
+    else:
+        raise AssertionError("空錄音應拋出 NoAudioError")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("轉錄引擎測試")
+    print("Transcription Engine Test")
+    print("=" * 60)
+
+    tests = [
+        ("完整流程", test_transcribe_audio),
+        ("錄音流程", test_recording_session),
+        ("分段錄音流程", test_segmented_recording),
+        ("工作隊列", test_pipelined_recordings),
+        ("逐段後處理", test_incremental_postprocessing),
+        ("串流輸出", test_streaming_output),
+        ("空錄音", test_no_audio),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
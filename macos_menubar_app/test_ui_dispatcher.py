@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+介面更新調度測試腳本
+Test script for the coalescing UI dispatcher
+
+不需要 rumps：以普通函數代替菜單項，主線程手動呼叫 flush。
+"""
+
+import sys
+import threading
+
+from ui_dispatcher import UIDispatcher, changed_slots, prepended_count
+
+
+def test_coalescing():
+    """測試其他線程的大量變化合併成主線程上的少量套用"""
+    print("\n測試合併更新...")
+    applied = []
+    dispatcher = UIDispatcher()
+    dispatcher.register("icon", lambda value: applied.append((threading.current_thread().name, value)))
+
+    def worker(icons):
+        for icon in icons:
+            dispatcher.set("icon", icon)
+
+    threads = [threading.Thread(target=worker, args=(["🔴", "🔄"] * 50,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    dispatcher.set("icon", "🎤")
+
+    assert dispatcher.flush() == 1
+    assert applied == [(threading.current_thread().name, "🎤")], "只在呼叫 flush 的線程套用最後的值"
+    assert dispatcher.flush() == 0, "沒有新變化時不應套用"
+
+    # 值與已套用的相同時跳過
+    dispatcher.set("icon", "🔴")
+    dispatcher.set("icon", "🎤")
+    assert dispatcher.flush() == 0
+    assert dispatcher.requested == 403 and dispatcher.applied == 1
+    print(f"✅ {dispatcher.requested} 次變化套用 {dispatcher.applied} 次")
+
+
+def test_unknown_key_and_failing_applier():
+    """測試未登記的狀態被拒絕，套用失敗不影響其他狀態"""
+    print("\n測試錯誤處理...")
+    dispatcher = UIDispatcher()
+    applied = []
+    dispatcher.register("broken", lambda value: 1 / 0)
+    dispatcher.register("title", applied.append)
+    try:
+        dispatcher.set("missing", 1)
+        raise AssertionError("未登記的狀態應拋出 KeyError")
+    except KeyError:
+        pass
+    dispatcher.set("broken", 1)
+    dispatcher.set("title", "開始錄音")
+    assert dispatcher.flush() == 1 and applied == ["開始錄音"]
+    print("✅ 套用失敗只影響該狀態")
+
+
+def test_changed_slots():
+    """測試最近結果只更新有變化的位置"""
+    print("\n測試列表差異...")
+    assert changed_slots([], ["a"]) == [(0, "a")]
+    assert changed_slots(["a", "b"], ["a", "b", "c"]) == [(2, "c")]
+    assert changed_slots(["a", "b", "c"], ["b", "c", "d"]) == [(0, "b"), (1, "c"), (2, "d")]
+    assert changed_slots(["a", "b"], ["a"]) == [(1, None)]
+    assert changed_slots(["a"], ["a"]) == []
+
+    # 最新在前：新結果加在前面、最舊的從尾部移除
+    assert prepended_count([], ["a"]) == 1
+    assert prepended_count(["b", "a"], ["c", "b", "a"]) == 1
+    assert prepended_count(["e", "d", "c", "b", "a"], ["g", "f", "e", "d", "c"]) == 2
+    assert prepended_count(["a", "a"], ["a", "a"]) == 0
+    assert prepended_count(["a", "b"], ["c", "d"]) == 2
+    print("✅ 差異正確")
+
+
+def test_events_not_coalesced():
+    """測試事件（通知）按順序每個都在主線程套用，相同的事件不被合併"""
+    print("\n測試事件...")
+    dispatcher = UIDispatcher()
+    shown = []
+    dispatcher.register("notification", lambda args: shown.append((threading.current_thread().name, args)))
+    dispatcher.register("icon", lambda value: None)
+
+    thread = threading.Thread(target=lambda: [dispatcher.post("notification", ("完成", text))
+                                              for text in ("好", "好", "再見")])
+    thread.start()
+    thread.join()
+    dispatcher.set("icon", "🎤")
+    assert dispatcher.dirty
+    assert dispatcher.flush() == 4
+    name = threading.current_thread().name
+    assert shown == [(name, ("完成", "好")), (name, ("完成", "好")), (name, ("完成", "再見"))], shown
+    assert dispatcher.flush() == 0 and not dispatcher.dirty
+    print(f"✅ {len(shown)} 個通知按順序顯示")
+
+
+def run_all_tests():
+    """運行所有測試"""
+    print("=" * 60)
+    print("介面更新調度測試")
+    print("UI Dispatcher Test")
+    print("=" * 60)
+
+    tests = [
+        ("合併更新", test_coalescing),
+        ("錯誤處理", test_unknown_key_and_failing_applier),
+        ("列表差異", test_changed_slots),
+        ("事件", test_events_not_coalesced),
+    ]
+    results = []
+    for name, test in tests:
+        try:
+            test()
+            results.append((name, True))
+        except AssertionError as e:
+            print(f"❌ {e}")
+            results.append((name, False))
+
+    passed = sum(1 for _, result in results if result)
+    print(f"\n通過: {passed}/{len(results)}")
+    return 0 if passed == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run_all_tests())
@@ -0,0 +1,204 @@
+"""
+詞典替換引擎
+Single-pass dictionary rewrite engine
+
+將所有替換詞編譯成一棵前綴樹，再把前綴樹轉成一個正則表達式，
+整段文字只掃描一次。匹配規則固定為「最左優先、同位置取最長」，
+因此重疊的詞條（例如「瞭解」與「瞭」）結果與詞條順序無關。
+詞條很少且互不重疊時（例如內建映射），逐條 str.replace 的結果相同而且更快，
+此時改用逐條替換。
+
+自定義詞典文件格式（UTF-8，每行一條，# 開頭為註釋）：
+    錯詞<TAB>正詞
+    錯詞=正詞
+或 .json 文件：{"錯詞": "正詞", ...}
+"""
+
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# 將不常用的繁體字改成常用的（來自 clip2trad-python）
+MANUAL_MAPPINGS = {
+    '瞭解': '了解',
+    '羣': '群',
+    '臺': '台',
+    '峯': '峰',
+    '喫': '吃',
+    '纔': '才',
+}
+
+# 詞條數不超過此值且互不重疊時使用逐條 str.replace（bench_text_rewriter.py 中兩者在 24–32 條之間持平）
+LOOP_MAX_ENTRIES = 24
+
+
+def apply_manual_mappings(text, mappings):
+    """
+    根據手動映射字典替換文本中的指定詞彙（逐條 str.replace，作為基準實現保留）。
+
+    :param text: 要處理的文本
+    :param mappings: 替換映射字典
+    :return: 替換後的文本
+    """
+    for key, value in mappings.items():
+        text = text.replace(key, value)
+    return text
+
+
+def _trie_pattern(node):
+    """把前綴樹節點轉成正則表達式（貪婪匹配即最長匹配）"""
+    terminal = "" in node
+    branches = [re.escape(char) + _trie_pattern(child)
+                for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    if len(branches) == 1 and len(node) == 1 + terminal:
+        body = branches[0]
+    else:
+        body = "(?:" + "|".join(branches) + ")"
+    if terminal:
+        # 已是完整詞條，後續字元可選；貪婪量詞先嘗試更長的詞條
+        return "(?:" + body + ")?"
+    return body
+
+
+def _overlaps(a, b):
+    """a 和 b 是否互相包含，或一個的結尾是另一個的開頭"""
+    if a in b or b in a:
+        return True
+    return any(a[-i:] == b[:i] or b[-i:] == a[:i] for i in range(1, min(len(a), len(b))))
+
+
+def _loop_safe(mappings):
+    """逐條 str.replace 的結果是否與單次掃描相同
+
+    詞條之間、詞條與替換詞之間都不重疊，替換詞也不為空時，任何一條替換都不會
+    拆開或拼出另一個詞條，結果就與詞條順序無關。
+    """
+    if len(mappings) > LOOP_MAX_ENTRIES or not all(mappings.values()):
+        return False
+    keys = list(mappings)
+    for i, key in enumerate(keys):
+        if any(_overlaps(key, other) for other in keys[i + 1:]):
+            return False
+        if any(_overlaps(key, value) for value in mappings.values()):
+            return False
+    return True
+
+
+class DictionaryRewriter:
+    """編譯後的單次掃描多詞替換器"""
+
+    def __init__(self, mappings):
+        """
+        Args:
+            mappings: {原詞: 替換詞} 字典；空字串鍵會被忽略
+        """
+        self.mappings = {key: value for key, value in mappings.items() if key}
+        # 少量互不重疊的詞條：逐條替換比正則表達式快（不需要編譯）
+        self._loop = _loop_safe(self.mappings)
+        self._pattern = None if self._loop else self._compile(self.mappings)
+        # 所有詞條都含非 ASCII 字元時，純 ASCII 文字不可能命中，可直接跳過
+        self._skip_ascii = all(not key.isascii() for key in self.mappings)
+
+    def __len__(self):
+        return len(self.mappings)
+
+    @staticmethod
+    def _compile(mappings):
+        if not mappings:
+            return None
+        trie = {}
+        for key in mappings:
+            node = trie
+            for char in key:
+                node = node.setdefault(char, {})
+            node[""] = True
+        return re.compile(_trie_pattern(trie))
+
+    def rewrite(self, text):
+        """替換文字中的所有詞條（單次掃描）"""
+        if not self.mappings or not text:
+            return text
+        if self._skip_ascii and text.isascii():
+            return text
+        if self._loop:
+            return apply_manual_mappings(text, self.mappings)
+        mappings = self.mappings
+        return self._pattern.sub(lambda match: mappings[match.group(0)], text)
+
+
+def load_dictionary(path):
+    """讀取自定義詞典文件
+
+    Args:
+        path: .json 或文字詞典文件路徑
+
+    Returns:
+        {原詞: 替換詞} 字典
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".json"):
+            data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError(f"{path}: JSON dictionary must be an object")
+            return {str(key): str(value) for key, value in data.items()}
+
+        mappings = {}
+        for line_no, line in enumerate(f, 1):
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            if "\t" in line:
+                key, value = line.split("\t", 1)
+            elif "=" in line:
+                key, value = line.split("=", 1)
+            else:
+                logger.warning(f"{path}:{line_no}: expected 'key<TAB>value' or 'key=value'")
+                continue
+            mappings[key.strip()] = value.strip()
+        return mappings
+
+
+class UserDictionary:
+    """內建映射加上自定義詞典文件；文件變更時才重新編譯"""
+
+    def __init__(self, path, base_mappings=None):
+        """
+        Args:
+            path: 自定義詞典文件路徑（可不存在）
+            base_mappings: 內建映射，自定義詞條會覆蓋同名詞條
+        """
+        self.path = path
+        self.base_mappings = dict(base_mappings or {})
+        self._signature = None
+        self._rewriter = DictionaryRewriter(self.base_mappings)
+
+    def _file_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def rewriter(self):
+        """目前的替換器；文件改變時重新載入"""
+        signature = self._file_signature()
+        if signature != self._signature:
+            mappings = dict(self.base_mappings)
+            if signature is not None:
+                try:
+                    mappings.update(load_dictionary(self.path))
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to load dictionary {self.path}: {e}")
+            self._rewriter = DictionaryRewriter(mappings)
+            self._signature = signature
+            logger.info(f"Dictionary compiled: {len(self._rewriter)} entries")
+        return self._rewriter
+
+    def rewrite(self, text):
+        return self.rewriter.rewrite(text)
@@ -0,0 +1,314 @@
+"""
+轉錄後端
+Pluggable transcription backends
+
+- OpenAIBackend: 呼叫 OpenAI audio.transcriptions API（默認 gpt-4o-mini-transcribe），
+  gpt-4o 系列模型可串流回傳文字片段
+- LocalWhisperBackend: 在本機 CPU 上以 faster-whisper (int8 量化) 轉錄，
+  模型常駐記憶體，短句無需網路往返
+
+模型設定字串：
+    gpt-4o-mini-transcribe / gpt-4o-transcribe / whisper-1  → OpenAIBackend
+    local:small / local:base / local:large-v3 ...            → LocalWhisperBackend
+空字串為默認模型，local 或 local: 為默認本機模型。連到 api.openai.com 時只接受上面的
+OpenAI 模型；自架的相容服務（base_url）可使用任何模型名稱。
+"""
+
+import logging
+import os
+import threading
+import time
+
+from audio_encoding import encode_audio
+from latency_metrics import current_trace, span
+from request_policy import StreamInterrupted
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-4o-mini-transcribe"
+LOCAL_PREFIX = "local:"
+DEFAULT_LOCAL_MODEL = "small"
+
+# api.openai.com 的轉錄模型
+OPENAI_MODELS = ("gpt-4o-mini-transcribe", "gpt-4o-transcribe", "whisper-1")
+OPENAI_API_HOST = "api.openai.com"
+
+# faster-whisper 可按名稱下載的模型；也可以是本機模型目錄
+LOCAL_MODELS = ("tiny", "tiny.en", "base", "base.en", "small", "small.en", "medium", "medium.en",
+                "large-v1", "large-v2", "large-v3", "large", "large-v3-turbo", "turbo",
+                "distil-small.en", "distil-medium.en", "distil-large-v2", "distil-large-v3")
+
+
+class TranscriptionBackend:
+    """轉錄後端介面"""
+
+    #: 顯示在「模型」設定項中的名稱
+    name = ""
+
+    #: 是否能在轉錄過程中逐段回傳文字
+    supports_streaming = False
+
+    def transcribe(self, audio, sample_rate, language=None):
+        """將 int16 音頻轉換為文字
+
+        Args:
+            audio: int16 音頻數組，形狀為 (樣本數,) 或 (樣本數, 聲道數)
+            sample_rate: 採樣率
+            language: 語言代碼，None 表示自動偵測
+
+        Returns:
+            轉錄文字
+        """
+        raise NotImplementedError
+
+    def transcribe_stream(self, audio, sample_rate, on_delta, language=None):
+        """轉錄並在文字到達時呼叫 on_delta(片段)；不支援串流的後端在最後回傳一次
+
+        Returns:
+            完整的轉錄文字
+        """
+        text = self.transcribe(audio, sample_rate, language=language)
+        on_delta(text)
+        return text
+
+    def warm_up(self):
+        """預先載入模型或建立連線（可選）"""
+
+
+class OpenAIBackend(TranscriptionBackend):
+    """OpenAI 轉錄 API"""
+
+    def __init__(self, client, model=DEFAULT_MODEL, upload_format="flac", policy=None):
+        """
+        Args:
+            client: OpenAI 客戶端
+            model: 模型名稱
+            upload_format: 上傳格式 (wav, flac, ogg)
+            policy: RequestPolicy（截止時間、重試、對沖），None 時直接請求一次
+        """
+        self.client = client
+        self.model = model
+        self.upload_format = upload_format
+        self.policy = policy
+        self.last_encoded = None
+
+    @property
+    def name(self):
+        return self.model
+
+    @property
+    def supports_streaming(self):
+        # whisper-1 不支援 stream 參數
+        return not self.model.startswith("whisper")
+
+    def encode(self, audio, sample_rate):
+        """按設定格式編碼音頻；FLAC/Opus 不可用時退回 WAV"""
+        with span("encode"):
+            try:
+                encoded = encode_audio(audio, sample_rate, self.upload_format)
+            except ImportError as e:
+                logger.warning(f"{e}, falling back to WAV")
+                encoded = encode_audio(audio, sample_rate, "wav")
+        self.last_encoded = encoded
+        logger.info(f"Encoded upload: {encoded}")
+        return encoded
+
+    def warm_up(self):
+        # 預先載入編碼用到的模組（numpy、scipy、soundfile）和客戶端的 HTTP 層
+        import numpy as np
+        self.client.audio
+        try:
+            encode_audio(np.zeros((1600, 1), dtype=np.int16), 16000, self.upload_format)
+        except ImportError:
+            encode_audio(np.zeros((1600, 1), dtype=np.int16), 16000, "wav")
+
+    def transcribe(self, audio, sample_rate, language=None):
+        # 在記憶體中編碼上傳內容（不寫臨時文件）
+        encoded = self.encode(audio, sample_rate)
+
+        logger.info(f"Calling OpenAI transcription API ({self.model})...")
+
+        def request(timeout):
+            # 串流回應：收到標頭（首字節）和解析完成分開計時
+            start = time.perf_counter()
+            with self.client.audio.transcriptions.with_streaming_response.create(
+                model=self.model,
+                file=encoded.as_upload(),
+                language=language,  # 可選語言參數
+                timeout=timeout
+            ) as response:
+                headers_at = time.perf_counter()
+                transcript = response.parse()
+            return transcript.text, headers_at - start, time.perf_counter() - headers_at
+
+        policy = self.policy
+        if policy is None:
+            text, ttfb, body = request(None)
+        else:
+            # 重試和對沖可能在其他線程中請求，只記錄被採用的那個請求的耗時
+            seconds = len(audio) / sample_rate
+            text, ttfb, body = policy.call(request, policy.deadline_for(seconds), audio_seconds=seconds)
+        trace = current_trace()
+        if trace is not None:
+            trace.add("request_ttfb", ttfb)
+            trace.add("request_body", body)
+        return text
+
+    def transcribe_stream(self, audio, sample_rate, on_delta, language=None):
+        encoded = self.encode(audio, sample_rate)
+        logger.info(f"Calling OpenAI transcription API ({self.model}, streaming)...")
+
+        def request(timeout):
+            emitted = False
+            start = time.perf_counter()
+            try:
+                stream = self.client.audio.transcriptions.create(
+                    model=self.model,
+                    file=encoded.as_upload(),
+                    language=language,
+                    stream=True,
+                    timeout=timeout
+                )
+                headers_at = time.perf_counter()
+                text = None
+                parts = []
+                with stream:
+                    for event in stream:
+                        if event.type == "transcript.text.delta":
+                            parts.append(event.delta)
+                            emitted = True
+                            on_delta(event.delta)
+                        elif event.type == "transcript.text.done":
+                            text = event.text
+            except Exception as e:
+                if emitted:
+                    raise StreamInterrupted(f"Stream interrupted after partial output: {e}") from e
+                raise
+            if text is None:
+                text = "".join(parts)
+            return text, headers_at - start, time.perf_counter() - headers_at
+
+        policy = self.policy
+        if policy is None:
+            text, ttfb, body = request(None)
+        else:
+            # 輸出已送出的片段無法撤回：不對沖，只在第一個片段之前重試
+            seconds = len(audio) / sample_rate
+            text, ttfb, body = policy.call(request, policy.deadline_for(seconds), hedge=False,
+                                           audio_seconds=seconds)
+        trace = current_trace()
+        if trace is not None:
+            trace.add("request_ttfb", ttfb)
+            trace.add("request_body", body)
+        return text
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """本機 CPU 轉錄（faster-whisper, int8 量化）"""
+
+    def __init__(self, model_size="small", compute_type="int8", cpu_threads=0, beam_size=1):
+        """
+        Args:
+            model_size: 模型大小或路徑 (tiny, base, small, medium, large-v3, ...)
+            compute_type: 量化類型，CPU 上 int8 最快
+            cpu_threads: 推理線程數，0 表示由 CTranslate2 自動決定
+            beam_size: 解碼 beam 大小，1 為 greedy（最快）
+        """
+        self.model_size = model_size
+        self.compute_type = compute_type
+        self.cpu_threads = cpu_threads
+        self.beam_size = beam_size
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def name(self):
+        return f"{LOCAL_PREFIX}{self.model_size}"
+
+    def _load(self):
+        """載入模型（只載入一次）"""
+        with self._load_lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError as e:
+                    raise ImportError(
+                        "Local transcription requires faster-whisper: pip install faster-whisper"
+                    ) from e
+                start = time.perf_counter()
+                self._model = WhisperModel(
+                    self.model_size,
+                    device="cpu",
+                    compute_type=self.compute_type,
+                    cpu_threads=self.cpu_threads
+                )
+                logger.info(f"Loaded local model {self.model_size} ({self.compute_type}) "
+                            f"in {time.perf_counter() - start:.2f}s")
+            return self._model
+
+    def warm_up(self):
+        self._load()
+
+    def transcribe(self, audio, sample_rate, language=None):
+        if sample_rate != 16000:
+            raise ValueError(f"Local model expects 16 kHz audio, got {sample_rate}")
+        model = self._load()
+
+        import numpy as np
+
+        # faster-whisper 接受 float32 單聲道 [-1, 1]
+        samples = audio.mean(axis=1) if audio.ndim > 1 else audio
+        samples = samples.astype(np.float32) / 32768.0
+
+        start = time.perf_counter()
+        with span("model"):
+            # segments 是生成器，實際推理在迭代時進行
+            segments, info = model.transcribe(samples, language=language, beam_size=self.beam_size)
+            text = "".join(segment.text for segment in segments).strip()
+        logger.info(f"Local transcription ({info.language}) in {time.perf_counter() - start:.2f}s")
+        return text
+
+
+def normalize_model_spec(spec):
+    """模型設定字串的標準形式（也是後端快取的鍵）
+
+    空字串為默認模型；local 或 local: 為默認本機模型。
+    """
+    spec = (spec or "").strip()
+    if not spec:
+        return DEFAULT_MODEL
+    if spec in ("local", LOCAL_PREFIX):
+        return LOCAL_PREFIX + DEFAULT_LOCAL_MODEL
+    return spec
+
+
+def _uses_openai_api(client):
+    """客戶端是否連到 api.openai.com（而不是自架的相容服務）"""
+    return OPENAI_API_HOST in str(getattr(client, "base_url", ""))
+
+
+def create_backend(spec, client=None, upload_format="flac", policy=None):
+    """根據模型設定字串建立後端
+
+    Args:
+        spec: 模型名稱，或 "local:<模型大小或目錄>"
+        client: OpenAI 客戶端（OpenAI 模型需要）
+        upload_format: OpenAI 上傳格式
+        policy: OpenAI 請求的 RequestPolicy
+
+    Raises:
+        ValueError: 未知的模型，或 OpenAI 模型但未提供客戶端
+    """
+    spec = normalize_model_spec(spec)
+    if spec.startswith(LOCAL_PREFIX):
+        model_size = spec[len(LOCAL_PREFIX):]
+        if model_size not in LOCAL_MODELS and not os.path.isdir(os.path.expanduser(model_size)):
+            raise ValueError(f"Unknown local model {model_size!r}: expected a model directory or one of "
+                             f"{', '.join(LOCAL_MODELS)}")
+        return LocalWhisperBackend(model_size)
+    if client is None:
+        raise ValueError(f"Model {spec} requires an OpenAI client")
+    if spec not in OPENAI_MODELS and _uses_openai_api(client):
+        raise ValueError(f"Unknown OpenAI transcription model {spec!r}: expected one of "
+                         f"{', '.join(OPENAI_MODELS)}, or local:<size>")
+    return OpenAIBackend(client, model=spec, upload_format=upload_format, policy=policy)
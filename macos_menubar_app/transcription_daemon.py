@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+本機轉錄服務
+Local asyncio transcription daemon
+
+每台機器只載入一次轉錄流程：多個客戶端透過本機 HTTP（TCP 或 Unix socket）上傳
+或串流 PCM，共用同一個 TranscriptionEngine（OpenAI 連線池、OpenCC 轉換器、詞典）。
+網路 I/O 在 asyncio 事件循環中處理，轉錄（含串流上傳的片段）在同一個有界線程池中進行。
+
+介面:
+    POST /v1/transcribe?sample_rate=16000[&segmented=0|1]
+        請求體為 int16 單聲道 PCM（little-endian）。有 Content-Length 時整段上傳；
+        Transfer-Encoding: chunked 時邊錄邊傳，收到的音頻在停頓處切成片段，
+        上傳過程中就開始轉錄（segmented 可覆蓋）。回應 {"text", "raw_text", "duration", "latency"}
+    GET /v1/health
+    GET /v1/stats      各階段延遲和每個客戶端的請求數
+
+背壓：每個客戶端（X-Client-Id 標頭，沒有時為連線地址）和所有客戶端合計同時轉錄的請求數
+都有上限，排隊中的請求不讀取請求體，TCP 視窗隨之關閉，客戶端的寫入被阻塞；
+客戶端的排隊數也超過上限時立即回應 429 和 Retry-After。閒置的客戶端統計會被清除。
+
+用法:
+    python3 transcription_daemon.py --port 8766
+    python3 transcription_daemon.py --unix /tmp/speech.sock --base-url http://127.0.0.1:8765/v1
+    curl --data-binary @audio.pcm 'http://127.0.0.1:8766/v1/transcribe?sample_rate=16000'
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, urlsplit
+
+from lazy_import import lazy_import
+from script_conversion import PROFILES, ConversionStage
+from text_rewriter import MANUAL_MAPPINGS, UserDictionary
+from transcription_backends import DEFAULT_MODEL, LOCAL_PREFIX, normalize_model_spec
+from transcription_engine import USER_DICTIONARY_PATH, NoAudioError, NullSink, PostProcessor, TranscriptionEngine
+
+np = lazy_import("numpy")
+openai = lazy_import("openai")
+
+logger = logging.getLogger(__name__)
+
+# 請求行和標頭的長度上限
+MAX_HEADER_BYTES = 16 * 1024
+
+
+class HTTPError(Exception):
+    """以指定狀態碼回應並關閉連線"""
+
+    def __init__(self, status, message=None, headers=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ClientState:
+    """一個客戶端的並行限制和統計"""
+
+    def __init__(self, max_inflight):
+        self.semaphore = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.rejected = 0
+        self.last_seen = time.monotonic()
+
+    @property
+    def idle(self):
+        return not self.inflight and not self.waiting
+
+    def to_dict(self):
+        return {"requests": self.requests, "rejected": self.rejected,
+                "inflight": self.inflight, "waiting": self.waiting}
+
+
+class TranscriptionDaemon:
+    """asyncio 本機轉錄服務"""
+
+    def __init__(self, engine, max_inflight_per_client=2, max_queued_per_client=4,
+                 workers=8, max_inflight=None, max_audio_seconds=600, read_chunk=64 * 1024,
+                 client_idle_seconds=600):
+        """
+        Args:
+            engine: 所有客戶端共用的 TranscriptionEngine（輸出應為 NullSink）
+            max_inflight_per_client: 每個客戶端同時轉錄的請求數
+            max_queued_per_client: 每個客戶端排隊等待的請求數，超過時回應 429
+            workers: 轉錄線程數（所有客戶端和串流上傳的片段共用）
+            max_inflight: 所有客戶端合計同時轉錄的請求數，默認等於 workers
+            max_audio_seconds: 單個請求的音頻長度上限
+            read_chunk: 每次從連線讀取的位元組數
+            client_idle_seconds: 客戶端閒置多久（秒）後清除其統計
+        """
+        self.engine = engine
+        self.max_inflight_per_client = max_inflight_per_client
+        self.max_queued_per_client = max_queued_per_client
+        self.max_inflight = max_inflight or workers
+        self.max_audio_seconds = max_audio_seconds
+        self.read_chunk = read_chunk
+        self.client_idle_seconds = client_idle_seconds
+        self.clients = {}
+        self._last_sweep = time.monotonic()
+        self._inflight = None  # asyncio.Semaphore，在事件循環中建立
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="daemon")
+        self._server = None
+        self._connections = set()
+        self.address = None
+
+    async def start(self, host="127.0.0.1", port=8766, unix_path=None):
+        """開始監聽（port 為 0 時自動選擇），回傳監聽地址"""
+        self._inflight = asyncio.Semaphore(self.max_inflight)
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            self._server = await asyncio.start_unix_server(self._handle_connection, unix_path,
+                                                           limit=MAX_HEADER_BYTES)
+            self.address = unix_path
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port,
+                                                      limit=MAX_HEADER_BYTES)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        logger.info(f"Transcription daemon listening on {self.address}")
+        return self.address
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # 關閉仍開著的持久連線
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        self._executor.shutdown(wait=False)
+
+    def _client(self, client_id):
+        now = time.monotonic()
+        if now - self._last_sweep >= self.client_idle_seconds:
+            self._evict_idle(now)
+        state = self.clients.get(client_id)
+        if state is None:
+            state = self.clients[client_id] = ClientState(self.max_inflight_per_client)
+        state.last_seen = now
+        return state
+
+    def _evict_idle(self, now):
+        """清除沒有請求進行中、且閒置超過 client_idle_seconds 的客戶端"""
+        self._last_sweep = now
+        idle = [client_id for client_id, state in self.clients.items()
+                if state.idle and now - state.last_seen >= self.client_idle_seconds]
+        for client_id in idle:
+            del self.clients[client_id]
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle clients")
+
+    async def _handle_connection(self, reader, writer):
+        peer = writer.get_extra_info("peername") or "unix"
+        peer = peer[0] if isinstance(peer, tuple) else str(peer)
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            # HTTP/1.1 持久連線：同一連線上的請求依序處理
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request = await self._read_request_head(reader)
+                    if request is None:
+                        break
+                    method, target, headers = request
+                    keep_alive = headers.get("connection", "").lower() != "close"
+                    status, body = await self._dispatch(method, target, headers, reader, writer, peer)
+                    extra = {}
+                except HTTPError as e:
+                    status, body, extra = e.status, {"error": str(e)}, e.headers
+                    # 請求體可能未讀完，無法繼續使用這條連線
+                    keep_alive = False
+                await self._write_response(writer, status, body, extra, keep_alive)
+                if not keep_alive:
+                    await self._lingering_close(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            logger.debug(f"Client {peer} disconnected")
+        except Exception as e:
+            logger.error(f"Connection error from {peer}: {e}", exc_info=True)
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    @staticmethod
+    async def _lingering_close(reader, writer, timeout=1.0):
+        """關閉寫入端後丟棄客戶端仍在送出的請求體，避免未讀資料讓連線被重設、客戶端收不到回應"""
+        if not writer.can_write_eof():
+            return
+        writer.write_eof()
+
+        async def discard():
+            while await reader.read(64 * 1024):
+                pass
+
+        try:
+            await asyncio.wait_for(discard(), timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+
+    async def _read_request_head(self, reader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as e:
+            if e.partial.strip():
+                raise
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431)
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HTTPError(400, "Malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    async def _write_response(self, writer, status, body, headers, keep_alive):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+                 "Content-Type: application/json; charset=utf-8",
+                 f"Content-Length: {len(payload)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload)
+        await writer.drain()
+
+    async def _dispatch(self, method, target, headers, reader, writer, peer):
+        url = urlsplit(target)
+        if url.path == "/v1/health" and method == "GET":
+            return 200, {"status": "ok"}
+        if url.path == "/v1/stats" and method == "GET":
+            return 200, self.stats()
+        if url.path == "/v1/transcribe" and method == "POST":
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            client_id = headers.get("x-client-id") or peer
+            return 200, await self._transcribe(client_id, query, headers, reader, writer)
+        raise HTTPError(404)
+
+    async def _transcribe(self, client_id, query, headers, reader, writer):
+        client = self._client(client_id)
+        client.requests += 1
+        if client.waiting >= self.max_queued_per_client:
+            client.rejected += 1
+            raise HTTPError(429, f"Too many pending requests for client {client_id}",
+                            {"Retry-After": "1"})
+        try:
+            sample_rate = int(query.get("sample_rate", self.engine.sample_rate))
+        except ValueError:
+            raise HTTPError(400, "Invalid sample_rate")
+        if not 8000 <= sample_rate <= 48000:
+            raise HTTPError(400, "sample_rate must be between 8000 and 48000")
+
+        # 排隊期間不讀取請求體：客戶端的上傳被 TCP 流量控制阻塞
+        client.waiting += 1
+        try:
+            await client.semaphore.acquire()
+            try:
+                await self._inflight.acquire()
+            except BaseException:
+                client.semaphore.release()
+                raise
+        finally:
+            client.waiting -= 1
+        client.inflight += 1
+        try:
+            if headers.get("expect", "").lower() == "100-continue":
+                # 輪到這個請求才讓客戶端開始上傳
+                writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                await writer.drain()
+            # 串流上傳默認在停頓處切分，上傳過程中就開始轉錄；整段上傳直接轉錄
+            chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+            segmented = query.get("segmented", "1" if chunked else "0") != "0"
+            stream = self.engine.open_stream(sample_rate, segmented=segmented, executor=self._executor)
+            try:
+                await self._read_audio(reader, headers, stream, sample_rate)
+            except BaseException:
+                stream.cancel()
+                raise
+            loop = asyncio.get_running_loop()
+            try:
+                result = await loop.run_in_executor(self._executor, stream.finish)
+            except NoAudioError as e:
+                raise HTTPError(400, str(e))
+            except Exception as e:
+                logger.error(f"Transcription failed for client {client_id}: {e}")
+                raise HTTPError(502, str(e))
+            return {"text": result.text, "raw_text": result.raw_text,
+                    "duration": result.duration, "latency": result.latency}
+        finally:
+            client.inflight -= 1
+            client.last_seen = time.monotonic()
+            client.semaphore.release()
+            self._inflight.release()
+
+    async def _read_audio(self, reader, headers, stream, sample_rate):
+        """讀取請求體並逐段送入 stream（奇數位元組留到下一段）"""
+        max_bytes = int(self.max_audio_seconds * sample_rate) * 2
+        pending = b""
+        received = 0
+        async for data in self._body_chunks(reader, headers):
+            received += len(data)
+            if received > max_bytes:
+                raise HTTPError(413, f"Audio longer than {self.max_audio_seconds}s")
+            data = pending + data
+            usable = len(data) - len(data) % 2
+            pending = data[usable:]
+            if usable:
+                stream.feed(np.frombuffer(data[:usable], dtype="<i2").astype(np.int16).reshape(-1, 1))
+
+    async def _body_chunks(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                try:
+                    size = int(size_line.split(b";")[0].strip(), 16)
+                except ValueError:
+                    raise HTTPError(400, "Malformed chunk size")
+                if size == 0:
+                    # 跳過 trailer
+                    while await reader.readuntil(b"\r\n") != b"\r\n":
+                        pass
+                    return
+                while size:
+                    data = await reader.read(min(size, self.read_chunk))
+                    if not data:
+                        raise asyncio.IncompleteReadError(b"", size)
+                    size -= len(data)
+                    yield data
+                await reader.readexactly(2)
+        else:
+            try:
+                remaining = int(headers.get("content-length", "0"))
+            except ValueError:
+                raise HTTPError(400, "Invalid Content-Length")
+            while remaining > 0:
+                data = await reader.read(min(remaining, self.read_chunk))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                yield data
+
+    def stats(self):
+        """各階段延遲、請求策略計數和每個客戶端的統計"""
+        return {
+            "latency": self.engine.metrics.summary(),
+            "requests": self.engine.request_policy.stats(),
+            "clients": {client_id: state.to_dict() for client_id, state in self.clients.items()},
+        }
+
+
+class DaemonThread:
+    """在背景線程中運行 TranscriptionDaemon（測試和基準測試使用）
+
+    用法:
+        with DaemonThread(engine) as daemon:
+            requests.post(f"{daemon.base_url}/v1/transcribe", data=pcm)
+    """
+
+    def __init__(self, engine, host="127.0.0.1", port=0, unix_path=None, **kwargs):
+        self.daemon = TranscriptionDaemon(engine, **kwargs)
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self._loop = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """服務的 URL；Unix socket 為 http+unix://<百分比編碼的路徑>（requests-unixsocket 的格式）"""
+        if self.unix_path:
+            return f"http+unix://{quote(self.daemon.address, safe='')}"
+        host, port = self.daemon.address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.daemon.start(self.host, self.port, self.unix_path))
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="daemon-loop", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.daemon.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def build_engine(args):
+    """根據命令列參數建立所有客戶端共用的轉錄引擎"""
+    client = None
+    if not normalize_model_spec(args.model).startswith(LOCAL_PREFIX):
+        api_key = os.getenv("OPENAI_API_KEY") or ("local" if args.base_url else None)
+        if not api_key:
+            raise SystemExit("錯誤: 請設置 OPENAI_API_KEY 環境變量")
+        # 重試和超時由 request_policy 負責，關閉 SDK 自身的重試
+        client = openai.OpenAI(api_key=api_key, base_url=args.base_url, max_retries=0)
+    post_processor = PostProcessor(
+        ConversionStage(args.profile),
+        UserDictionary(args.dictionary, MANUAL_MAPPINGS)
+    )
+    engine = TranscriptionEngine(client=client, post_processor=post_processor, sink=NullSink())
+    try:
+        engine.set_model(args.model)
+    except ValueError as e:
+        raise SystemExit(f"錯誤: {e}")
+    engine.language = args.language
+    engine.upload_format = args.format
+    return engine
+
+
+def main(argv=None):
+    """主函數"""
+    parser = argparse.ArgumentParser(description="Local transcription daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--unix", help="改為監聽 Unix socket 路徑")
+    parser.add_argument("--workers", type=int, default=8, help="轉錄線程數（所有客戶端共用）")
+    parser.add_argument("--max-inflight", type=int, default=2, help="每個客戶端同時轉錄的請求數")
+    parser.add_argument("--max-queued", type=int, default=4, help="每個客戶端排隊的請求數")
+    parser.add_argument("--max-inflight-total", type=int, help="所有客戶端合計同時轉錄的請求數，默認等於 --workers")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="OpenAI 模型或 local:<大小>")
+    parser.add_argument("--language", help="語言代碼，默認自動偵測")
+    parser.add_argument("--format", default="flac", choices=("wav", "flac", "ogg"), help="上傳格式")
+    parser.add_argument("--profile", default="s2t", choices=PROFILES, help="簡繁轉換設定檔")
+    parser.add_argument("--dictionary", default=USER_DICTIONARY_PATH, help="自定義詞典文件")
+    parser.add_argument("--base-url", default=os.getenv("OPENAI_BASE_URL"),
+                        help="OpenAI 相容服務地址（例如本地模擬服務）")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    engine = build_engine(args)
+    engine.warm_up(recorder=False)
+    daemon = TranscriptionDaemon(engine, max_inflight_per_client=args.max_inflight,
+                                 max_queued_per_client=args.max_queued, workers=args.workers,
+                                 max_inflight=args.max_inflight_total)
+
+    async def run():
+        address = await daemon.start(args.host, args.port, args.unix)
+        print(f"Transcription daemon listening on {address}")
+        try:
+            await daemon.serve_forever()
+        finally:
+            await daemon.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
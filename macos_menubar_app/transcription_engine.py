@@ -0,0 +1,998 @@
+"""
+轉錄引擎
+Headless transcription engine
+
+錄音 → 編碼 → 轉錄 → 後處理 → 輸出 的完整流程，不依賴 rumps / AppKit，
+可以在 Linux 上執行、做效能測試或用於非互動模式。
+狀態列應用只負責介面，平台相關的輸出（粘貼到焦點應用）透過 OutputSink 介面接入。
+後端和輸出都支援串流時，轉錄文字邊到達邊後處理、邊輸出。
+設定 spool 後，停止的錄音在轉錄前先寫入暫存區，失敗時保留並在之後重放。
+
+用法:
+    engine = TranscriptionEngine(api_key="sk-...", sink=CollectingSink())
+    engine.start_recording()
+    ...
+    session = engine.stop_recording()
+    result = engine.process_recording(session)
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+from audio_vad import VADConfig, trim_silence
+from capture_log import CaptureLogWriter
+from job_queue import JobQueue
+from latency_metrics import MetricsRegistry, Trace, current_trace, span
+from lazy_import import lazy_import
+from recorder import AudioRecorder
+from request_policy import RequestPolicy, is_retryable
+from script_conversion import ConversionStage
+from segment_transcriber import BackgroundSegmenter, PauseSegmenter, SegmentTranscriber, transcribe_chunked
+from text_rewriter import MANUAL_MAPPINGS, DictionaryRewriter
+from transcription_backends import (DEFAULT_MODEL, LOCAL_PREFIX, OpenAIBackend, create_backend,
+                                    normalize_model_spec)
+
+np = lazy_import("numpy")
+openai = lazy_import("openai")
+pyperclip = lazy_import("pyperclip")
+
+logger = logging.getLogger(__name__)
+
+# 應用數據目錄（自定義詞典等）
+APP_SUPPORT_DIR = os.path.expanduser("~/.speech-to-action")
+
+# 錄音超過這個長度（秒）後溢出到磁碟，並設長度硬上限
+RECORDING_SPILL_SECONDS = 300
+MAX_RECORDING_SECONDS = 2 * 60 * 60
+USER_DICTIONARY_PATH = os.path.join(APP_SUPPORT_DIR, "dictionary.txt")
+
+
+class NoAudioError(RuntimeError):
+    """錄音結束時沒有任何音頻"""
+
+
+class _RetryLater(Exception):
+    """錄音已在暫存區，改由重試隊列稍後轉錄（工作隊列的輸出順序隨即讓出）"""
+
+    def __init__(self, entry, audio_array, duration, error):
+        super().__init__(str(error))
+        self.entry = entry
+        self.audio_array = audio_array
+        self.duration = duration
+        self.error = error
+
+
+class DeliveryReport:
+    """輸出結果：是否已複製、是否已粘貼、目標應用名稱"""
+
+    def __init__(self, copied=False, pasted=False, target=None):
+        self.copied = copied
+        self.pasted = pasted
+        self.target = target
+
+
+class OutputSink:
+    """輸出介面"""
+
+    #: 是否能在轉錄過程中逐段輸出（見 begin_stream / deliver_delta / finish_stream）
+    streams = False
+
+    def deliver(self, text):
+        """輸出一段轉錄結果
+
+        Returns:
+            DeliveryReport
+        """
+        raise NotImplementedError
+
+    def begin_stream(self):
+        """開始一次串流輸出"""
+
+    def deliver_delta(self, text):
+        """串流輸出一段已後處理的文字"""
+
+    def finish_stream(self, text):
+        """串流結束
+
+        Args:
+            text: 完整的後處理文字（已逐段輸出）
+
+        Returns:
+            DeliveryReport
+        """
+        return self.deliver(text)
+
+
+class NullSink(OutputSink):
+    """不輸出（結果由呼叫方自行處理）"""
+
+    def deliver(self, text):
+        return DeliveryReport()
+
+
+class CollectingSink(OutputSink):
+    """把結果收集在列表中（測試和非互動模式使用）；串流片段另外收集在 deltas"""
+
+    streams = True
+
+    def __init__(self):
+        self.texts = []
+        self.deltas = []
+
+    def deliver(self, text):
+        self.texts.append(text)
+        return DeliveryReport()
+
+    def deliver_delta(self, text):
+        self.deltas.append(text)
+
+
+class ClipboardSink(OutputSink):
+    """複製到剪貼板（pyperclip，跨平台）"""
+
+    def __init__(self, clipboard=None):
+        """
+        Args:
+            clipboard: 提供 copy(text) / paste() 的剪貼板，默認 pyperclip（測試可傳入假的剪貼板）
+        """
+        self.clipboard = pyperclip if clipboard is None else clipboard
+
+    def copy(self, text):
+        try:
+            with span("clipboard"):
+                self.clipboard.copy(text)
+            logger.info("Copied to clipboard")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to copy to clipboard: {e}")
+            return False
+
+    def deliver(self, text):
+        return DeliveryReport(copied=self.copy(text))
+
+
+class PostProcessor:
+    """轉錄結果後處理：簡繁轉換 + 詞典替換"""
+
+    def __init__(self, conversion_stage=None, user_dictionary=None):
+        """
+        Args:
+            conversion_stage: ConversionStage，默認 s2t
+            user_dictionary: UserDictionary 或 DictionaryRewriter，默認只含內建映射
+        """
+        self.conversion_stage = conversion_stage or ConversionStage("s2t")
+        self.user_dictionary = user_dictionary or DictionaryRewriter(MANUAL_MAPPINGS)
+
+    def warm_up(self):
+        self.conversion_stage.warm_up()
+
+    def process(self, text, language=None):
+        # 將簡體中文轉換為繁體中文（英文、日文或語言設定非中文時跳過）
+        text, action = self.conversion_stage.convert_with_action(text, language)
+        logger.info(f"Script conversion: {action}")
+        # 將不常用的繁體字改成常用的
+        return self.user_dictionary.rewrite(text)
+
+    def mapping_keys(self):
+        """詞典替換的所有詞條"""
+        rewriter = getattr(self.user_dictionary, "rewriter", self.user_dictionary)
+        return rewriter.mappings.keys()
+
+    def stream(self, language=None):
+        """建立逐段後處理器（用於串流轉錄）"""
+        return IncrementalPostProcessor(self, language)
+
+
+# 串流後處理的切點：OpenCC 詞組不含標點和空白，在這些字元之後切開不會拆散詞組
+STREAM_DELIMITERS = frozenset(" \t\n，。！？、；：,.!?;:…「」『』（）()")
+
+
+class IncrementalPostProcessor:
+    """逐段後處理串流的轉錄片段
+
+    片段累積到出現分隔字元（標點、空白）時，才把到最後一個分隔字元為止的文字
+    送進 PostProcessor；OpenCC 的多字詞組和詞典的多字詞條不會跨越分隔字元，
+    所以逐段處理的結果與整段處理相同。詞典詞條含有的字元不作為分隔字元。
+    """
+
+    def __init__(self, post_processor, language=None):
+        self.post_processor = post_processor
+        self.language = language
+        self.delimiters = STREAM_DELIMITERS - set("".join(post_processor.mapping_keys()))
+        self.raw_text = ""
+        self.text = ""
+        self._pending = ""
+
+    def _process(self, raw):
+        if not raw:
+            return ""
+        text = self.post_processor.process(raw, self.language)
+        self.text += text
+        return text
+
+    def feed(self, delta):
+        """送入一個原始片段
+
+        Returns:
+            可以輸出的後處理文字（可能為空字串）
+        """
+        self.raw_text += delta
+        # 之前的待處理文字不含分隔字元，只需在新片段中找最後一個
+        for index in range(len(delta) - 1, -1, -1):
+            if delta[index] in self.delimiters:
+                cut = len(self._pending) + index + 1
+                self._pending += delta
+                ready, self._pending = self._pending[:cut], self._pending[cut:]
+                return self._process(ready)
+        self._pending += delta
+        return ""
+
+    def finish(self, raw_text=None):
+        """串流結束，處理剩下的文字
+
+        Args:
+            raw_text: 服務端回傳的完整原始文字；比已收到的片段多時補上差異
+
+        Returns:
+            最後可以輸出的後處理文字
+        """
+        if raw_text and raw_text != self.raw_text:
+            if raw_text.startswith(self.raw_text):
+                self._pending += raw_text[len(self.raw_text):]
+                self.raw_text = raw_text
+            else:
+                logger.warning("Streamed deltas differ from the final transcript")
+        rest, self._pending = self._pending, ""
+        return self._process(rest)
+
+
+class RecordingSession:
+    """一次錄音；停止後交給 TranscriptionEngine.process_recording"""
+
+    def __init__(self, segmenter=None, segment_transcriber=None, trace=None):
+        self.segmenter = segmenter
+        self.segment_transcriber = segment_transcriber
+        self.trace = trace or Trace()
+        self.started_at = time.time()
+        self.stopped_at = None  # perf_counter 時間，用於計算停止 → 輸出的總延遲
+        self.audio = None  # 最後一個區塊落地後的完整錄音
+        self.capture_checkpoint = None  # 開始時錄音器的擷取計數（CaptureHealth.checkpoint）
+        self.emitted_text = False  # 串流轉錄是否已輸出過文字（之後不能整段重新轉錄輸出）
+
+
+class AudioStream:
+    """由呼叫方逐段送入音頻的轉錄（例如本機服務的串流上傳）；用 TranscriptionEngine.open_stream 建立
+
+    送入的音頻在停頓處切成片段並在背景轉錄，finish 時只需等待尾段。
+    """
+
+    def __init__(self, engine, sample_rate, segmented=True, executor=None):
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.trace = Trace(engine.metrics, mode="stream")
+        self.segmenter = None
+        self.segment_transcriber = None
+        self._blocks = []
+        self._frames = 0
+        if segmented:
+            trace = self.trace
+
+            def transcribe_segment(segment):
+                with trace.activate():
+                    return engine.transcribe_raw(segment, sample_rate)
+
+            self.segment_transcriber = SegmentTranscriber(transcribe_segment, executor=executor)
+            self.segmenter = BackgroundSegmenter(PauseSegmenter(sample_rate), self.segment_transcriber)
+
+    @property
+    def duration(self):
+        return self._frames / self.sample_rate
+
+    def feed(self, block):
+        """送入一個 int16 音頻區塊"""
+        if not len(block):
+            return
+        self._blocks.append(block)
+        self._frames += len(block)
+        if self.segmenter is not None:
+            self.segmenter.feed(block)
+
+    def cancel(self):
+        if self.segmenter is not None:
+            self.segmenter.cancel()
+
+    def finish(self):
+        """音頻已全部送入：等待轉錄、後處理並輸出
+
+        Returns:
+            TranscriptionResult
+
+        Raises:
+            NoAudioError: 沒有送入音頻
+        """
+        return self.engine._traced(self.trace, time.perf_counter(), self._finish)
+
+    def _finish(self):
+        engine = self.engine
+        if not self._frames:
+            self.cancel()
+            raise NoAudioError("No audio received")
+        if self.segment_transcriber is not None:
+            tail = self.segmenter.flush()
+            raw_text = self.segment_transcriber.finish(tail, overlapped=self.segmenter.overlapped)
+        else:
+            raw_text = engine.transcribe_raw(np.concatenate(self._blocks), self.sample_rate)
+        return engine._finish(raw_text, self.duration)
+
+
+class TranscriptionResult:
+    """一次轉錄的結果"""
+
+    def __init__(self, text, raw_text, duration, delivery=None):
+        """
+        Args:
+            text: 後處理後的文字
+            raw_text: 轉錄後端回傳的原始文字
+            duration: 音頻長度（秒）
+            delivery: OutputSink 回傳的 DeliveryReport
+        """
+        self.text = text
+        self.raw_text = raw_text
+        self.duration = duration
+        self.delivery = delivery or DeliveryReport()
+        # 停止錄音（或開始轉錄）→ 輸出的總延遲（秒），完成時由引擎填入
+        self.latency = None
+
+
+class TranscriptionEngine:
+    """不依賴介面的轉錄流程"""
+
+    def __init__(self, api_key=None, client=None, sample_rate=16000, channels=1,
+                 post_processor=None, sink=None, recorder=None, metrics=None):
+        """
+        Args:
+            api_key: OpenAI API key（未提供 client 時用於延遲建立客戶端）
+            client: 現成的 OpenAI 相容客戶端（例如指向本地模擬服務）
+            sample_rate: 採樣率，Whisper 推薦 16kHz
+            channels: 聲道數
+            post_processor: PostProcessor，默認 s2t + 內建映射
+            sink: OutputSink，默認只複製到剪貼板
+            recorder: 錄音器（需提供 start/request_stop/wait_drained/on_block），默認 AudioRecorder
+            metrics: 各階段延遲的 MetricsRegistry，默認只保存在記憶體中
+        """
+        self.api_key = api_key
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.post_processor = post_processor or PostProcessor()
+        self.sink = sink or ClipboardSink()
+        self.metrics = metrics or MetricsRegistry()
+
+        # 延遲建立的物件：OpenAI 客戶端、錄音器、轉錄後端
+        self._init_lock = threading.RLock()
+        self._client = client
+        self._recorder = recorder
+
+        # 語言代碼，None 表示自動偵測
+        self.language = None
+
+        # 分段轉錄：錄音中於停頓處切分並在背景轉錄
+        self.segmented_transcription_enabled = False
+        self._session = None
+        # 已停止但最後一個區塊尚未落地的錄音（下一段錄音開始前必須先收尾）
+        self._undrained = None
+        self._drain_lock = threading.Lock()
+
+        # 停止的錄音排入工作隊列並行處理，默認按錄音順序輸出
+        self.jobs = JobQueue(workers=2)
+
+        # 錄音暫存區（RecordingSpool）：轉錄前先落盤，失敗的錄音保留到成功為止；
+        # 可重試的錯誤讓出工作隊列，按 spool_retry_delays 定時排入重試隊列。
+        # 重試和啟動時的重放各用自己的隊列，不佔用錄音的工作線程和輸出順序
+        self.spool = None
+        self.spool_retry_delays = (2.0, 10.0, 30.0)
+        self.retry_jobs = JobQueue(workers=1, ordered=False)
+        self.replay_jobs = JobQueue(workers=1)
+        self._retries_lock = threading.Lock()
+        self._retries_waiting = 0
+
+        # 錄音到達 MAX_RECORDING_SECONDS 時的回調（在音頻線程中執行，須保持輕量）
+        self.on_recording_limit = None
+
+        # 後端和輸出都支援時串流轉錄：文字邊到達邊後處理、邊輸出（默認關閉，逐段粘貼較慢且依賴目標應用）
+        self.streaming_enabled = False
+
+        # 長錄音切成區塊並行轉錄（區塊上限同時避開上傳大小限制）
+        self.max_chunk_seconds = 120.0
+        self.chunk_workers = 4
+        # 多段錄音同時轉錄時共用的區塊線程池（例如批次轉錄），設定後 chunk_workers 不適用
+        self.chunk_executor = None
+
+        # 上傳前修剪靜音（首尾靜音和過長停頓）
+        self.vad_enabled = True
+        self.vad_config = VADConfig()
+        self.last_vad_report = None
+
+        # 上傳格式：wav（無壓縮）、flac（無損）、ogg（Opus，最小）
+        self._upload_format = "flac"
+
+        # API 請求的截止時間、重試和對沖（所有 OpenAI 後端共用）
+        self.request_policy = RequestPolicy()
+
+        # 轉錄後端（按模型設定字串快取，切換回本機模型時不需重新載入）
+        self.backends = {}
+        self.model_spec = DEFAULT_MODEL
+
+    @property
+    def client(self):
+        """OpenAI 客戶端（第一次使用時建立）"""
+        with self._init_lock:
+            if self._client is None:
+                # 重試和超時由 request_policy 負責，關閉 SDK 自身的重試
+                self._client = openai.OpenAI(api_key=self.api_key, max_retries=0)
+            return self._client
+
+    @property
+    def recorder(self):
+        """錄音器：音頻回調直接寫入預分配緩衝區"""
+        with self._init_lock:
+            if self._recorder is None:
+                self._recorder = AudioRecorder(self.sample_rate, self.channels,
+                                               spill_seconds=RECORDING_SPILL_SECONDS,
+                                               max_seconds=MAX_RECORDING_SECONDS,
+                                               on_limit=self._on_recording_limit,
+                                               autotune=True)
+            return self._recorder
+
+    def set_capture_log(self, path):
+        """開始（或停止）把原始音頻回調區塊記錄到文件，供 replay_capture.py 重放
+
+        Args:
+            path: 擷取記錄文件路徑，None 表示停止記錄
+
+        Returns:
+            CaptureLogWriter，停止時為 None
+        """
+        recorder = self.recorder
+        previous, recorder.capture_log = recorder.capture_log, None
+        if previous is not None:
+            previous.close()
+        if path is not None:
+            recorder.capture_log = CaptureLogWriter(path, self.sample_rate, self.channels)
+        return recorder.capture_log
+
+    @property
+    def capture_health(self):
+        """錄音器的擷取健康狀態（CaptureHealth），錄音器不提供時為 None"""
+        return getattr(self.recorder, "health", None)
+
+    def _on_recording_limit(self):
+        # 在音頻線程中呼叫：錄音器已自行停止，由介面決定如何收尾（例如呼叫 stop_recording）
+        if self.on_recording_limit is not None:
+            self.on_recording_limit()
+
+    @property
+    def upload_format(self):
+        return self._upload_format
+
+    @upload_format.setter
+    def upload_format(self, fmt):
+        self._upload_format = fmt
+        for backend in self.backends.values():
+            if isinstance(backend, OpenAIBackend):
+                backend.upload_format = fmt
+
+    @property
+    def backend(self):
+        """目前選擇的轉錄後端"""
+        return self.get_backend(self.model_spec)
+
+    def get_backend(self, spec):
+        """取得（或建立並快取）轉錄後端
+
+        Raises:
+            ValueError: 未知的模型（見 transcription_backends.create_backend）
+        """
+        spec = normalize_model_spec(spec)
+        with self._init_lock:
+            if spec not in self.backends:
+                client = None if spec.startswith(LOCAL_PREFIX) else self.client
+                self.backends[spec] = create_backend(spec, client, self.upload_format,
+                                                     self.request_policy)
+            return self.backends[spec]
+
+    def set_model(self, spec):
+        """切換轉錄模型：建立（或取回快取的）後端後才改用它，未知的模型不改變目前設定
+
+        Returns:
+            新的轉錄後端
+
+        Raises:
+            ValueError: 未知的模型
+        """
+        backend = self.get_backend(spec)
+        self.model_spec = normalize_model_spec(spec)
+        return backend
+
+    def set_preroll(self, seconds, idle_timeout=None):
+        """設定常駐收音：輸入流保持開啟，錄音以最近 seconds 秒的預錄音頻開頭
+
+        Args:
+            seconds: 預錄長度（秒），0 表示關閉（每次錄音才打開設備）
+            idle_timeout: 閒置多少秒後暫停輸入流釋放麥克風，None 表示不暫停
+        """
+        if seconds > 0:
+            self.recorder.enable_preroll(seconds, idle_timeout)
+        else:
+            self.recorder.disable_preroll()
+
+    def warm_up(self, recorder=True):
+        """載入轉錄流程用到的模組和物件，讓第一次錄音時不必等待
+
+        Args:
+            recorder: 是否預熱音頻設備（沒有麥克風的環境傳 False）
+        """
+        start = time.perf_counter()
+        if recorder:
+            self.recorder.warm_up()
+        self.post_processor.warm_up()
+        self.backend.warm_up()
+        logger.info(f"Warm-up completed in {time.perf_counter() - start:.2f}s")
+
+    @property
+    def recording(self):
+        return self._session is not None
+
+    def start_recording(self):
+        """開始錄音
+
+        Raises:
+            Exception: 無法打開輸入設備（由 sounddevice 拋出）
+        """
+        # 上一段錄音的最後區塊還在路上時先收尾（約一個區塊），之後錄音器才能交給新的錄音
+        if self._undrained is not None:
+            self._drain(self._undrained)
+
+        trace = Trace(self.metrics, mode="recording")
+        # 分段轉錄模式下，為本次錄音建立切分器和背景轉錄器
+        if self.segmented_transcription_enabled:
+            def transcribe_segment(segment):
+                # 背景線程中同樣計入本次錄音的 trace（多個片段的耗時累加）
+                with trace.activate():
+                    return self.transcribe_raw(segment)
+
+            segment_transcriber = SegmentTranscriber(transcribe_segment)
+            segmenter = BackgroundSegmenter(PauseSegmenter(self.sample_rate), segment_transcriber)
+            session = RecordingSession(segmenter, segment_transcriber, trace)
+            # 音頻回調只把區塊放入隊列，切分和提交請求在背景線程中進行
+            self.recorder.on_block = segmenter.feed
+        else:
+            session = RecordingSession(trace=trace)
+            self.recorder.on_block = None
+
+        if self.capture_health is not None:
+            session.capture_checkpoint = self.capture_health.checkpoint()
+        try:
+            with trace.span("stream_open"):
+                self.recorder.start()
+        except Exception:
+            if session.segmenter is not None:
+                session.segmenter.cancel()
+            raise
+        self._session = session
+        logger.info("Recording started...")
+
+    def stop_recording(self):
+        """請求停止輸入流後立即返回；最後一個區塊落地由 process_recording 等待
+
+        Returns:
+            RecordingSession
+        """
+        session, self._session = self._session, None
+        session = session or RecordingSession(trace=Trace(self.metrics, mode="recording"))
+        session.stopped_at = time.perf_counter()
+        self.recorder.request_stop()
+        self._undrained = session
+        logger.info("Recording stop requested")
+        return session
+
+    def _drain(self, session):
+        """等待錄音的最後一個區塊落地並保存在 session.audio（每段錄音只做一次）"""
+        with self._drain_lock:
+            if session.audio is None:
+                # 事件驅動，無固定等待
+                with session.trace.span("drain"):
+                    session.audio = self.recorder.wait_drained()
+                self._check_capture(session)
+                if self._undrained is session:
+                    self._undrained = None
+            return session.audio
+
+    def _check_capture(self, session):
+        """把錄音期間的溢出和丟失區塊記在 trace 上（隨延遲記錄匯出），有丟失時警告"""
+        if session.capture_checkpoint is None:
+            return
+        lost = self.capture_health.since(session.capture_checkpoint)
+        session.trace.fields.update(overflows=lost["overflows"], dropped_blocks=lost["dropped_blocks"])
+        if lost["overflows"] or lost["dropped_blocks"]:
+            logger.warning(f"Audio lost during recording: {lost['overflows']} overflows, "
+                           f"{lost['dropped_blocks']} dropped blocks (~{lost['dropped_frames']} frames)")
+
+    def transcribe_raw(self, audio_array, sample_rate=None):
+        """將音頻數組轉換為文字（原始轉錄結果）
+
+        Args:
+            audio_array: int16 音頻數組
+            sample_rate: 採樣率，默認為錄音採樣率
+
+        Returns:
+            轉錄後端回傳的文字
+        """
+        sample_rate = sample_rate or self.sample_rate
+        if self._needs_chunking(audio_array, sample_rate):
+            return self._transcribe_long(audio_array, sample_rate)
+        audio_array = self._trim(audio_array, sample_rate)
+        return self._transcribe_trimmed(audio_array, sample_rate)
+
+    def _trim(self, audio_array, sample_rate):
+        """修剪首尾靜音和過長停頓，減少上傳大小"""
+        if self.vad_enabled:
+            with span("vad"):
+                audio_array, report = trim_silence(audio_array, sample_rate, self.vad_config)
+            self.last_vad_report = report
+            logger.info(f"Silence trimming: {report}")
+        return audio_array
+
+    def _needs_chunking(self, audio_array, sample_rate):
+        return bool(self.max_chunk_seconds) and len(audio_array) > self.max_chunk_seconds * sample_rate
+
+    def _transcribe_trimmed(self, audio_array, sample_rate):
+        # 交給目前選擇的轉錄後端（OpenAI API 或本機模型）
+        if self._needs_chunking(audio_array, sample_rate):
+            return self._transcribe_long(audio_array, sample_rate, trim=False)
+        return self.backend.transcribe(audio_array, sample_rate, language=self.language)
+
+    def _transcribe_long(self, audio_array, sample_rate, trim=True):
+        """長錄音：在停頓處切成區塊並行轉錄
+
+        先切分再逐塊修剪靜音，整段錄音只以視圖讀取（可能是溢出到磁碟的 memmap），
+        記憶體用量只與區塊大小和並行數有關。工作線程同樣計入目前的 trace。
+        """
+        backend, language = self.backend, self.language
+        trace = current_trace()
+
+        def transcribe_chunk(chunk):
+            if trim and self.vad_enabled:
+                with span("vad"):
+                    chunk, report = trim_silence(chunk, sample_rate, self.vad_config)
+                if not report.speech_detected:
+                    # 整個區塊都是靜音，不必請求
+                    return ""
+            return backend.transcribe(chunk, sample_rate, language=language)
+
+        def traced_chunk(chunk):
+            if trace is None:
+                return transcribe_chunk(chunk)
+            with trace.activate():
+                return transcribe_chunk(chunk)
+
+        return transcribe_chunked(audio_array, sample_rate, traced_chunk,
+                                  self.max_chunk_seconds, self.chunk_workers, self.chunk_executor)
+
+    def _finish(self, raw_text, duration, job=None, sink=None):
+        logger.info(f"Transcription result (original): {raw_text}")
+        with span("postprocess"):
+            text = self.post_processor.process(raw_text, self.language)
+        logger.info(f"Transcription result (converted): {text}")
+        if job is not None:
+            # 等待前面的錄音先輸出
+            with span("reorder"):
+                job.wait_turn()
+        return TranscriptionResult(text, raw_text, duration, (sink or self.sink).deliver(text))
+
+    def _can_stream(self, audio_array, sample_rate):
+        return (self.streaming_enabled and self.sink.streams and self.backend.supports_streaming
+                and not self._needs_chunking(audio_array, sample_rate))
+
+    def _transcribe_streaming(self, audio_array, duration, started, job=None, session=None):
+        """串流轉錄：片段逐段後處理，輪到這段錄音輸出後立即交給輸出
+
+        Args:
+            session: 對應的 RecordingSession；第一次輸出文字時設定 session.emitted_text
+        """
+        sink = self.sink
+        processor = self.post_processor.stream(self.language)
+        trace = current_trace()
+        held = []  # 還沒輪到這段錄音輸出時暫存的文字
+
+        def emit(text):
+            if text and job is not None and not job.is_turn():
+                held.append(text)
+                return
+            text = "".join(held) + text
+            held.clear()
+            if not text:
+                return
+            if trace is not None and "first_text" not in trace.spans:
+                trace.add("first_text", time.perf_counter() - started)
+            if session is not None:
+                session.emitted_text = True
+            sink.deliver_delta(text)
+
+        def on_delta(delta):
+            with span("postprocess"):
+                text = processor.feed(delta)
+            emit(text)
+
+        sink.begin_stream()
+        raw_text = self.backend.transcribe_stream(audio_array, self.sample_rate, on_delta,
+                                                  language=self.language)
+        with span("postprocess"):
+            tail = processor.finish(raw_text)
+        if job is not None:
+            with span("reorder"):
+                job.wait_turn()
+        emit(tail)
+        logger.info(f"Transcription result (streamed): {processor.text}")
+        return TranscriptionResult(processor.text, processor.raw_text, duration,
+                                   sink.finish_stream(processor.text))
+
+    def _traced(self, trace, started, work):
+        """在 trace 中執行 work()，成功時記錄停止 → 輸出的總延遲"""
+        status = "error"
+        try:
+            with trace.activate():
+                result = work()
+            result.latency = time.perf_counter() - started
+            if "first_text" not in trace.spans:
+                # 沒有串流時第一個字和全部文字同時輸出
+                trace.add("first_text", result.latency)
+            trace.add("total", result.latency)
+            status = "ok"
+            return result
+        except NoAudioError:
+            status = "no_audio"
+            raise
+        except _RetryLater:
+            status = "spooled"
+            raise
+        finally:
+            trace.finish(status=status)
+
+    def process_recording(self, session, job=None):
+        """等待錄音落地、轉錄、後處理並輸出
+
+        Args:
+            session: stop_recording 回傳的 RecordingSession
+            job: JobQueue 的 Job；輸出前等待輪到這段錄音
+
+        Returns:
+            TranscriptionResult
+
+        Raises:
+            NoAudioError: 沒有錄到音頻
+        """
+        started = session.stopped_at or time.perf_counter()
+        return self._traced(session.trace, started,
+                            lambda: self._process_session(session, job))
+
+    def submit_recording(self, session):
+        """把停止的錄音排入工作隊列，立即返回
+
+        處理在工作線程中進行，可以馬上開始下一段錄音；
+        輸出順序由 jobs.ordered 決定（默認按錄音順序）。
+        設定 spool 時，因可重試的錯誤失敗的錄音讓出順序，由重試隊列稍後輸出。
+
+        Returns:
+            Future，結果為 TranscriptionResult（或 process_recording 的異常）
+        """
+        submitted = time.perf_counter()
+        future = Future()
+
+        def process(job):
+            # 等待空閒工作線程的時間（工作線程都在處理前面的錄音時）
+            session.trace.add("queue", time.perf_counter() - submitted)
+            try:
+                result = self.process_recording(session, job)
+            except _RetryLater as retry:
+                started = session.stopped_at or submitted
+                self._schedule_retry(retry, started, future, 0)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+        self.jobs.submit(process)
+        return future
+
+    @property
+    def pending(self):
+        """還沒有結果的錄音數（工作隊列、等待重試和重放中的）"""
+        with self._retries_lock:
+            waiting = self._retries_waiting
+        return self.jobs.pending + waiting + self.replay_jobs.pending
+
+    def _process_session(self, session, job=None):
+        audio_array = self._drain(session)
+        logger.info(f"Recorded {len(audio_array)} frames, starting transcription...")
+
+        if not len(audio_array):
+            if session.segmenter is not None:
+                session.segmenter.cancel()
+            raise NoAudioError("No audio recorded")
+
+        duration = len(audio_array) / self.sample_rate
+        entry = None
+        if self.spool is not None:
+            with span("spool"):
+                entry = self.spool.persist(audio_array, self.sample_rate)
+        try:
+            result = self._transcribe_session(session, audio_array, duration, job)
+        except Exception as e:
+            if entry is None:
+                raise
+            if not is_retryable(e) or session.emitted_text:
+                # 串流已輸出部分文字時不在本次會話中重試，否則已粘貼的開頭會再輸出一次；
+                # 錄音留在暫存區，重新啟動後重放到記錄而不是粘貼
+                self.spool.record_failure(entry, e)
+                raise
+            if job is not None:
+                # API 暫時不可用：錄音已落盤，讓出工作線程和輸出順序，稍後在重試隊列中轉錄
+                self.spool.record_failure(entry, e)
+                raise _RetryLater(entry, audio_array, duration, e) from e
+            # 同步呼叫（沒有工作隊列）：退避後重新轉錄整段錄音
+            result = self._retry_spooled(entry, audio_array, duration, e)
+        if entry is not None:
+            self.spool.complete(entry)
+        return result
+
+    def _transcribe_session(self, session, audio_array, duration, job=None):
+        segment_transcriber = session.segment_transcriber
+        if segment_transcriber is not None:
+            # 前面的片段已在錄音期間送出，只需等待尾段
+            tail = session.segmenter.flush()
+            logger.info(f"Waiting for {segment_transcriber.segment_count} segments "
+                        f"plus tail of {0 if tail is None else len(tail)} samples")
+            raw_text = segment_transcriber.finish(tail, overlapped=session.segmenter.overlapped)
+        else:
+            logger.info(f"Audio array shape: {audio_array.shape}, duration: {duration:.2f}s")
+            if self._needs_chunking(audio_array, self.sample_rate):
+                raw_text = self._transcribe_long(audio_array, self.sample_rate)
+            else:
+                audio_array = self._trim(audio_array, self.sample_rate)
+                if self._can_stream(audio_array, self.sample_rate):
+                    started = session.stopped_at or time.perf_counter()
+                    return self._transcribe_streaming(audio_array, duration, started, job, session)
+                raw_text = self._transcribe_trimmed(audio_array, self.sample_rate)
+
+        return self._finish(raw_text, duration, job)
+
+    def _retry_spooled(self, entry, audio_array, duration, error):
+        """以退避重試轉錄已落盤的錄音；全部失敗時錄音留在暫存區並拋出最後的錯誤"""
+        self.spool.record_failure(entry, error)
+        for delay in self.spool_retry_delays:
+            logger.warning(f"Retrying spooled recording {entry.id} in {delay:.1f}s after: {error}")
+            time.sleep(delay)
+            try:
+                raw_text = self.transcribe_raw(audio_array)
+            except Exception as e:
+                self.spool.record_failure(entry, e)
+                if not is_retryable(e):
+                    raise
+                error = e
+                continue
+            return self._finish(raw_text, duration)
+        raise error
+
+    def _schedule_retry(self, retry, started, future, attempt):
+        """attempt 次重試後：等待下一個退避間隔再排入重試隊列；次數用完時以最後的錯誤結束 future"""
+        if attempt >= len(self.spool_retry_delays):
+            future.set_exception(retry.error)
+            return
+        delay = self.spool_retry_delays[attempt]
+        logger.warning(f"Retrying spooled recording {retry.entry.id} in {delay:.1f}s after: {retry.error}")
+        with self._retries_lock:
+            self._retries_waiting += 1
+
+        def submit():
+            self.retry_jobs.submit(lambda job: self._retry_attempt(retry, started, future, attempt))
+
+        timer = threading.Timer(delay, submit)
+        timer.daemon = True
+        timer.start()
+
+    def _retry_attempt(self, retry, started, future, attempt):
+        try:
+            trace = Trace(self.metrics, mode="retry")
+            try:
+                result = self._traced(trace, started, lambda: self._finish(
+                    self.transcribe_raw(retry.audio_array), retry.duration))
+            except Exception as e:
+                self.spool.record_failure(retry.entry, e)
+                if not is_retryable(e):
+                    future.set_exception(e)
+                    return
+                retry.error = e
+                self._schedule_retry(retry, started, future, attempt + 1)
+                return
+            self.spool.complete(retry.entry)
+            future.set_result(result)
+        finally:
+            with self._retries_lock:
+                self._retries_waiting -= 1
+
+    def replay_spool(self, sink=None):
+        """把暫存區中未完成的錄音（例如上次退出前失敗的）按順序排入重放隊列
+
+        重放隊列與錄音的工作隊列分開，重放不會延後新錄音的輸出。
+
+        Args:
+            sink: 重放結果的輸出，默認 NullSink（不粘貼到目前的焦點應用）
+
+        Returns:
+            [(SpoolEntry, Future)]，Future 的結果為 TranscriptionResult
+        """
+        if self.spool is None:
+            return []
+        sink = sink or NullSink()
+        futures = []
+        for entry in self.spool.pending():
+            trace = Trace(self.metrics, mode="replay")
+
+            def process(job, entry=entry, trace=trace):
+                return self._traced(trace, time.perf_counter(),
+                                    lambda: self._process_spooled(entry, job, sink))
+
+            futures.append((entry, self.replay_jobs.submit(process)))
+        if futures:
+            logger.info(f"Replaying {len(futures)} spooled recordings")
+        return futures
+
+    def _process_spooled(self, entry, job, sink):
+        audio_array, sample_rate = self.spool.load(entry)
+        duration = len(audio_array) / sample_rate
+        try:
+            raw_text = self.transcribe_raw(audio_array, sample_rate)
+        except Exception as e:
+            self.spool.record_failure(entry, e, replay=True)
+            raise
+        result = self._finish(raw_text, duration, job, sink)
+        self.spool.complete(entry)
+        return result
+
+    def open_stream(self, sample_rate=None, segmented=True, executor=None):
+        """開始一段由呼叫方送入音頻的轉錄
+
+        Args:
+            sample_rate: 送入音頻的採樣率，默認為錄音採樣率
+            segmented: 是否在停頓處切分並在送入過程中轉錄
+            executor: 轉錄片段的共用線程池，默認每段轉錄使用自己的線程池
+
+        Returns:
+            AudioStream
+        """
+        return AudioStream(self, sample_rate or self.sample_rate, segmented, executor)
+
+    def transcribe_audio(self, audio_array, sample_rate=None):
+        """轉錄一段現成的音頻（不經過錄音器），後處理並輸出
+
+        Args:
+            audio_array: int16 音頻數組
+            sample_rate: 採樣率，默認為錄音採樣率
+
+        Returns:
+            TranscriptionResult
+
+        Raises:
+            NoAudioError: 音頻為空
+        """
+        if not len(audio_array):
+            raise NoAudioError("Empty audio")
+        sample_rate = sample_rate or self.sample_rate
+        duration = len(audio_array) / sample_rate
+        return self._traced(
+            Trace(self.metrics, mode="audio"), time.perf_counter(),
+            lambda: self._finish(self.transcribe_raw(audio_array, sample_rate), duration)
+        )
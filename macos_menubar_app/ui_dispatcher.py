@@ -0,0 +1,113 @@
+"""
+介面更新調度
+Coalescing main-thread UI update dispatcher
+
+AppKit 的介面物件只能在主線程修改，而錄音狀態的變化來自快捷鍵線程和工作線程。
+任何線程都只呼叫 set(key, value) 記錄想要的狀態（同一個 key 只保留最後的值），
+主線程的計時器以固定間隔呼叫 flush()，只把和已套用狀態不同的值交給對應的
+套用函數。快速連續的變化會合併成一次更新，套用頻率不超過計時器頻率。
+通知等一次性事件以 post(key, value) 提交，按順序逐一套用，不合併也不比較。
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class UIDispatcher:
+    """合併狀態變化並在主線程套用差異"""
+
+    def __init__(self):
+        self._appliers = {}
+        self._pending = {}
+        self._events = []
+        self._applied = {}
+        self._lock = threading.Lock()
+        self.requested = 0
+        self.applied = 0
+
+    def register(self, key, apply):
+        """登記一個狀態的套用函數
+
+        Args:
+            key: 狀態名稱
+            apply: 套用函數 (value) -> None，在主線程中呼叫
+        """
+        self._appliers[key] = apply
+
+    def set(self, key, value):
+        """記錄狀態的新值（任何線程皆可呼叫，立即返回）"""
+        if key not in self._appliers:
+            raise KeyError(f"Unknown UI state: {key}")
+        with self._lock:
+            self._pending[key] = value
+            self.requested += 1
+
+    def post(self, key, value):
+        """提交一次事件（例如通知；任何線程皆可呼叫，立即返回），flush 時按提交順序每個都套用"""
+        if key not in self._appliers:
+            raise KeyError(f"Unknown UI state: {key}")
+        with self._lock:
+            self._events.append((key, value))
+            self.requested += 1
+
+    @property
+    def dirty(self):
+        with self._lock:
+            return bool(self._pending or self._events)
+
+    def flush(self, _=None):
+        """套用待處理的變化（只能在主線程呼叫，可直接作為 rumps.Timer 回調）
+
+        Returns:
+            實際套用的狀態數
+        """
+        with self._lock:
+            if not self._pending and not self._events:
+                return 0
+            pending, self._pending = self._pending, {}
+            events, self._events = self._events, []
+        count = 0
+        for key, value in pending.items():
+            if key in self._applied and self._applied[key] == value:
+                continue
+            if self._apply(key, value):
+                self._applied[key] = value
+                count += 1
+        for key, value in events:
+            count += self._apply(key, value)
+        self.applied += count
+        return count
+
+    def _apply(self, key, value):
+        try:
+            self._appliers[key](value)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to apply UI state {key}: {e}", exc_info=True)
+            return False
+
+
+def changed_slots(old, new):
+    """比較兩個列表，回傳需要更新的位置
+
+    Returns:
+        [(index, value), ...]；new 比 old 短時多出的位置 value 為 None
+    """
+    changes = [(i, value) for i, value in enumerate(new) if i >= len(old) or old[i] != value]
+    changes += [(i, None) for i in range(len(new), len(old))]
+    return changes
+
+
+def prepended_count(old, new):
+    """把 new 看成 old 前面加上若干新項目（尾部移除最舊的項目），用於最新在前的列表
+
+    Returns:
+        前面新增的項目數（最少的對應方式）；len(new) 表示整個列表都不同
+    """
+    for count in range(len(new)):
+        kept = list(new[count:])
+        if kept == list(old[:len(kept)]):
+            return count
+    return len(new)